@@ -184,6 +184,41 @@ def obtener_autores(conexion: sqlite3.Connection) -> List[Tuple]:
     cursor.close()
     return output
 
+def obtener_libro_por_id(conexion: sqlite3.Connection, libro_id: int) -> Optional[Tuple]:
+    """
+    Obtiene un libro concreto con el nombre de su autor
+
+    Args:
+        conexion (sqlite3.Connection): Conexión a la base de datos SQLite
+        libro_id (int): ID del libro a buscar
+
+    Returns:
+        Optional[Tuple]: Tupla (id, titulo, anio, autor) o None si no existe
+    """
+    cursor = conexion.cursor()
+    statement = 'SELECT l.id, l.titulo, l.anio, a.nombre FROM libros AS l INNER JOIN autores AS a ON l.autor_id = a.id WHERE l.id = ?'
+    cursor.execute(statement, (libro_id,))
+    output = cursor.fetchone()
+    cursor.close()
+    return output
+
+def obtener_autor_por_id(conexion: sqlite3.Connection, autor_id: int) -> Optional[Tuple]:
+    """
+    Obtiene un autor concreto
+
+    Args:
+        conexion (sqlite3.Connection): Conexión a la base de datos SQLite
+        autor_id (int): ID del autor a buscar
+
+    Returns:
+        Optional[Tuple]: Tupla (id, nombre) o None si no existe
+    """
+    cursor = conexion.cursor()
+    cursor.execute('SELECT id, nombre FROM autores WHERE id = ?', (autor_id,))
+    output = cursor.fetchone()
+    cursor.close()
+    return output
+
 if __name__ == "__main__":
     try:
         # Crea la base de datos desde el archivo SQL
@@ -0,0 +1,216 @@
+"""
+Caché de lectura en proceso para la capa de datos de ej3a2.
+
+Las consultas de libros y autores se repiten mucho con los mismos parámetros,
+así que se guardan en una caché LRU acotada y con caducidad (TTL). Las claves
+son tuplas que identifican la consulta: ('libros',), ('autores',),
+('libro', id) y ('autor', id).
+
+Las escrituras que pasan por BibliotecaCache (agregar_libro y actualizar_libro)
+invalidan automáticamente las entradas afectadas.
+
+Los listados se guardan como tuplas y cada lectura devuelve una lista nueva:
+modificar el resultado no altera lo cacheado. CacheLRU se puede compartir entre
+hilos (sus operaciones van protegidas por un cerrojo). La carga de
+obtener_o_cargar se hace fuera del cerrojo; si mientras tanto hay una
+invalidación, el resultado se devuelve pero no se guarda.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import ej3a2
+
+# Valores por defecto de la caché
+CACHE_TAMANO_MAXIMO = 1024
+CACHE_TTL_SEGUNDOS = 60.0
+
+# Marca para distinguir "no está en caché" de un valor None cacheado
+_AUSENTE = object()
+
+
+class CacheLRU:
+    """
+    Caché LRU acotada con caducidad por entrada.
+
+    Guarda como mucho `tamano_maximo` entradas; al superarlo descarta la menos
+    usada recientemente. Cada entrada caduca `ttl` segundos después de guardarse
+    (ttl=None desactiva la caducidad).
+    """
+
+    def __init__(self, tamano_maximo: int = CACHE_TAMANO_MAXIMO,
+                 ttl: Optional[float] = CACHE_TTL_SEGUNDOS,
+                 reloj: Callable[[], float] = time.monotonic):
+        if tamano_maximo <= 0:
+            raise ValueError('tamano_maximo debe ser mayor que 0')
+        self.tamano_maximo = tamano_maximo
+        self.ttl = ttl
+        self._reloj = reloj
+        self._cerrojo = threading.RLock()
+        # clave -> (instante de caducidad, valor)
+        self._entradas: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # Se incrementa con cada invalidación: una carga que empezó antes no se guarda
+        self._generacion = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self.caducadas = 0
+        self.invalidaciones = 0
+        self.descartadas = 0
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    def obtener(self, clave: Hashable, defecto: Any = None) -> Any:
+        """
+        Devuelve el valor cacheado para la clave o `defecto` si no está o ha caducado
+        """
+        with self._cerrojo:
+            entrada = self._entradas.get(clave, _AUSENTE)
+            if entrada is _AUSENTE:
+                self.fallos += 1
+                return defecto
+            caduca, valor = entrada
+            if caduca < self._reloj():
+                del self._entradas[clave]
+                self.caducadas += 1
+                self.fallos += 1
+                return defecto
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def guardar(self, clave: Hashable, valor: Any) -> None:
+        """
+        Guarda un valor, expulsando la entrada menos usada si la caché está llena
+        """
+        caduca = float('inf') if self.ttl is None else self._reloj() + self.ttl
+        with self._cerrojo:
+            self._entradas[clave] = (caduca, valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.tamano_maximo:
+                self._entradas.popitem(last=False)
+                self.expulsiones += 1
+
+    def obtener_o_cargar(self, clave: Hashable, cargar: Callable[[], Any]) -> Any:
+        """
+        Lectura a través de la caché: si la clave no está, llama a `cargar` y guarda el
+        resultado, salvo que durante la carga se haya invalidado algo
+        """
+        with self._cerrojo:
+            valor = self.obtener(clave, _AUSENTE)
+            generacion = self._generacion
+        if valor is _AUSENTE:
+            valor = cargar()
+            with self._cerrojo:
+                if generacion == self._generacion:
+                    self.guardar(clave, valor)
+                else:
+                    # El resultado puede ser anterior a la invalidación
+                    self.descartadas += 1
+        return valor
+
+    def invalidar(self, *claves: Hashable) -> None:
+        """
+        Elimina las claves indicadas (las que no estén se ignoran)
+        """
+        with self._cerrojo:
+            self._generacion += 1
+            for clave in claves:
+                if self._entradas.pop(clave, _AUSENTE) is not _AUSENTE:
+                    self.invalidaciones += 1
+
+    def limpiar(self) -> None:
+        """
+        Vacía la caché sin reiniciar las métricas
+        """
+        with self._cerrojo:
+            self._generacion += 1
+            self.invalidaciones += len(self._entradas)
+            self._entradas.clear()
+
+    def metricas(self) -> Dict[str, Any]:
+        """
+        Devuelve las métricas de uso de la caché
+        """
+        with self._cerrojo:
+            consultas = self.aciertos + self.fallos
+            return {
+                'tamano': len(self._entradas),
+                'tamano_maximo': self.tamano_maximo,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': self.aciertos / consultas if consultas else 0.0,
+                'expulsiones': self.expulsiones,
+                'caducadas': self.caducadas,
+                'invalidaciones': self.invalidaciones,
+                'descartadas': self.descartadas,
+            }
+
+
+class BibliotecaCache:
+    """
+    Capa de lectura a través de caché sobre las funciones de ej3a2.
+
+    Cada instancia va ligada a una conexión: las entradas de una base de datos
+    no se mezclan con las de otra.
+    """
+
+    def __init__(self, conexion: sqlite3.Connection, cache: Optional[CacheLRU] = None):
+        self.conexion = conexion
+        self.cache = cache if cache is not None else CacheLRU()
+
+    def obtener_libros(self) -> List[Tuple]:
+        """
+        Lista de tuplas (id, titulo, anio, autor), como ej3a2.obtener_libros
+        """
+        return list(self.cache.obtener_o_cargar(('libros',), lambda: tuple(ej3a2.obtener_libros(self.conexion))))
+
+    def obtener_autores(self) -> List[Tuple]:
+        """
+        Lista de tuplas (id, nombre), como ej3a2.obtener_autores
+        """
+        return list(self.cache.obtener_o_cargar(('autores',), lambda: tuple(ej3a2.obtener_autores(self.conexion))))
+
+    def obtener_libro(self, libro_id: int) -> Optional[Tuple]:
+        """
+        Tupla (id, titulo, anio, autor) del libro o None si no existe
+        """
+        return self.cache.obtener_o_cargar(('libro', libro_id),
+                                           lambda: ej3a2.obtener_libro_por_id(self.conexion, libro_id))
+
+    def obtener_autor(self, autor_id: int) -> Optional[Tuple]:
+        """
+        Tupla (id, nombre) del autor o None si no existe
+        """
+        return self.cache.obtener_o_cargar(('autor', autor_id),
+                                           lambda: ej3a2.obtener_autor_por_id(self.conexion, autor_id))
+
+    def agregar_libro(self, titulo: str, anio: int, autor_id: int) -> int:
+        """
+        Agrega un libro e invalida los listados de libros
+        """
+        libro_id = ej3a2.agregar_libro(self.conexion, titulo, anio, autor_id)
+        # Un libro nuevo puede haber quedado cacheado como inexistente
+        self.cache.invalidar(('libros',), ('libro', libro_id))
+        return libro_id
+
+    def actualizar_libro(self, libro_id: int, nuevo_titulo: Optional[str] = None,
+                         nuevo_anio: Optional[int] = None, nuevo_autor_id: Optional[int] = None) -> bool:
+        """
+        Actualiza un libro e invalida su entrada y los listados de libros
+        """
+        try:
+            return ej3a2.actualizar_libro(self.conexion, libro_id, nuevo_titulo, nuevo_anio, nuevo_autor_id)
+        finally:
+            # Invalidamos también si falla: la fila puede haber cambiado parcialmente
+            self.cache.invalidar(('libros',), ('libro', libro_id))
+
+    def metricas(self) -> Dict[str, Any]:
+        """
+        Métricas de la caché subyacente
+        """
+        return self.cache.metricas()
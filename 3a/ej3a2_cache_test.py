@@ -0,0 +1,201 @@
+"""
+Tests para ej3a2_cache.py, la caché de lectura sobre la capa de datos de ej3a2.
+"""
+
+import os
+import pytest
+from ej3a2 import crear_bd_desde_sql, obtener_libro_por_id, obtener_autor_por_id
+from ej3a2_cache import CacheLRU, BibliotecaCache
+
+DB_PATH = os.path.join(os.path.dirname(__file__), 'biblioteca.db')
+
+class RelojFalso:
+    """Reloj controlable para probar la caducidad sin esperar"""
+    def __init__(self):
+        self.ahora = 0.0
+
+    def __call__(self):
+        return self.ahora
+
+@pytest.fixture
+def conexion_bd():
+    """
+    Fixture que crea la base de datos a partir de test.sql
+    """
+    conn = crear_bd_desde_sql()
+
+    yield conn
+
+    conn.close()
+    if os.path.exists(DB_PATH):
+        try:
+            os.remove(DB_PATH)
+        except:
+            pass
+
+def contar_consultas(conexion):
+    """
+    Registra las sentencias SELECT ejecutadas sobre la conexión
+    """
+    sentencias = []
+    conexion.set_trace_callback(lambda sql: sentencias.append(sql) if sql.lstrip().upper().startswith('SELECT') else None)
+    return sentencias
+
+def test_obtener_por_id(conexion_bd):
+    """
+    Prueba las búsquedas por ID añadidas a ej3a2
+    """
+    libro = obtener_libro_por_id(conexion_bd, 1)
+    assert libro == (1, 'Cien años de soledad', 1967, 'Gabriel García Márquez')
+    assert obtener_libro_por_id(conexion_bd, 9999) is None
+    assert obtener_autor_por_id(conexion_bd, 2) == (2, 'Isabel Allende')
+    assert obtener_autor_por_id(conexion_bd, 9999) is None
+
+def test_cache_lru_expulsa_la_menos_usada():
+    """
+    Prueba que la caché respeta el tamaño máximo y expulsa la entrada menos usada
+    """
+    cache = CacheLRU(tamano_maximo=2, ttl=None)
+    cache.guardar('a', 1)
+    cache.guardar('b', 2)
+    # Usar 'a' la convierte en la más reciente
+    assert cache.obtener('a') == 1
+    cache.guardar('c', 3)
+
+    assert len(cache) == 2
+    assert cache.obtener('b') is None
+    assert cache.obtener('a') == 1
+    assert cache.obtener('c') == 3
+    assert cache.metricas()['expulsiones'] == 1
+
+def test_cache_lru_caducidad():
+    """
+    Prueba que las entradas caducan pasado el TTL
+    """
+    reloj = RelojFalso()
+    cache = CacheLRU(tamano_maximo=10, ttl=5, reloj=reloj)
+    cache.guardar('a', 1)
+
+    reloj.ahora = 4
+    assert cache.obtener('a') == 1
+    reloj.ahora = 6
+    assert cache.obtener('a') is None
+    assert cache.metricas()['caducadas'] == 1
+    assert len(cache) == 0
+
+def test_cache_guarda_valores_none():
+    """
+    Prueba que un resultado None (p.ej. libro inexistente) también se cachea
+    """
+    cache = CacheLRU()
+    llamadas = []
+    def cargar():
+        llamadas.append(1)
+        return None
+
+    assert cache.obtener_o_cargar('x', cargar) is None
+    assert cache.obtener_o_cargar('x', cargar) is None
+    assert len(llamadas) == 1
+
+def test_carga_invalidada_no_se_guarda():
+    """
+    Prueba que una carga durante la que se invalida la clave no deja el valor antiguo en la caché
+    """
+    cache = CacheLRU()
+    def cargar():
+        # Otro hilo escribe e invalida mientras se consulta la base de datos
+        cache.invalidar('x')
+        return 'antiguo'
+
+    assert cache.obtener_o_cargar('x', cargar) == 'antiguo'
+    assert cache.obtener('x') is None
+    assert cache.metricas()['descartadas'] == 1
+    assert cache.obtener_o_cargar('x', lambda: 'nuevo') == 'nuevo'
+    assert cache.obtener('x') == 'nuevo'
+
+def test_lecturas_repetidas_no_consultan(conexion_bd):
+    """
+    Prueba que las lecturas repetidas se sirven desde memoria
+    """
+    biblioteca = BibliotecaCache(conexion_bd)
+    sentencias = contar_consultas(conexion_bd)
+
+    for _ in range(5):
+        assert len(biblioteca.obtener_libros()) == 6
+        assert len(biblioteca.obtener_autores()) == 3
+        assert biblioteca.obtener_libro(1)[1] == 'Cien años de soledad'
+        assert biblioteca.obtener_autor(3) == (3, 'Jorge Luis Borges')
+
+    assert len(sentencias) == 4
+    metricas = biblioteca.metricas()
+    assert metricas['aciertos'] == 16
+    assert metricas['fallos'] == 4
+    assert metricas['tasa_aciertos'] == pytest.approx(0.8)
+    assert metricas['tamano'] == 4
+
+def test_escrituras_invalidan(conexion_bd):
+    """
+    Prueba que agregar_libro y actualizar_libro invalidan las entradas afectadas
+    """
+    biblioteca = BibliotecaCache(conexion_bd)
+    assert len(biblioteca.obtener_libros()) == 6
+    assert biblioteca.obtener_libro(7) is None
+
+    nuevo_id = biblioteca.agregar_libro('Violeta', 2022, 2)
+    assert nuevo_id == 7
+    assert len(biblioteca.obtener_libros()) == 7
+    assert biblioteca.obtener_libro(7) == (7, 'Violeta', 2022, 'Isabel Allende')
+
+    assert biblioteca.actualizar_libro(7, nuevo_anio=2023) is True
+    assert biblioteca.obtener_libro(7)[2] == 2023
+    assert (7, 'Violeta', 2023, 'Isabel Allende') in biblioteca.obtener_libros()
+
+    # Los autores no se ven afectados por escrituras de libros
+    biblioteca.obtener_autores()
+    aciertos = biblioteca.metricas()['aciertos']
+    biblioteca.obtener_autores()
+    assert biblioteca.metricas()['aciertos'] == aciertos + 1
+
+def test_resultados_son_copias(conexion_bd):
+    """
+    Prueba que modificar un listado devuelto no altera la caché
+    """
+    biblioteca = BibliotecaCache(conexion_bd)
+    libros = biblioteca.obtener_libros()
+    libros.clear()
+    biblioteca.obtener_autores().append((99, 'Intruso'))
+
+    assert len(biblioteca.obtener_libros()) == 6
+    assert (99, 'Intruso') not in biblioteca.obtener_autores()
+    assert biblioteca.metricas()['aciertos'] == 2
+
+def test_cache_lru_concurrente():
+    """
+    Prueba que varios hilos pueden leer y escribir a la vez sin romper la caché
+    """
+    import threading
+
+    cache = CacheLRU(tamano_maximo=50, ttl=None)
+    errores = []
+
+    def trabajar(inicio):
+        try:
+            for i in range(2000):
+                clave = (inicio + i) % 80
+                cache.guardar(clave, i)
+                cache.obtener((clave + 1) % 80)
+                if i % 7 == 0:
+                    cache.invalidar(clave)
+        except Exception as error:
+            errores.append(error)
+
+    hilos = [threading.Thread(target=trabajar, args=(n * 10,)) for n in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert errores == []
+    assert len(cache) <= 50
+    metricas = cache.metricas()
+    assert metricas['aciertos'] + metricas['fallos'] == 8 * 2000
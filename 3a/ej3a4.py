@@ -16,11 +16,20 @@ Este ejercicio se enfoca en las operaciones básicas de MongoDB desde Python uti
 import subprocess
 import time
 import os
+import shutil
 import sys
-from typing import List, Tuple, Optional
+import tempfile
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Tuple, Optional, Union
 
 import pymongo
 from bson.objectid import ObjectId
+from pymongo import DeleteOne, UpdateOne
+
+from ej3a4_clientes import obtener_cliente
+from ej3a4_indices import aplicar_indices
+from ej3a4_ingesta import TAMANO_LOTE_ESCRITURA, agrupar_en_lotes, ingerir
+from ej3a4_modelos import Autor, Libro
+from ej3a4_transacciones import admite_transacciones, ejecutar_transaccion
 
 # Configuración de MongoDB (la debes obtener de "docker-compose.yml"):
 DB_NAME = "biblioteca"
@@ -29,6 +38,16 @@ MONGODB_HOST = 'localhost'
 MONGODB_USERNAME = 'testuser'
 MONGODB_PASSWORD = 'testpass'
 
+# Número de documentos que devuelve el servidor en cada lote de un cursor
+TAMANO_LOTE_LECTURA = 1000
+
+# Espera de arranque: tiempo máximo y esperas entre comprobaciones (crecen exponencialmente)
+ARRANQUE_LIMITE_SEGUNDOS = 30.0
+ARRANQUE_ESPERA_INICIAL = 0.05
+ARRANQUE_ESPERA_MAXIMA = 1.0
+# Tiempo máximo de cada comprobación con ping
+SONDA_TIMEOUT_MS = 500
+
 def verificar_docker_instalado() -> bool:
     """
     Verifica si Docker está instalado en el sistema y el usuario tiene permisos
@@ -59,24 +78,64 @@ def verificar_docker_instalado() -> bool:
     except FileNotFoundError:
         return False
 
+def mongodb_disponible(con_credenciales: bool = True, timeout_ms: int = SONDA_TIMEOUT_MS) -> bool:
+    """
+    Comprueba con un ping si MongoDB acepta conexiones (y credenciales, si se indica)
+    """
+    credenciales = {'username': MONGODB_USERNAME, 'password': MONGODB_PASSWORD} if con_credenciales else {}
+    cliente = pymongo.MongoClient(host=MONGODB_HOST, port=MONGODB_PORT,
+                                  serverSelectionTimeoutMS=timeout_ms, connectTimeoutMS=timeout_ms,
+                                  **credenciales)
+    try:
+        cliente.admin.command('ping')
+        return True
+    except pymongo.errors.PyMongoError:
+        return False
+    finally:
+        cliente.close()
+
+def esperar_mongodb(
+        limite_segundos: float = ARRANQUE_LIMITE_SEGUNDOS,
+        con_credenciales: bool = True,
+        sonda: Optional[Callable[[], bool]] = None,
+        reloj: Callable[[], float] = time.monotonic,
+        dormir: Callable[[float], None] = time.sleep,
+        abortar: Optional[Callable[[], bool]] = None
+) -> Optional[float]:
+    """
+    Espera a que MongoDB responda al ping, con esperas exponenciales entre intentos.
+    Devuelve los segundos que ha tardado en estar listo, o None si se supera el límite
+    o si abortar() devuelve True (p.ej. porque el proceso de mongod ha terminado).
+    """
+    if sonda is None:
+        sonda = lambda: mongodb_disponible(con_credenciales)
+    inicio = reloj()
+    espera = ARRANQUE_ESPERA_INICIAL
+    while True:
+        if sonda():
+            return reloj() - inicio
+        if abortar is not None and abortar():
+            return None
+        restante = limite_segundos - (reloj() - inicio)
+        if restante <= 0:
+            return None
+        dormir(min(espera, restante))
+        espera = min(espera * 2, ARRANQUE_ESPERA_MAXIMA)
+
 def iniciar_mongodb_docker() -> bool:
     """
     Inicia MongoDB usando Docker Compose
     """
     try:
+        # Si ya hay una instancia sana la reutilizamos en lugar de reiniciarla
+        if mongodb_disponible():
+            print("MongoDB ya está en marcha, se reutiliza.")
+            return True
+
         # Obtener la ruta al directorio actual donde está el docker-compose.yml
         current_dir = os.path.dirname(os.path.abspath(__file__))
 
-        # Detener cualquier contenedor previo
-        subprocess.run(
-            ["docker", "compose", "down"],
-            cwd=current_dir,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True
-        )
-
-        # Iniciar MongoDB con docker-compose
+        # Iniciar MongoDB con docker-compose (si el contenedor existe, sólo se arranca)
         result = subprocess.run(
             ["docker", "compose", "up", "-d"],
             cwd=current_dir,
@@ -89,17 +148,84 @@ def iniciar_mongodb_docker() -> bool:
             print(f"Error al iniciar MongoDB: {result.stderr}")
             return False
 
-        # Dar tiempo para que MongoDB se inicie completamente
-        time.sleep(5)
+        # Esperamos a que MongoDB responda en lugar de dormir un tiempo fijo
+        tiempo = esperar_mongodb()
+        if tiempo is None:
+            print(f"MongoDB no respondió en {ARRANQUE_LIMITE_SEGUNDOS} segundos")
+            return False
+        print(f"MongoDB listo en {tiempo:.2f} segundos")
         return True
 
-    except subprocess.CalledProcessError as e:
-        print(f"Error al ejecutar Docker Compose: {e}")
-        return False
     except Exception as e:
         print(f"Error inesperado: {e}")
         return False
 
+def iniciar_mongodb_local(ruta_datos: Optional[str] = None) -> Optional[subprocess.Popen]:
+    """
+    Inicia un mongod local (sin Docker) con autenticación y el usuario de la configuración.
+    Devuelve el proceso o None si no hay binario mongod o no llega a arrancar.
+    Si no se indica ruta_datos se usa un directorio temporal, que se borra al
+    detenerlo con detener_mongodb_local (o enseguida si mongod no arranca).
+    """
+    binario = shutil.which('mongod')
+    if binario is None:
+        return None
+    ruta_temporal = None
+    if ruta_datos is None:
+        ruta_datos = ruta_temporal = tempfile.mkdtemp(prefix='mongodb_')
+    try:
+        proceso = subprocess.Popen(
+            [binario, '--auth', '--dbpath', ruta_datos, '--port', str(MONGODB_PORT), '--bind_ip', '127.0.0.1'],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+    except OSError:
+        if ruta_temporal is not None:
+            shutil.rmtree(ruta_temporal, ignore_errors=True)
+        raise
+    proceso.ruta_temporal = ruta_temporal
+    # Si mongod termina (puerto ocupado, dbpath inválido...) no tiene sentido esperar al límite
+    tiempo = esperar_mongodb(con_credenciales=False, abortar=lambda: proceso.poll() is not None)
+    if tiempo is None:
+        detener_mongodb_local(proceso)
+        return None
+    if not mongodb_disponible():
+        # Sin usuarios, la excepción de localhost permite crear el primero sin autenticarse
+        with pymongo.MongoClient(host=MONGODB_HOST, port=MONGODB_PORT,
+                                 serverSelectionTimeoutMS=SONDA_TIMEOUT_MS) as cliente:
+            cliente.admin.command('createUser', MONGODB_USERNAME, pwd=MONGODB_PASSWORD, roles=['root'])
+    print(f"MongoDB local listo en {tiempo:.2f} segundos")
+    return proceso
+
+def detener_mongodb_local(proceso: subprocess.Popen) -> None:
+    """
+    Detiene un mongod iniciado con iniciar_mongodb_local y borra su directorio temporal
+    """
+    proceso.terminate()
+    try:
+        proceso.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proceso.kill()
+        proceso.wait()
+    ruta_temporal = getattr(proceso, 'ruta_temporal', None)
+    if ruta_temporal is not None:
+        shutil.rmtree(ruta_temporal, ignore_errors=True)
+
+def iniciar_mongodb() -> Tuple[Optional[str], Optional[subprocess.Popen]]:
+    """
+    Deja MongoDB disponible reutilizando una instancia sana, con Docker o con un mongod local.
+    Devuelve (modo, proceso): modo es 'existente', 'docker', 'local' o None si no se pudo,
+    y proceso es el mongod local iniciado (o None).
+    """
+    if mongodb_disponible():
+        return 'existente', None
+    if verificar_docker_instalado() and iniciar_mongodb_docker():
+        return 'docker', None
+    proceso = iniciar_mongodb_local()
+    if proceso is not None:
+        return 'local', proceso
+    return None, None
+
 def detener_mongodb_docker() -> None:
     """
     Detiene el contenedor de MongoDB
@@ -122,8 +248,8 @@ def crear_conexion() -> pymongo.database.Database:
     """
     # Debes conectarte a la base de datos MongoDB usando PyMongo
     #pass
-    # Conectamos haciendo una instancia de MONGODB
-    mongo_client = pymongo.MongoClient(host = MONGODB_HOST, port = MONGODB_PORT, username = MONGODB_USERNAME, password = MONGODB_PASSWORD)
+    # Reutilizamos el cliente del proceso: crear uno por llamada arranca pools y autenticaciones nuevas
+    mongo_client = obtener_cliente(MONGODB_HOST, MONGODB_PORT, MONGODB_USERNAME, MONGODB_PASSWORD)
     # Elegimos la base de datos como si fuera un diccionario.
     database = mongo_client[DB_NAME]
     return database
@@ -140,11 +266,15 @@ def crear_colecciones(db: pymongo.database.Database) -> None:
     #pass
     # Especifico check_exists = False para que no pete el test que nos dan.
     db.create_collection('autores', check_exists= False)
-    db.autores.create_index('nombre')
     db.create_collection('libros', check_exists= False)
-    db.libros.create_index('nombre')
+    # Los índices se declaran en ej3a4_indices según las consultas que hacemos
+    aplicar_indices(db)
 
-def insertar_autores(db: pymongo.database.Database, autores: List[Tuple[str]]) -> List[str]:
+def insertar_autores(
+        db: pymongo.database.Database,
+        autores: Iterable[Union[Tuple[str], Autor]],
+        tamano_lote: int = TAMANO_LOTE_ESCRITURA
+) -> List[str]:
     """
     Inserta varios autores en la colección 'autores'
     """
@@ -152,17 +282,18 @@ def insertar_autores(db: pymongo.database.Database, autores: List[Tuple[str]]) -
     # 1. Convertir las tuplas a documentos
     # 2. Insertar los documentos
     # 3. Devolver los IDs como strings
-    # Para crear coleccion usamos el metodo insert_many de la db. y le pasamos el array de diccionarios.
-    list_autores = []
-    for autor in autores:
-        list_autores.append({'nombre' : autor[0]})
-    ids = db.autores.insert_many(list_autores)
-    #for id in ids:
-    #    print (f'id: {id}')
-    #print(f'IDS: {ids.inserted_ids}')
-    return ids.inserted_ids
-
-def insertar_libros(db: pymongo.database.Database, libros: List[Tuple[str, int, str]]) -> List[str]:
+    # Convertimos las tuplas sobre la marcha y las insertamos por lotes con bulk_write no ordenado.
+    # Autor.normalizar acepta también registros Autor y rechaza entradas mal formadas.
+    documentos = (Autor.normalizar(autor).a_documento() for autor in autores)
+    # Como insert_many, si algún autor no se inserta se lanza una excepción (ErrorIngesta, con los IDs parciales)
+    resultado = ingerir(db.autores, documentos, tamano_lote=tamano_lote, devolver_ids=True).comprobar()
+    return resultado.ids
+
+def insertar_libros(
+        db: pymongo.database.Database,
+        libros: Iterable[Union[Tuple[str, int, str], Libro]],
+        tamano_lote: int = TAMANO_LOTE_ESCRITURA
+) -> List[str]:
     """
     Inserta varios libros en la colección 'libros'
     """
@@ -171,18 +302,43 @@ def insertar_libros(db: pymongo.database.Database, libros: List[Tuple[str, int,
     # 2. Insertar los documentos
     # 3. Devolver los IDs como strings
     #pass
-    list_libros = []
-    for libro in libros:
-        list_libros.append({'titulo' : libro[0] , 'anio' : libro[1], 'autor_id' : libro[2]})
+    documentos = (Libro.normalizar(libro).a_documento() for libro in libros)
+    resultado = ingerir(db.libros, documentos, tamano_lote=tamano_lote, devolver_ids=True).comprobar()
+    return resultado.ids
 
-    ids = db.libros.insert_many(list_libros)
-    #for id in ids:
-    #    print (f'id: {id}')
-    #print(f'IDS: {ids.inserted_ids}')
-    return ids.inserted_ids
 
+def pipeline_listado_libros() -> List[dict]:
+    """
+    Agregación que une cada libro con su autor y deja sólo titulo, anio y nombre del autor
+    """
+    return [
+        {
+            "$lookup": {
+                "from": "autores",
+                "localField": "autor_id",
+                "foreignField": "_id",
+                "as": "autor"
+            }
+        },
+        # Los libros sin autor (o con un autor_id que no existe) también se listan
+        {"$unwind": {"path": "$autor", "preserveNullAndEmptyArrays": True}},
+        {"$project": {"_id": 0, "titulo": 1, "anio": 1, "autor": "$autor.nombre"}}
+    ]
 
-def consultar_libros(db: pymongo.database.Database) -> None:
+def iterar_libros(
+        db: pymongo.database.Database,
+        tamano_lote: int = TAMANO_LOTE_LECTURA
+) -> Iterator[Tuple[str, int, Optional[str]]]:
+    """
+    Recorre todos los libros devolviendo tuplas (titulo, anio, autor) a medida que llegan.
+    El cursor trae como mucho tamano_lote documentos por viaje, así que la memoria no crece con la colección.
+    """
+    cursor = db.libros.aggregate(pipeline_listado_libros(), batchSize=tamano_lote)
+    with cursor:
+        for doc in cursor:
+            yield doc.get("titulo"), doc.get("anio"), doc.get("autor")
+
+def consultar_libros(db: pymongo.database.Database, tamano_lote: int = TAMANO_LOTE_LECTURA) -> None:
     """
     Consulta todos los libros y muestra título, año y nombre del autor
     """
@@ -190,26 +346,34 @@ def consultar_libros(db: pymongo.database.Database) -> None:
     # 1. Realizar una agregación para unir libros con autores
     # 2. Mostrar los resultados
     #pass
-    #db.get_collection('libros')
-    # Se hace una agregacion y se le pasa un diccionario con lo que se quiere hacer. 
-    # El foreign key es la columna de libros que queremos vincular
-    # localField es el campo del documento "from"
+    # Se hace una agregacion uniendo libros.autor_id con autores._id.
+    # Imprimimos cada libro según llega del cursor en lugar de cargar la lista entera.
+    for titulo, anio, autor in iterar_libros(db, tamano_lote):
+        print(f"Libro: {titulo}, Año: {anio}, Autor: {autor}")
 
-    res = db.libros.aggregate([
+def pipeline_libros_por_autores(nombres_autor: List[str]) -> List[dict]:
+    """
+    Agregación que une cada autor con sus libros y deja sólo nombre, titulo y anio
+    """
+    return [
+        {"$match": {"nombre": {"$in": nombres_autor}}},
         {
-            "$lookup" : {
-                "from" : "autores",
-                "foreignField" : "autor_id",
-                "localField" : "nombre",
-                "as" : "autor_id"
+            "$lookup": {
+                "from": "libros",
+                "localField": "_id",
+                "foreignField": "autor_id",
+                "as": "libros"
             }
-        }
-
-    ])
-    
-    print(f"{res.to_list()}")
+        },
+        {"$unwind": "$libros"},
+        {"$project": {"_id": 0, "nombre": 1, "titulo": "$libros.titulo", "anio": "$libros.anio"}}
+    ]
 
-def buscar_libros_por_autor(db: pymongo.database.Database, nombre_autor: str) -> List[Tuple[str, int]]:
+def buscar_libros_por_autor(
+        db: pymongo.database.Database,
+        nombre_autor: str,
+        tamano_lote: int = TAMANO_LOTE_LECTURA
+) -> List[Tuple[str, int]]:
     """
     Busca libros por el nombre del autor
     """
@@ -217,18 +381,67 @@ def buscar_libros_por_autor(db: pymongo.database.Database, nombre_autor: str) ->
     # 1. Primero encontrar el autor y buscar todos los libros del autor
     # 2. Convertir a lista de tuplas (titulo, anio)
     #pass
-    # Primero busco el autor.
-    list_libros = []
-    docs_autor = db.autores.find({"nombre" : nombre_autor})
-    for doc_autor in docs_autor:
-        # Primero es la query., el segundo son los  campos que queremos que devuelva
-#        docs_libro = db.libros.find({"autor_id" : doc_autor['nombre']}, { 'titulo' : 1 , 'anio' : 1 , 'autor_id' : 0})
-        #print(f"ASDASDASDAS: {doc_autor}, asdasd : {doc_autor['nombre']}")
-        # En el autor_id se guarda el _id del documento autor.
-        docs_libro = db.libros.find({"autor_id" : doc_autor['_id']})
-        for doc_libro in docs_libro:
-            list_libros.append((doc_libro['titulo'], doc_libro['anio']))
-    return list_libros
+    # Una sola agregación ($lookup) en lugar de una consulta de libros por cada autor encontrado.
+    cursor = db.autores.aggregate(pipeline_libros_por_autores([nombre_autor]), batchSize=tamano_lote)
+    return [(doc["titulo"], doc["anio"]) for doc in cursor]
+
+def buscar_libros_por_autores(
+        db: pymongo.database.Database,
+        nombres_autor: Iterable[str],
+        tamano_lote: int = TAMANO_LOTE_LECTURA
+) -> Dict[str, List[Tuple[str, int]]]:
+    """
+    Busca los libros de varios autores en una sola consulta.
+    Devuelve un diccionario nombre -> lista de tuplas (titulo, anio), con todos los nombres pedidos.
+    """
+    libros_por_autor = {nombre: [] for nombre in nombres_autor}
+    if not libros_por_autor:
+        return libros_por_autor
+    cursor = db.autores.aggregate(pipeline_libros_por_autores(list(libros_por_autor)), batchSize=tamano_lote)
+    for doc in cursor:
+        libros_por_autor[doc["nombre"]].append((doc["titulo"], doc["anio"]))
+    return libros_por_autor
+
+class ResultadoActualizacion(NamedTuple):
+    """
+    Resultado de actualizar uno o varios libros
+    """
+    encontrados: int
+    modificados: int
+
+    @property
+    def sin_cambios(self) -> int:
+        # Libros encontrados que ya tenían esos valores
+        return self.encontrados - self.modificados
+
+def _campos_actualizacion(nuevo_titulo: Optional[str], nuevo_anio: Optional[int]) -> Dict[str, Any]:
+    """
+    Diccionario con los campos a actualizar (los None se ignoran)
+    """
+    update_dict = {}
+    if nuevo_titulo is not None:
+        update_dict['titulo'] = nuevo_titulo
+    if nuevo_anio is not None:
+        update_dict['anio'] = nuevo_anio
+    return update_dict
+
+def actualizar_libro_detalle(
+        db: pymongo.database.Database,
+        id_libro: str,
+        nuevo_titulo: Optional[str]=None,
+        nuevo_anio: Optional[int]=None
+) -> ResultadoActualizacion:
+    """
+    Actualiza un libro e informa de si se encontró y de si cambió algún valor
+    """
+    update_dict = _campos_actualizacion(nuevo_titulo, nuevo_anio)
+    # Nos pasan el object id en string por lo que para hacer la busqueda, hay que hacer un cast a ObjectId
+    filtro = {'_id' : ObjectId(id_libro)}
+    if not update_dict:
+        # Nada que cambiar: sólo comprobamos que existe
+        return ResultadoActualizacion(db.libros.count_documents(filtro, limit=1), 0)
+    res = db.libros.update_one(filter= filtro, update= { '$set' : update_dict})
+    return ResultadoActualizacion(res.matched_count, res.modified_count)
 
 def actualizar_libro(
         db: pymongo.database.Database,
@@ -243,14 +456,26 @@ def actualizar_libro(
     # 1. Crear diccionario de actualización
     # 2. Realizar la actualización
     # el diccionario de update ha de tener la clave $set para indicar  los valores que acutalizamos.
-    update_dict = {}
-    if nuevo_titulo is not None:
-        update_dict['titulo'] = nuevo_titulo
-    if nuevo_anio is not None:
-        update_dict['anio'] = nuevo_anio
-    # Nos pasan el object id en string por lo que para hacer la busqueda, hay que hacer un cast a ObjectId
-    res = db.libros.update_many(filter= {'_id' : ObjectId(id_libro)}, update= { '$set' : update_dict})
-    return res.matched_count == res.modified_count
+    # Devolvemos True si el libro existe, aunque ya tuviera esos valores.
+    return actualizar_libro_detalle(db, id_libro, nuevo_titulo, nuevo_anio).encontrados > 0
+
+def actualizar_libros(
+        db: pymongo.database.Database,
+        cambios: Iterable[Tuple[str, Dict[str, Any]]],
+        tamano_lote: int = TAMANO_LOTE_ESCRITURA
+) -> ResultadoActualizacion:
+    """
+    Actualiza muchos libros a partir de pares (id, campos a cambiar).
+    Cada lote se envía como un único bulk_write de UpdateOne.
+    """
+    encontrados = modificados = 0
+    operaciones = (UpdateOne({'_id' : ObjectId(id_libro)}, {'$set' : campos})
+                   for id_libro, campos in cambios if campos)
+    for lote in agrupar_en_lotes(operaciones, tamano_lote):
+        res = db.libros.bulk_write(lote, ordered=False)
+        encontrados += res.matched_count
+        modificados += res.modified_count
+    return ResultadoActualizacion(encontrados, modificados)
 
 
 def eliminar_libro(
@@ -262,9 +487,24 @@ def eliminar_libro(
     """
     # Debes eliminar el libro con el ID proporcionado
     #pass
-    res = db.libros.delete_many(filter = {'_id' : ObjectId(id_libro)})
+    res = db.libros.delete_one(filter = {'_id' : ObjectId(id_libro)})
     return res.deleted_count > 0
 
+def eliminar_libros(
+        db: pymongo.database.Database,
+        ids_libro: Iterable[str],
+        tamano_lote: int = TAMANO_LOTE_ESCRITURA
+) -> int:
+    """
+    Elimina muchos libros por su ID con un bulk_write de DeleteOne por lote.
+    Devuelve el número de libros eliminados.
+    """
+    eliminados = 0
+    operaciones = (DeleteOne({'_id' : ObjectId(id_libro)}) for id_libro in ids_libro)
+    for lote in agrupar_en_lotes(operaciones, tamano_lote):
+        eliminados += db.libros.bulk_write(lote, ordered=False).deleted_count
+    return eliminados
+
 def ejemplo_transaccion(db: pymongo.database.Database) -> bool:
     """
     Demuestra el uso de operaciones agrupadas
@@ -274,44 +514,52 @@ def ejemplo_transaccion(db: pymongo.database.Database) -> bool:
     # 2. Insertar dos libros del autor
     # Intentar limpiar los datos en caso de error
     #pass
-    # Primero hemos de crear la sesion, podemos hacerlo desde la conexion , la podemos recuperar desde db con client.
-    with db.client.start_session() as session:
-        # creamos la transaccion
-        session.start_transaction()
+    insertados = {'autor_id' : None}
+
+    def operaciones(session):
+        # Todas las operaciones reciben la sesión: si no, quedarían fuera de la transacción.
+        autor_id = db.autores.insert_one(document = {'nombre' : 'Pimpollo'}, session = session).inserted_id
+        insertados['autor_id'] = autor_id
+        db.libros.insert_many(documents = [{'titulo' : 'C', 'anio' : 1982 , 'autor_id' : autor_id},
+                                           {'titulo' : 'D', 'anio' : 1922 , 'autor_id' : autor_id}],
+                              session = session)
+        return autor_id
+
+    if admite_transacciones(db.client):
+        # with_transaction hace commit, o abort si algo falla, y reintenta los errores transitorios.
         try:
-            res = db.autores.insert_one(document = {'nombre' : 'Pimpollo'})
-            if res == None:
-                raise Exception('Error inserting one document')
-            res = db.libros.insert_many(documents = [{'titulo' : 'C', 'anio' : 1982 , 'autor_id' : 'a'},{'titulo' : 'D', 'anio' : 1922 , 'autor_id' : 'b'}])
-            if res.inserted_ids is None or not res.inserted_ids:
-                raise Exception('Error inserting many documents') 
-            # hacemos commmit.
-            session.commit_transaction()    
-        except Exception as e:
-            # Hubieron problemas, abortamos la transaccion.
-            session.abort_transaction()
+            ejecutar_transaccion(db.client, operaciones)
+        except pymongo.errors.PyMongoError as e:
+            print(f"Error en la transacción: {e}")
             return False
         return True
 
+    # Un servidor standalone no admite transacciones: operaciones sueltas y limpieza manual si fallan.
+    try:
+        operaciones(None)
+    except pymongo.errors.PyMongoError as e:
+        print(f"Error en las operaciones agrupadas: {e}")
+        if insertados['autor_id'] is not None:
+            db.libros.delete_many({'autor_id' : insertados['autor_id']})
+            db.autores.delete_one({'_id' : insertados['autor_id']})
+        return False
+    return True
+
 
 if __name__ == "__main__":
     mongodb_proceso = None
+    modo = None
     db = None
 
     try:
-        # Verificar si Docker está instalado
-        if not verificar_docker_instalado():
-            print("Error: Docker no está instalado o no está disponible en el PATH.")
-            print("Por favor, instala Docker y asegúrate de que esté en tu PATH.")
+        # Reutilizar una instancia en marcha, o iniciarla con Docker o con un mongod local
+        print("Iniciando MongoDB...")
+        modo, mongodb_proceso = iniciar_mongodb()
+        if modo is None:
+            print("No se pudo iniciar MongoDB: instala Docker (y asegúrate de que esté en tu PATH) o mongod.")
             sys.exit(1)
 
-        # Iniciar MongoDB usando Docker
-        print("Iniciando MongoDB con Docker...")
-        if not iniciar_mongodb_docker():
-            print("No se pudo iniciar MongoDB. Asegúrate de tener los permisos necesarios.")
-            sys.exit(1)
-
-        print("MongoDB iniciado correctamente.")
+        print(f"MongoDB iniciado correctamente ({modo}).")
 
         # Crear una conexión
         print("Conectando a MongoDB...")
@@ -320,8 +568,9 @@ if __name__ == "__main__":
 
         # TODO: Implementar el código para probar las funciones
         crear_colecciones(db)
-        insertar_autores(db, [{'nombre' : 'Gabriel'}, {'nombre' : 'Gregorio'}])
-        insertar_libros(db, [{'name' : 'El quijote' }])
+        autor_ids = insertar_autores(db, [('Gabriel',), ('Gregorio',)])
+        insertar_libros(db, [('El quijote', 1605, autor_ids[0])])
+        consultar_libros(db)
 
 
     except Exception as e:
@@ -332,8 +581,11 @@ if __name__ == "__main__":
             print("\nConexión a MongoDB cerrada.")
 
         # Detener el proceso de MongoDB si lo iniciamos nosotros
-        if mongodb_proceso:
+        if modo == 'docker':
             print("Deteniendo MongoDB...")
             detener_mongodb_docker()
-
+            print("MongoDB detenido correctamente.")
+        elif mongodb_proceso:
+            print("Deteniendo MongoDB...")
+            detener_mongodb_local(mongodb_proceso)
             print("MongoDB detenido correctamente.")
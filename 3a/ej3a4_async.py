@@ -0,0 +1,306 @@
+"""
+Versión asyncio de la API de ej3a4 sobre la API asíncrona de PyMongo (AsyncMongoClient).
+
+Las funciones tienen la misma semántica que sus equivalentes de ej3a4 pero son
+corrutinas: mientras una espera la respuesta de MongoDB el bucle de eventos
+atiende otras, sin un hilo bloqueado por petición. La lógica que no hace E/S
+(modelos de índices y su plan de cambios, campos de actualización, pipelines,
+lotes de ingesta y sus errores, opciones de transacción) se importa de los
+módulos síncronos para que ambas versiones no diverjan.
+
+medir_concurrencia() mide el rendimiento con 10, 100 y 1000 búsquedas en vuelo.
+Las consultas en el servidor a la vez no pueden superar maxPoolSize del cliente:
+por encima, el resto espera una conexión libre y se mide la cola del pool. Por
+eso _main crea el cliente con un pool del tamaño del nivel más alto, y el
+resultado de cada nivel indica si el pool lo limitó.
+"""
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar, Union
+
+from bson.objectid import ObjectId
+from pymongo import AsyncMongoClient
+from pymongo.asynchronous.client_session import AsyncClientSession
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import PyMongoError
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+
+from ej3a4 import (DB_NAME, MONGODB_HOST, MONGODB_PORT, MONGODB_USERNAME, MONGODB_PASSWORD,
+                   TAMANO_LOTE_LECTURA, ResultadoActualizacion, _campos_actualizacion,
+                   pipeline_libros_por_autores, pipeline_listado_libros)
+from ej3a4_clientes import MONGODB_MAX_POOL_SIZE, MONGODB_MAX_IDLE_TIME_MS, MONGODB_SERVER_SELECTION_TIMEOUT_MS
+from ej3a4_indices import indices_declarados, planificar_indices
+from ej3a4_ingesta import (TAMANO_LOTE_ESCRITURA, ResultadoIngesta, agrupar_en_lotes, operaciones_lote,
+                           resultado_lote)
+from ej3a4_modelos import Autor, Libro
+from ej3a4_transacciones import (METRICAS, PERFIL_POR_DEFECTO, MedicionTransaccion, MetricasTransacciones,
+                                 hello_admite_transacciones, opciones_transaccion)
+
+T = TypeVar('T')
+
+# Niveles de concurrencia de la medición
+NIVELES_CONCURRENCIA = (10, 100, 1000)
+
+
+def crear_conexion(max_pool_size: int = MONGODB_MAX_POOL_SIZE) -> AsyncDatabase:
+    """
+    Crea un cliente asíncrono y devuelve la base de datos de la biblioteca.
+    El cliente pertenece al bucle de eventos actual: ciérralo con `await db.client.close()`.
+    """
+    cliente = AsyncMongoClient(host=MONGODB_HOST, port=MONGODB_PORT, username=MONGODB_USERNAME,
+                               password=MONGODB_PASSWORD, maxPoolSize=max_pool_size,
+                               maxIdleTimeMS=MONGODB_MAX_IDLE_TIME_MS,
+                               serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS)
+    return cliente[DB_NAME]
+
+
+async def aplicar_indices(db: AsyncDatabase, nombre_autor_unico: bool = False) -> Dict[str, List[str]]:
+    """
+    Equivalente asíncrono de ej3a4_indices.aplicar_indices: crea los índices que faltan,
+    rehace los que cambiaron de definición y elimina los obsoletos
+    """
+    creados = {}
+    for coleccion, modelos in indices_declarados(nombre_autor_unico).items():
+        eliminar, pendientes = planificar_indices(coleccion, modelos, await db[coleccion].index_information())
+        for nombre in eliminar:
+            await db[coleccion].drop_index(nombre)
+        if pendientes:
+            await db[coleccion].create_indexes(pendientes)
+        creados[coleccion] = [modelo.document['name'] for modelo in pendientes]
+    return creados
+
+
+async def crear_colecciones(db: AsyncDatabase, nombre_autor_unico: bool = False) -> None:
+    """
+    Crea las colecciones y los índices declarados en ej3a4_indices
+    """
+    existentes = await db.list_collection_names()
+    for coleccion in ('autores', 'libros'):
+        if coleccion not in existentes:
+            await db.create_collection(coleccion)
+    await aplicar_indices(db, nombre_autor_unico)
+
+
+async def _insertar(coleccion, documentos: Iterable[Dict[str, Any]], tamano_lote: int) -> List[ObjectId]:
+    """
+    Como ej3a4_ingesta.ingerir(...).comprobar(): lotes de bulk_write no ordenados que
+    siguen aunque uno falle; al final, si hubo errores, se lanza ErrorIngesta con los IDs insertados
+    """
+    resultado = ResultadoIngesta()
+    inicio = time.perf_counter()
+    for numero, lote in enumerate(agrupar_en_lotes(documentos, tamano_lote)):
+        try:
+            await coleccion.bulk_write(operaciones_lote(lote), ordered=False)
+        except PyMongoError as e:
+            _, ids, errores = resultado_lote(numero, lote, e)
+        else:
+            _, ids, errores = resultado_lote(numero, lote)
+        resultado.registrar_lote(ids, errores)
+        resultado.ids.extend(ids)
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado.comprobar().ids
+
+
+async def insertar_autores(db: AsyncDatabase, autores: Iterable[Union[Tuple[str], Autor]],
+                           tamano_lote: int = TAMANO_LOTE_ESCRITURA) -> List[ObjectId]:
+    """
+    Inserta varios autores y devuelve sus IDs
+    """
+    return await _insertar(db.autores, (Autor.normalizar(autor).a_documento() for autor in autores), tamano_lote)
+
+
+async def insertar_libros(db: AsyncDatabase, libros: Iterable[Union[Tuple[str, int, Any], Libro]],
+                          tamano_lote: int = TAMANO_LOTE_ESCRITURA) -> List[ObjectId]:
+    """
+    Inserta varios libros y devuelve sus IDs
+    """
+    return await _insertar(db.libros, (Libro.normalizar(libro).a_documento() for libro in libros), tamano_lote)
+
+
+async def iterar_libros(db: AsyncDatabase,
+                        tamano_lote: int = TAMANO_LOTE_LECTURA) -> AsyncIterator[Tuple[str, int, Optional[str]]]:
+    """
+    Recorre todos los libros devolviendo tuplas (titulo, anio, autor) a medida que llegan
+    """
+    cursor = await db.libros.aggregate(pipeline_listado_libros(), batchSize=tamano_lote)
+    async with cursor:
+        async for doc in cursor:
+            yield doc.get("titulo"), doc.get("anio"), doc.get("autor")
+
+
+async def buscar_libros_por_autor(db: AsyncDatabase, nombre_autor: str,
+                                  tamano_lote: int = TAMANO_LOTE_LECTURA) -> List[Tuple[str, int]]:
+    """
+    Busca libros por el nombre del autor
+    """
+    cursor = await db.autores.aggregate(pipeline_libros_por_autores([nombre_autor]), batchSize=tamano_lote)
+    return [(doc["titulo"], doc["anio"]) async for doc in cursor]
+
+
+async def actualizar_libro_detalle(db: AsyncDatabase, id_libro: str, nuevo_titulo: Optional[str] = None,
+                                   nuevo_anio: Optional[int] = None) -> ResultadoActualizacion:
+    """
+    Actualiza un libro e informa de si se encontró y de si cambió algún valor
+    """
+    update_dict = _campos_actualizacion(nuevo_titulo, nuevo_anio)
+    filtro = {'_id': ObjectId(id_libro)}
+    if not update_dict:
+        return ResultadoActualizacion(await db.libros.count_documents(filtro, limit=1), 0)
+    res = await db.libros.update_one(filtro, {'$set': update_dict})
+    return ResultadoActualizacion(res.matched_count, res.modified_count)
+
+
+async def actualizar_libro(db: AsyncDatabase, id_libro: str, nuevo_titulo: Optional[str] = None,
+                           nuevo_anio: Optional[int] = None) -> bool:
+    """
+    Actualiza la información de un libro; True si el libro existe
+    """
+    return (await actualizar_libro_detalle(db, id_libro, nuevo_titulo, nuevo_anio)).encontrados > 0
+
+
+async def eliminar_libro(db: AsyncDatabase, id_libro: str) -> bool:
+    """
+    Elimina un libro por su ID
+    """
+    res = await db.libros.delete_one({'_id': ObjectId(id_libro)})
+    return res.deleted_count > 0
+
+
+async def admite_transacciones(cliente: AsyncMongoClient) -> bool:
+    """
+    Indica si el servidor admite transacciones (replica set o clúster con mongos)
+    """
+    try:
+        hello = await cliente.admin.command('hello')
+    except PyMongoError:
+        return False
+    return hello_admite_transacciones(hello)
+
+
+async def ejecutar_transaccion(
+        cliente: AsyncMongoClient,
+        funcion: Callable[[AsyncClientSession], Awaitable[T]],
+        perfil: str = PERFIL_POR_DEFECTO,
+        read_concern: Optional[ReadConcern] = None,
+        write_concern: Optional[WriteConcern] = None,
+        metricas: MetricasTransacciones = METRICAS
+) -> T:
+    """
+    Equivalente asíncrono de ej3a4_transacciones.ejecutar_transaccion
+    (mismos perfiles, sustitución de read_concern/write_concern y medición de reintentos)
+    """
+    opciones = opciones_transaccion(perfil, read_concern, write_concern)
+    medicion = MedicionTransaccion(metricas)
+
+    async def callback(session):
+        medicion.inicio_callback()
+        resultado = await funcion(session)
+        medicion.fin_callback()
+        return resultado
+
+    try:
+        async with cliente.start_session() as session:
+            resultado = await session.with_transaction(callback, **opciones)
+    except PyMongoError:
+        medicion.fallida()
+        raise
+    medicion.confirmada()
+    return resultado
+
+
+async def ejemplo_transaccion(db: AsyncDatabase) -> bool:
+    """
+    Inserta un autor y dos libros suyos como una unidad (ver ej3a4.ejemplo_transaccion)
+    """
+    insertados = {'autor_id': None}
+
+    async def operaciones(session):
+        autor_id = (await db.autores.insert_one({'nombre': 'Pimpollo'}, session=session)).inserted_id
+        insertados['autor_id'] = autor_id
+        await db.libros.insert_many([{'titulo': 'C', 'anio': 1982, 'autor_id': autor_id},
+                                     {'titulo': 'D', 'anio': 1922, 'autor_id': autor_id}], session=session)
+        return autor_id
+
+    if await admite_transacciones(db.client):
+        try:
+            await ejecutar_transaccion(db.client, operaciones)
+        except PyMongoError as e:
+            print(f"Error en la transacción: {e}")
+            return False
+        return True
+
+    try:
+        await operaciones(None)
+    except PyMongoError as e:
+        print(f"Error en las operaciones agrupadas: {e}")
+        if insertados['autor_id'] is not None:
+            await db.libros.delete_many({'autor_id': insertados['autor_id']})
+            await db.autores.delete_one({'_id': insertados['autor_id']})
+        return False
+    return True
+
+
+async def medir_concurrencia(
+        db: AsyncDatabase,
+        nombres_autor: List[str],
+        total: int = 5000,
+        niveles: Iterable[int] = NIVELES_CONCURRENCIA,
+        consulta: Callable[[AsyncDatabase, str], Awaitable[Any]] = buscar_libros_por_autor
+) -> Dict[int, Dict[str, float]]:
+    """
+    Lanza `total` búsquedas por autor con como mucho N en vuelo para cada nivel N.
+    Devuelve por nivel las consultas por segundo, el máximo de consultas simultáneas
+    alcanzado, el tamaño del pool del cliente (None si no se conoce) y si el nivel lo
+    supera ('limitado_por_pool'): en ese caso no hay más de max_pool_size en el servidor.
+    """
+    cliente = getattr(db, 'client', None)
+    tamano_pool = cliente.options.pool_options.max_pool_size if cliente is not None else None
+    resultados = {}
+    for nivel in niveles:
+        semaforo = asyncio.Semaphore(nivel)
+        en_vuelo = maximo = 0
+
+        async def una_consulta(i):
+            nonlocal en_vuelo, maximo
+            async with semaforo:
+                en_vuelo += 1
+                maximo = max(maximo, en_vuelo)
+                try:
+                    await consulta(db, nombres_autor[i % len(nombres_autor)])
+                finally:
+                    en_vuelo -= 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(una_consulta(i) for i in range(total)))
+        segundos = time.perf_counter() - inicio
+        resultados[nivel] = {'consultas_por_segundo': total / segundos, 'segundos': segundos,
+                             'maximo_en_vuelo': maximo, 'max_pool_size': tamano_pool,
+                             'limitado_por_pool': tamano_pool is not None and nivel > tamano_pool}
+    return resultados
+
+
+async def _main():
+    # Base de datos aparte para no tocar los datos de la biblioteca
+    # Una conexión por consulta en vuelo en el nivel más alto: si no, se mediría la cola del pool
+    cliente = crear_conexion(max_pool_size=max(NIVELES_CONCURRENCIA)).client
+    db = cliente['biblioteca_bench']
+    try:
+        await crear_colecciones(db)
+        nombres = [f"Autor {i}" for i in range(100)]
+        autor_ids = await insertar_autores(db, [(nombre,) for nombre in nombres])
+        await insertar_libros(db, [(f"Libro {i}", 1900 + i % 120, autor_ids[i % len(autor_ids)])
+                                   for i in range(10000)])
+        for nivel, datos in (await medir_concurrencia(db, nombres)).items():
+            limite = f" (limitado por maxPoolSize={datos['max_pool_size']})" if datos['limitado_por_pool'] else ""
+            print(f"{nivel:>5} en vuelo: {datos['consultas_por_segundo']:>8.0f} consultas/s "
+                  f"({datos['segundos']:.2f} s){limite}")
+    finally:
+        await cliente.drop_database(db.name)
+        await cliente.close()
+
+
+if __name__ == "__main__":
+    # Necesita un MongoDB en marcha (ver ej3a4.iniciar_mongodb)
+    asyncio.run(_main())
@@ -0,0 +1,245 @@
+"""
+Tests para ej3a4_async.py, la versión asyncio de la API de ej3a4.
+La medición de concurrencia se prueba con una consulta simulada y la lógica
+compartida con ej3a4 (índices, ingesta, actualización, transacciones) con
+mongomock o clientes falsos; el CRUD completo necesita un MongoDB en marcha y
+se omite si no lo hay.
+"""
+
+import asyncio
+import pytest
+from bson.objectid import ObjectId
+from pymongo.errors import PyMongoError
+from pymongo.write_concern import WriteConcern
+import ej3a4_async
+from ej3a4 import mongodb_disponible
+from ej3a4_ingesta import ErrorIngesta
+from ej3a4_transacciones import PERFILES_CONCERN, MetricasTransacciones
+
+mongomock = pytest.importorskip("mongomock")
+
+@pytest.fixture(scope="module")
+def mongodb():
+    """Fixture que omite las pruebas si no hay un MongoDB disponible"""
+    if not mongodb_disponible():
+        pytest.skip("No hay un MongoDB disponible")
+
+def ejecutar(corrutina_de_db):
+    """Ejecuta la corrutina con una base de datos de pruebas que se borra al terminar"""
+    async def envoltorio():
+        cliente = ej3a4_async.crear_conexion().client
+        db = cliente['biblioteca_async_test']
+        try:
+            await ej3a4_async.crear_colecciones(db)
+            return await corrutina_de_db(db)
+        finally:
+            await cliente.drop_database(db.name)
+            await cliente.close()
+    return asyncio.run(envoltorio())
+
+def test_medir_concurrencia_respeta_los_niveles():
+    """Prueba que nunca hay más consultas en vuelo que el nivel indicado"""
+    async def consulta(db, nombre):
+        await asyncio.sleep(0.001)
+
+    resultados = asyncio.run(ej3a4_async.medir_concurrencia(None, ["A", "B"], total=200,
+                                                            niveles=(1, 10, 100), consulta=consulta))
+
+    assert sorted(resultados) == [1, 10, 100]
+    for nivel, datos in resultados.items():
+        assert datos['maximo_en_vuelo'] == nivel
+        assert datos['consultas_por_segundo'] > 0
+        assert datos['max_pool_size'] is None
+        assert datos['limitado_por_pool'] is False
+    # Con más consultas en vuelo se termina antes
+    assert resultados[100]['segundos'] < resultados[1]['segundos']
+
+def test_medir_concurrencia_indica_el_limite_del_pool():
+    """Prueba que se indica qué niveles superan maxPoolSize del cliente"""
+    async def consulta(db, nombre):
+        await asyncio.sleep(0)
+
+    async def medir():
+        db = ej3a4_async.crear_conexion(max_pool_size=50)
+        try:
+            return await ej3a4_async.medir_concurrencia(db, ["A"], total=20, niveles=(10, 100), consulta=consulta)
+        finally:
+            await db.client.close()
+
+    resultados = asyncio.run(medir())
+
+    assert resultados[10]['max_pool_size'] == 50
+    assert resultados[10]['limitado_por_pool'] is False
+    assert resultados[100]['limitado_por_pool'] is True
+
+def test_crud_async(mongodb):
+    """Prueba inserción, búsqueda, actualización y eliminación asíncronas"""
+    async def prueba(db):
+        autor_ids = await ej3a4_async.insertar_autores(db, [("Isabel Allende",), ("Jorge Luis Borges",)])
+        libro_ids = await ej3a4_async.insertar_libros(db, [("Paula", 1994, autor_ids[0]),
+                                                           ("Ficciones", 1944, autor_ids[1])])
+        assert len(libro_ids) == 2
+
+        assert await ej3a4_async.buscar_libros_por_autor(db, "Isabel Allende") == [("Paula", 1994)]
+        listado = [libro async for libro in ej3a4_async.iterar_libros(db)]
+        assert ("Ficciones", 1944, "Jorge Luis Borges") in listado
+
+        resultado = await ej3a4_async.actualizar_libro_detalle(db, str(libro_ids[0]), nuevo_anio=1995)
+        assert resultado == (1, 1)
+        assert await ej3a4_async.actualizar_libro(db, str(ObjectId()), nuevo_anio=1995) is False
+
+        assert await ej3a4_async.eliminar_libro(db, str(libro_ids[1])) is True
+        assert await ej3a4_async.eliminar_libro(db, str(libro_ids[1])) is False
+
+    ejecutar(prueba)
+
+def test_ejemplo_transaccion_async(mongodb):
+    """Prueba el autor y los dos libros insertados como una unidad"""
+    async def prueba(db):
+        assert await ej3a4_async.ejemplo_transaccion(db) is True
+        autor = await db.autores.find_one({'nombre': 'Pimpollo'})
+        assert await db.libros.count_documents({'autor_id': autor['_id']}) == 2
+
+    ejecutar(prueba)
+
+class Asincrono:
+    """Envuelve una base de datos o colección de mongomock con métodos awaitables"""
+    def __init__(self, objeto):
+        self._objeto = objeto
+
+    def __getitem__(self, nombre):
+        return Asincrono(self._objeto[nombre])
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._objeto, nombre)
+        if isinstance(atributo, (mongomock.Database, mongomock.Collection)):
+            return Asincrono(atributo)
+
+        async def llamada(*args, **kwargs):
+            return atributo(*args, **kwargs)
+        return llamada
+
+@pytest.fixture
+def db_simulada():
+    """Base de datos de mongomock con la API awaitable que usa ej3a4_async"""
+    return Asincrono(mongomock.MongoClient().biblioteca)
+
+def test_crear_colecciones_rehace_indices_cambiados(db_simulada):
+    """Prueba que crear_colecciones usa el plan de índices de ej3a4_indices"""
+    asyncio.run(ej3a4_async.crear_colecciones(db_simulada))
+    libros = db_simulada._objeto.libros
+    libros.create_index('nombre', name='nombre_1')
+
+    creados = asyncio.run(ej3a4_async.aplicar_indices(db_simulada, nombre_autor_unico=True))
+
+    assert creados == {'autores': ['nombre_1'], 'libros': []}
+    assert 'nombre_1' not in libros.index_information()
+    assert db_simulada._objeto.autores.index_information()['nombre_1']['unique'] is True
+    # Otra vez no cambia nada: no hay IndexOptionsConflict por recrear con otras opciones
+    assert asyncio.run(ej3a4_async.aplicar_indices(db_simulada, nombre_autor_unico=True)) == \
+        {'autores': [], 'libros': []}
+
+def test_insertar_sigue_y_lanza_error_ingesta(db_simulada):
+    """Prueba que, como la versión síncrona, un duplicado no detiene el resto y se lanza ErrorIngesta"""
+    asyncio.run(ej3a4_async.crear_colecciones(db_simulada, nombre_autor_unico=True))
+    asyncio.run(ej3a4_async.insertar_autores(db_simulada, [("Borges",)]))
+
+    with pytest.raises(ErrorIngesta) as error:
+        asyncio.run(ej3a4_async.insertar_autores(db_simulada, [("Cortázar",), ("Borges",), ("Rulfo",)],
+                                                 tamano_lote=2))
+
+    assert len(error.value.ids) == 2
+    assert error.value.details['nInserted'] == 2
+    assert len(error.value.details['writeErrors']) == 1
+    assert sorted(a['nombre'] for a in db_simulada._objeto.autores.find()) == ["Borges", "Cortázar", "Rulfo"]
+
+def test_actualizar_libro_detalle_simulado(db_simulada):
+    """Prueba la actualización con los campos de ej3a4._campos_actualizacion"""
+    libro_id, = asyncio.run(ej3a4_async.insertar_libros(db_simulada, [("Paula", 1994, ObjectId())]))
+
+    assert asyncio.run(ej3a4_async.actualizar_libro_detalle(db_simulada, str(libro_id), nuevo_anio=1995)) == (1, 1)
+    assert asyncio.run(ej3a4_async.actualizar_libro_detalle(db_simulada, str(libro_id))) == (1, 0)
+    assert asyncio.run(ej3a4_async.actualizar_libro(db_simulada, str(ObjectId()), nuevo_titulo="X")) is False
+
+class SesionFalsa:
+    """
+    Sesión asíncrona que guarda las opciones recibidas y, como with_transaction,
+    repite el callback mientras queden errores transitorios del cliente
+    """
+    def __init__(self, cliente):
+        self.cliente = cliente
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def with_transaction(self, callback, **opciones):
+        self.cliente.opciones.append(opciones)
+        while True:
+            self.cliente.llamadas += 1
+            resultado = await callback(self)
+            if not self.cliente.errores:
+                return resultado
+            error = self.cliente.errores.pop(0)
+            if not error.has_error_label('TransientTransactionError'):
+                raise error
+
+class ClienteFalso:
+    """Cliente asíncrono mínimo para ejecutar_transaccion y admite_transacciones"""
+    def __init__(self, hello=None, errores=None):
+        self.opciones = []
+        self.errores = list(errores or [])
+        self.llamadas = 0
+        self.admin = self
+        self.hello = hello
+
+    def start_session(self):
+        return SesionFalsa(self)
+
+    async def command(self, nombre):
+        if isinstance(self.hello, Exception):
+            raise self.hello
+        return self.hello
+
+def test_ejecutar_transaccion_respeta_concerns():
+    """Prueba que read_concern y write_concern sustituyen a los del perfil, como en la versión síncrona"""
+    cliente = ClienteFalso()
+
+    async def funcion(session):
+        return 42
+
+    assert asyncio.run(ej3a4_async.ejecutar_transaccion(cliente, funcion, perfil='rapido',
+                                                        metricas=MetricasTransacciones())) == 42
+    asyncio.run(ej3a4_async.ejecutar_transaccion(cliente, funcion, write_concern=WriteConcern(w=2),
+                                                 metricas=MetricasTransacciones()))
+
+    assert cliente.opciones[0] == PERFILES_CONCERN['rapido']
+    assert cliente.opciones[1]['write_concern'] == WriteConcern(w=2)
+    assert cliente.opciones[1]['read_concern'] == PERFILES_CONCERN['critico']['read_concern']
+
+def test_ejecutar_transaccion_cuenta_reintentos_async():
+    """Prueba que los reintentos de with_transaction se cuentan una vez y no se repite la transacción"""
+    cliente = ClienteFalso(errores=[PyMongoError("transitorio", error_labels=['TransientTransactionError'])])
+    metricas = MetricasTransacciones()
+
+    async def funcion(session):
+        return 'ok'
+
+    assert asyncio.run(ej3a4_async.ejecutar_transaccion(cliente, funcion, metricas=metricas)) == 'ok'
+    assert cliente.llamadas == 2
+    assert metricas.como_dict()['reintentos'] == 1
+    assert metricas.como_dict()['confirmadas'] == 1
+
+    cliente = ClienteFalso(errores=[PyMongoError("sin etiqueta")])
+    with pytest.raises(PyMongoError):
+        asyncio.run(ej3a4_async.ejecutar_transaccion(cliente, funcion, metricas=metricas))
+    assert metricas.como_dict()['fallidas'] == 1
+    assert metricas.como_dict()['reintentos'] == 1
+
+def test_admite_transacciones_async():
+    """Prueba la detección de replica set o mongos con la misma regla que la versión síncrona"""
+    assert asyncio.run(ej3a4_async.admite_transacciones(ClienteFalso(hello={'setName': 'rs0'}))) is True
+    assert asyncio.run(ej3a4_async.admite_transacciones(ClienteFalso(hello={'isWritablePrimary': True}))) is False
+    assert asyncio.run(ej3a4_async.admite_transacciones(ClienteFalso(hello=PyMongoError("sin servidor")))) is False
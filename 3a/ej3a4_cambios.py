@@ -0,0 +1,353 @@
+"""
+Caché de buscar_libros_por_autor mantenida con change streams (ej3a4).
+
+CacheLibrosPorAutor guarda, por nombre de autor, los libros que devolvería
+buscar_libros_por_autor. ConsumidorCambios escucha los cambios de las colecciones
+libros y autores (db.watch) y corrige la caché en cada inserción, actualización
+o borrado: las altas y bajas de libros se aplican sobre la entrada, y los cambios
+de autores invalidan las entradas afectadas.
+
+Una carga (fallo de caché) se hace fuera del cerrojo. Cada evento aplicado
+incrementa una generación y el resultado de una carga sólo se guarda si no
+cambió mientras se leía: un evento que llegue en medio no se pierde, porque
+ese resultado se devuelve pero no se guarda. Además las entradas caducan a los
+ttl_segundos, lo que acota lo desfasada que puede quedar una entrada si se
+pierde algún evento.
+
+El resume token se guarda junto con el contenido de la caché, así que tras
+reiniciar el proceso se reanuda el change stream donde se dejó sin reconstruir
+la caché. Los change streams necesitan un replica set (vale uno de un solo nodo).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set, Tuple
+
+import pymongo
+from bson import json_util
+from pymongo.errors import OperationFailure
+
+from ej3a4 import TAMANO_LOTE_LECTURA, pipeline_libros_por_autores
+
+# Entradas (nombres de autor) que guarda la caché como mucho
+CACHE_TAMANO_MAXIMO = 10000
+# Segundos que vive una entrada desde que se carga
+CACHE_TTL_SEGUNDOS = 300
+# Eventos procesados entre dos guardados del estado
+GUARDAR_CADA = 100
+# Espera máxima del servidor en cada lectura del change stream
+ESPERA_EVENTOS_MS = 1000
+
+# Código de error cuando el resume token ya no está en el oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+
+COLECCIONES_VIGILADAS = ('libros', 'autores')
+
+Libro = Tuple[Any, str, int]  # (libro_id, titulo, anio)
+
+
+class _Entrada:
+    """
+    Libros de todos los autores con un mismo nombre
+    """
+    __slots__ = ('autor_ids', 'libros', 'caduca')
+
+    def __init__(self, autor_ids: Set[Any], libros: "OrderedDict[Any, Tuple[str, int]]", caduca: float = 0.0):
+        self.autor_ids = autor_ids
+        # libro_id -> (titulo, anio)
+        self.libros = libros
+        # Instante (según el reloj de la caché) a partir del cual la entrada no vale
+        self.caduca = caduca
+
+
+class CacheLibrosPorAutor:
+    """
+    Caché nombre de autor -> libros, con los índices inversos necesarios para
+    aplicar los eventos de cambio sin volver a consultar
+    """
+
+    def __init__(self, db: pymongo.database.Database, tamano_maximo: int = CACHE_TAMANO_MAXIMO,
+                 ttl_segundos: float = CACHE_TTL_SEGUNDOS, reloj: Callable[[], float] = time.monotonic):
+        self.db = db
+        self.tamano_maximo = tamano_maximo
+        self.ttl_segundos = ttl_segundos
+        self._reloj = reloj
+        self._lock = threading.RLock()
+        # Se incrementa con cada evento aplicado: una carga que empezó antes no se guarda
+        self._generacion = 0
+        self._entradas: "OrderedDict[str, _Entrada]" = OrderedDict()
+        self._nombre_por_autor: Dict[Any, str] = {}
+        self._autor_por_libro: Dict[Any, Any] = {}
+        self.aciertos = 0
+        self.fallos = 0
+        self.parcheadas = 0
+        self.invalidaciones = 0
+        self.descartadas = 0
+        self.caducadas = 0
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    def buscar_libros_por_autor(self, nombre_autor: str) -> List[Tuple[str, int]]:
+        """
+        Igual que ej3a4.buscar_libros_por_autor, pero servido desde la caché si está
+        """
+        with self._lock:
+            entrada = self._entradas.get(nombre_autor)
+            if entrada is not None and entrada.caduca <= self._reloj():
+                self.caducadas += 1
+                self._eliminar_entrada(nombre_autor)
+                entrada = None
+            if entrada is not None:
+                self._entradas.move_to_end(nombre_autor)
+                self.aciertos += 1
+                return list(entrada.libros.values())
+            self.fallos += 1
+            generacion = self._generacion
+        entrada = self._cargar(nombre_autor)
+        with self._lock:
+            if generacion == self._generacion:
+                self._guardar(nombre_autor, entrada)
+            else:
+                # Hubo cambios durante la carga: el resultado puede no incluirlos
+                self.descartadas += 1
+            return list(entrada.libros.values())
+
+    def _cargar(self, nombre_autor: str) -> _Entrada:
+        # Misma agregación que buscar_libros_por_autor, conservando IDs y autores sin libros
+        pipeline = pipeline_libros_por_autores([nombre_autor])[:2] + [
+            {"$unwind": {"path": "$libros", "preserveNullAndEmptyArrays": True}},
+            {"$project": {"_id": 0, "autor_id": "$_id", "libro_id": "$libros._id",
+                          "titulo": "$libros.titulo", "anio": "$libros.anio"}}
+        ]
+        entrada = _Entrada(set(), OrderedDict())
+        for doc in self.db.autores.aggregate(pipeline, batchSize=TAMANO_LOTE_LECTURA):
+            entrada.autor_ids.add(doc["autor_id"])
+            if doc.get("libro_id") is not None:
+                entrada.libros[doc["libro_id"]] = (doc["titulo"], doc["anio"])
+        return entrada
+
+    def _guardar(self, nombre: str, entrada: _Entrada) -> None:
+        entrada.caduca = self._reloj() + self.ttl_segundos
+        self._eliminar_entrada(nombre)
+        self._entradas[nombre] = entrada
+        for autor_id in entrada.autor_ids:
+            self._nombre_por_autor[autor_id] = nombre
+        for libro_id in entrada.libros:
+            # Los libros de autores homónimos comparten entrada: basta con uno de sus autores
+            self._autor_por_libro[libro_id] = next(iter(entrada.autor_ids))
+        while len(self._entradas) > self.tamano_maximo:
+            self._eliminar_entrada(next(iter(self._entradas)))
+
+    def _eliminar_entrada(self, nombre: Optional[str]) -> None:
+        entrada = self._entradas.pop(nombre, None) if nombre is not None else None
+        if entrada is None:
+            return
+        for autor_id in entrada.autor_ids:
+            self._nombre_por_autor.pop(autor_id, None)
+        for libro_id in entrada.libros:
+            self._autor_por_libro.pop(libro_id, None)
+
+    def invalidar(self, nombre: Optional[str]) -> None:
+        """
+        Elimina la entrada de ese nombre de autor, si está
+        """
+        with self._lock:
+            if nombre in self._entradas:
+                self.invalidaciones += 1
+                self._eliminar_entrada(nombre)
+
+    def limpiar(self) -> None:
+        """
+        Vacía la caché
+        """
+        with self._lock:
+            self.invalidaciones += len(self._entradas)
+            self._entradas.clear()
+            self._nombre_por_autor.clear()
+            self._autor_por_libro.clear()
+
+    def _quitar_libro(self, libro_id: Any) -> None:
+        autor_id = self._autor_por_libro.pop(libro_id, None)
+        entrada = self._entradas.get(self._nombre_por_autor.get(autor_id))
+        if entrada is not None and entrada.libros.pop(libro_id, None) is not None:
+            self.parcheadas += 1
+
+    def _poner_libro(self, libro_id: Any, documento: Mapping[str, Any]) -> None:
+        autor_id = documento.get('autor_id')
+        entrada = self._entradas.get(self._nombre_por_autor.get(autor_id))
+        if entrada is not None:
+            entrada.libros[libro_id] = (documento.get('titulo'), documento.get('anio'))
+            self._autor_por_libro[libro_id] = autor_id
+            self.parcheadas += 1
+
+    def procesar_evento(self, evento: Mapping[str, Any]) -> None:
+        """
+        Aplica un evento de change stream a la caché
+        """
+        operacion = evento['operationType']
+        with self._lock:
+            self._generacion += 1
+            if operacion in ('drop', 'rename', 'dropDatabase', 'invalidate'):
+                self.limpiar()
+                return
+            coleccion = evento['ns']['coll']
+            _id = evento['documentKey']['_id']
+            documento = evento.get('fullDocument')
+            if coleccion == 'libros':
+                if operacion in ('update', 'replace') and documento is None:
+                    # El libro ya no existe (o no se pudo leer): descartamos su entrada
+                    self.invalidar(self._nombre_por_autor.get(self._autor_por_libro.get(_id)))
+                    return
+                if operacion in ('update', 'replace', 'delete'):
+                    self._quitar_libro(_id)
+                if operacion in ('insert', 'update', 'replace'):
+                    self._poner_libro(_id, documento)
+            elif coleccion == 'autores':
+                if operacion == 'insert':
+                    # Un autor nuevo con un nombre cacheado se suma a la entrada (aún sin libros)
+                    entrada = self._entradas.get(documento.get('nombre'))
+                    if entrada is not None:
+                        entrada.autor_ids.add(_id)
+                        self._nombre_por_autor[_id] = documento['nombre']
+                        self.parcheadas += 1
+                else:
+                    # Cambio de nombre o borrado: invalidamos el nombre anterior y el nuevo
+                    self.invalidar(self._nombre_por_autor.get(_id))
+                    if documento is not None:
+                        self.invalidar(documento.get('nombre'))
+
+    def estado(self) -> Dict[str, Any]:
+        """
+        Contenido de la caché en un formato serializable con bson.json_util
+        """
+        with self._lock:
+            return {nombre: {'autor_ids': list(entrada.autor_ids),
+                             'libros': [[libro_id, titulo, anio]
+                                        for libro_id, (titulo, anio) in entrada.libros.items()]}
+                    for nombre, entrada in self._entradas.items()}
+
+    def restaurar(self, estado: Mapping[str, Any]) -> None:
+        """
+        Sustituye el contenido de la caché por uno obtenido con estado()
+        """
+        with self._lock:
+            self.limpiar()
+            for nombre, datos in estado.items():
+                libros = OrderedDict((libro_id, (titulo, anio)) for libro_id, titulo, anio in datos['libros'])
+                self._guardar(nombre, _Entrada(set(datos['autor_ids']), libros))
+
+    def metricas(self) -> Dict[str, Any]:
+        """
+        Devuelve las métricas de uso de la caché
+        """
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'tamano': len(self._entradas),
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': self.aciertos / consultas if consultas else 0.0,
+                'parcheadas': self.parcheadas,
+                'invalidaciones': self.invalidaciones,
+                'descartadas': self.descartadas,
+                'caducadas': self.caducadas,
+            }
+
+
+class ConsumidorCambios:
+    """
+    Lee el change stream de libros y autores y lo aplica a una CacheLibrosPorAutor.
+    Si se indica ruta_estado, guarda allí el resume token y el contenido de la caché.
+    """
+
+    def __init__(self, db: pymongo.database.Database, cache: CacheLibrosPorAutor,
+                 ruta_estado: Optional[str] = None, guardar_cada: int = GUARDAR_CADA):
+        self.db = db
+        self.cache = cache
+        self.ruta_estado = ruta_estado
+        self.guardar_cada = guardar_cada
+        self.resume_token: Optional[Mapping[str, Any]] = None
+        self.eventos = 0
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self._pendientes = 0
+        self.cargar_estado()
+
+    def cargar_estado(self) -> bool:
+        """
+        Recupera el resume token y la caché guardados. Devuelve False si no había estado.
+        """
+        if self.ruta_estado is None or not os.path.exists(self.ruta_estado):
+            return False
+        with open(self.ruta_estado, 'r') as f:
+            estado = json_util.loads(f.read())
+        self.resume_token = estado.get('resume_token')
+        self.cache.restaurar(estado.get('cache', {}))
+        return True
+
+    def guardar_estado(self) -> None:
+        """
+        Guarda el resume token y la caché de forma atómica (fichero temporal + rename)
+        """
+        self._pendientes = 0
+        if self.ruta_estado is None:
+            return
+        temporal = f"{self.ruta_estado}.tmp"
+        with open(temporal, 'w') as f:
+            f.write(json_util.dumps({'resume_token': self.resume_token, 'cache': self.cache.estado()}))
+        os.replace(temporal, self.ruta_estado)
+
+    def _abrir_stream(self):
+        return self.db.watch(
+            pipeline=[{'$match': {'ns.coll': {'$in': list(COLECCIONES_VIGILADAS)}}}],
+            full_document='updateLookup',
+            resume_after=self.resume_token,
+            max_await_time_ms=ESPERA_EVENTOS_MS
+        )
+
+    def ejecutar(self, max_eventos: Optional[int] = None) -> None:
+        """
+        Procesa eventos hasta que se llame a detener() (o hasta max_eventos)
+        """
+        try:
+            stream = self._abrir_stream()
+        except OperationFailure as e:
+            if e.code != CHANGE_STREAM_HISTORY_LOST:
+                raise
+            # El token es demasiado antiguo: se pierden cambios, así que empezamos de cero
+            self.cache.limpiar()
+            self.resume_token = None
+            stream = self._abrir_stream()
+        with stream:
+            while not self._detener.is_set() and (max_eventos is None or self.eventos < max_eventos):
+                evento = stream.try_next()
+                if evento is not None:
+                    self.cache.procesar_evento(evento)
+                    self.eventos += 1
+                    self._pendientes += 1
+                # Sin eventos el token también avanza (postBatchResumeToken)
+                self.resume_token = stream.resume_token
+                if self._pendientes >= self.guardar_cada or (evento is None and self._pendientes):
+                    self.guardar_estado()
+        self.guardar_estado()
+
+    def iniciar(self) -> threading.Thread:
+        """
+        Ejecuta el consumidor en un hilo en segundo plano
+        """
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self.ejecutar, name='consumidor-cambios', daemon=True)
+        self._hilo.start()
+        return self._hilo
+
+    def detener(self, timeout: Optional[float] = None) -> None:
+        """
+        Pide al consumidor que termine y espera a que guarde su estado
+        """
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+            self._hilo = None
@@ -0,0 +1,236 @@
+"""
+Tests para ej3a4_cambios.py, la caché invalidada con change streams.
+Los eventos se construyen a mano con la forma que tienen en el servidor y
+la caché se carga desde mongomock, así que no hace falta un replica set.
+"""
+
+import pytest
+from pymongo.errors import OperationFailure
+from ej3a4 import insertar_autores, insertar_libros, buscar_libros_por_autor
+from ej3a4_cambios import CHANGE_STREAM_HISTORY_LOST, CacheLibrosPorAutor, ConsumidorCambios
+
+mongomock = pytest.importorskip("mongomock")
+
+@pytest.fixture
+def conexion():
+    """Fixture con dos autores y tres libros en mongomock"""
+    db = mongomock.MongoClient().biblioteca
+    autor_ids = insertar_autores(db, [("Isabel Allende",), ("Jorge Luis Borges",)])
+    libro_ids = insertar_libros(db, [("La casa de los espíritus", 1982, autor_ids[0]),
+                                     ("Paula", 1994, autor_ids[0]),
+                                     ("Ficciones", 1944, autor_ids[1])])
+    db.autor_ids = autor_ids
+    db.libro_ids = libro_ids
+    return db
+
+def evento(operacion, coleccion, _id, documento=None):
+    """Evento de change stream como los que devuelve db.watch(full_document='updateLookup')"""
+    datos = {'operationType': operacion, 'ns': {'db': 'biblioteca', 'coll': coleccion},
+             'documentKey': {'_id': _id}}
+    if documento is not None:
+        datos['fullDocument'] = dict(documento, _id=_id)
+    return datos
+
+def test_cache_sirve_desde_memoria(conexion):
+    """Prueba que la segunda búsqueda no consulta la base de datos"""
+    cache = CacheLibrosPorAutor(conexion)
+
+    assert sorted(cache.buscar_libros_por_autor("Isabel Allende")) == \
+        sorted(buscar_libros_por_autor(conexion, "Isabel Allende"))
+    conexion.libros.delete_many({})
+    assert len(cache.buscar_libros_por_autor("Isabel Allende")) == 2
+
+    metricas = cache.metricas()
+    assert metricas['aciertos'] == 1
+    assert metricas['fallos'] == 1
+
+def test_evento_insercion_libro(conexion):
+    """Prueba que un libro nuevo de un autor cacheado se añade a su entrada"""
+    cache = CacheLibrosPorAutor(conexion)
+    cache.buscar_libros_por_autor("Isabel Allende")
+    [libro_id] = insertar_libros(conexion, [("Eva Luna", 1987, conexion.autor_ids[0])])
+
+    cache.procesar_evento(evento('insert', 'libros', libro_id, conexion.libros.find_one({'_id': libro_id})))
+
+    assert ("Eva Luna", 1987) in cache.buscar_libros_por_autor("Isabel Allende")
+    assert cache.metricas()['invalidaciones'] == 0
+
+def test_evento_actualizacion_y_borrado_libro(conexion):
+    """Prueba que los cambios y borrados de libros se aplican sobre la entrada"""
+    cache = CacheLibrosPorAutor(conexion)
+    cache.buscar_libros_por_autor("Isabel Allende")
+    cache.buscar_libros_por_autor("Jorge Luis Borges")
+    paula, ficciones = conexion.libro_ids[1], conexion.libro_ids[2]
+
+    cache.procesar_evento(evento('update', 'libros', paula,
+                                 {'titulo': 'Paula', 'anio': 1995, 'autor_id': conexion.autor_ids[0]}))
+    # El libro cambia de autor: sale de una entrada y entra en la otra
+    cache.procesar_evento(evento('update', 'libros', ficciones,
+                                 {'titulo': 'Ficciones', 'anio': 1944, 'autor_id': conexion.autor_ids[0]}))
+
+    assert sorted(cache.buscar_libros_por_autor("Isabel Allende")) == \
+        [("Ficciones", 1944), ("La casa de los espíritus", 1982), ("Paula", 1995)]
+    assert cache.buscar_libros_por_autor("Jorge Luis Borges") == []
+
+    cache.procesar_evento(evento('delete', 'libros', paula))
+    assert ("Paula", 1995) not in cache.buscar_libros_por_autor("Isabel Allende")
+
+def test_evento_autor_invalida(conexion):
+    """Prueba que renombrar un autor invalida el nombre antiguo y el nuevo"""
+    cache = CacheLibrosPorAutor(conexion)
+    cache.buscar_libros_por_autor("Isabel Allende")
+    cache.buscar_libros_por_autor("Isabel A.")
+    conexion.autores.update_one({'_id': conexion.autor_ids[0]}, {'$set': {'nombre': 'Isabel A.'}})
+
+    cache.procesar_evento(evento('update', 'autores', conexion.autor_ids[0], {'nombre': 'Isabel A.'}))
+
+    assert len(cache) == 0
+    assert cache.buscar_libros_por_autor("Isabel Allende") == []
+    assert len(cache.buscar_libros_por_autor("Isabel A.")) == 2
+
+def test_evento_autor_nuevo_homonimo(conexion):
+    """Prueba que los libros de un autor homónimo nuevo se añaden a la entrada existente"""
+    cache = CacheLibrosPorAutor(conexion)
+    cache.buscar_libros_por_autor("Jorge Luis Borges")
+    [otro_id] = insertar_autores(conexion, [("Jorge Luis Borges",)])
+    [libro_id] = insertar_libros(conexion, [("Otro libro", 2000, otro_id)])
+
+    cache.procesar_evento(evento('insert', 'autores', otro_id, {'nombre': 'Jorge Luis Borges'}))
+    cache.procesar_evento(evento('insert', 'libros', libro_id,
+                                 {'titulo': 'Otro libro', 'anio': 2000, 'autor_id': otro_id}))
+
+    assert sorted(cache.buscar_libros_por_autor("Jorge Luis Borges")) == [("Ficciones", 1944), ("Otro libro", 2000)]
+
+def test_evento_drop_vacia_la_cache(conexion):
+    """Prueba que borrar una colección vacía la caché"""
+    cache = CacheLibrosPorAutor(conexion)
+    cache.buscar_libros_por_autor("Isabel Allende")
+
+    cache.procesar_evento({'operationType': 'drop', 'ns': {'db': 'biblioteca', 'coll': 'libros'}})
+
+    assert len(cache) == 0
+
+def test_tamano_maximo(conexion):
+    """Prueba que se expulsa la entrada usada hace más tiempo"""
+    cache = CacheLibrosPorAutor(conexion, tamano_maximo=1)
+    cache.buscar_libros_por_autor("Isabel Allende")
+    cache.buscar_libros_por_autor("Jorge Luis Borges")
+
+    assert len(cache) == 1
+    # Los eventos de la entrada expulsada se ignoran
+    cache.procesar_evento(evento('delete', 'libros', conexion.libro_ids[0]))
+    assert cache.buscar_libros_por_autor("Jorge Luis Borges") == [("Ficciones", 1944)]
+
+def test_evento_durante_la_carga_no_se_pierde(conexion):
+    """Prueba que un resultado leído antes de un evento se devuelve pero no se guarda"""
+    cache = CacheLibrosPorAutor(conexion)
+    cargar = cache._cargar
+
+    def cargar_con_evento(nombre):
+        entrada = cargar(nombre)
+        # El libro se inserta y su evento se aplica después de leer, antes de guardar
+        [libro_id] = insertar_libros(conexion, [("Eva Luna", 1987, conexion.autor_ids[0])])
+        cache.procesar_evento(evento('insert', 'libros', libro_id, conexion.libros.find_one({'_id': libro_id})))
+        return entrada
+
+    cache._cargar = cargar_con_evento
+    assert len(cache.buscar_libros_por_autor("Isabel Allende")) == 2
+    cache._cargar = cargar
+
+    assert len(cache) == 0
+    assert ("Eva Luna", 1987) in cache.buscar_libros_por_autor("Isabel Allende")
+    assert cache.metricas()['descartadas'] == 1
+
+def test_entradas_caducan(conexion):
+    """Prueba que una entrada se vuelve a cargar pasados ttl_segundos"""
+    ahora = [0.0]
+    cache = CacheLibrosPorAutor(conexion, ttl_segundos=10, reloj=lambda: ahora[0])
+    cache.buscar_libros_por_autor("Isabel Allende")
+    # Un cambio cuyo evento no llega nunca
+    conexion.libros.delete_many({'autor_id': conexion.autor_ids[0]})
+
+    ahora[0] = 9.0
+    assert len(cache.buscar_libros_por_autor("Isabel Allende")) == 2
+    ahora[0] = 10.0
+    assert cache.buscar_libros_por_autor("Isabel Allende") == []
+    assert cache.metricas()['caducadas'] == 1
+
+class StreamFalso:
+    """Change stream que devuelve los eventos indicados y después None"""
+    def __init__(self, eventos):
+        self.eventos = list(eventos)
+        self.resume_token = {'_data': '00'}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def try_next(self):
+        if not self.eventos:
+            return None
+        self.resume_token = {'_data': f"{int(self.resume_token['_data']) + 1:02d}"}
+        return self.eventos.pop(0)
+
+class DbConStream:
+    """Envuelve la base de datos de mongomock añadiendo watch()"""
+    def __init__(self, db, eventos, errores=()):
+        self.db = db
+        self.eventos = eventos
+        self.errores = list(errores)
+        self.llamadas = []
+
+    def __getattr__(self, nombre):
+        return getattr(self.db, nombre)
+
+    def watch(self, **opciones):
+        self.llamadas.append(opciones)
+        if self.errores:
+            raise self.errores.pop(0)
+        return StreamFalso(self.eventos)
+
+def test_consumidor_guarda_y_reanuda(conexion, tmp_path):
+    """Prueba que el resume token y la caché se recuperan al reiniciar el consumidor"""
+    ruta = str(tmp_path / "estado.json")
+    cache = CacheLibrosPorAutor(conexion)
+    cache.buscar_libros_por_autor("Isabel Allende")
+    db = DbConStream(conexion, [evento('delete', 'libros', conexion.libro_ids[1])])
+
+    consumidor = ConsumidorCambios(db, cache, ruta_estado=ruta, guardar_cada=1)
+    consumidor.ejecutar(max_eventos=1)
+
+    assert db.llamadas[0]['resume_after'] is None
+    assert db.llamadas[0]['full_document'] == 'updateLookup'
+    assert cache.buscar_libros_por_autor("Isabel Allende") == [("La casa de los espíritus", 1982)]
+
+    # Un proceso nuevo reanuda desde el token guardado sin volver a cargar la caché
+    otra_cache = CacheLibrosPorAutor(conexion)
+    otro = ConsumidorCambios(DbConStream(conexion, []), otra_cache, ruta_estado=ruta)
+    assert otro.resume_token == {'_data': '01'}
+    assert otra_cache.buscar_libros_por_autor("Isabel Allende") == [("La casa de los espíritus", 1982)]
+    assert otra_cache.metricas()['fallos'] == 0
+
+def test_consumidor_token_caducado(conexion, tmp_path):
+    """Prueba que si el token ya no está en el oplog se vacía la caché y se empieza de cero"""
+    cache = CacheLibrosPorAutor(conexion)
+    cache.buscar_libros_por_autor("Isabel Allende")
+    db = DbConStream(conexion, [], errores=[OperationFailure("historia perdida", code=CHANGE_STREAM_HISTORY_LOST)])
+    consumidor = ConsumidorCambios(db, cache)
+    consumidor.resume_token = {'_data': '99'}
+
+    consumidor.ejecutar(max_eventos=0)
+
+    assert len(cache) == 0
+    assert db.llamadas[1]['resume_after'] is None
+
+def test_consumidor_en_hilo(conexion):
+    """Prueba que el consumidor se puede ejecutar en segundo plano y detener"""
+    cache = CacheLibrosPorAutor(conexion)
+    cache.buscar_libros_por_autor("Isabel Allende")
+    consumidor = ConsumidorCambios(DbConStream(conexion, [evento('delete', 'libros', conexion.libro_ids[0])]), cache)
+
+    hilo = consumidor.iniciar()
+    consumidor.detener(timeout=5)
+
+    assert not hilo.is_alive()
@@ -0,0 +1,212 @@
+"""
+Registro de clientes MongoDB compartidos por todo el proceso.
+
+Crear un pymongo.MongoClient es caro: cada cliente arranca sus hilos de
+monitorización, su pool de conexiones y repite la autenticación. Aquí se
+mantiene un único cliente por configuración (host, puerto, credenciales, pool y
+clase de cliente) y proceso, que se reutiliza en cada llamada.
+
+- Tras un fork el proceso hijo no hereda los clientes del padre: crea los suyos.
+- Al salir del intérprete se cierran todos los clientes abiertos.
+- Si alguien cierra un cliente del registro (db.client.close()), la siguiente
+  llamada lo detecta y crea uno nuevo en lugar de devolver un cliente inservible.
+- Cada cliente registra el tiempo de espera al obtener una conexión del pool.
+"""
+
+import atexit
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pymongo
+from pymongo import monitoring
+
+# Configuración del pool de conexiones
+MONGODB_MAX_POOL_SIZE = 50
+MONGODB_MIN_POOL_SIZE = 0
+MONGODB_MAX_IDLE_TIME_MS = 60000
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = 5000
+
+# (host, puerto, usuario, contraseña, max_pool_size, min_pool_size, max_idle_time_ms,
+#  server_selection_timeout_ms, clase_cliente)
+ClaveCliente = Tuple[str, int, Optional[str], Optional[str], int, int, int, int, Callable[..., Any]]
+
+
+class MetricasPool(monitoring.ConnectionPoolListener):
+    """
+    Escucha los eventos del pool de conexiones y acumula métricas de uso
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.conexiones_creadas = 0
+        self.conexiones_cerradas = 0
+        self.obtenidas = 0
+        self.devueltas = 0
+        self.fallos_obtencion = 0
+        self.espera_total = 0.0
+        self.espera_maxima = 0.0
+
+    def _registrar_espera(self, duracion: Optional[float]) -> None:
+        if duracion is None:
+            return
+        self.espera_total += duracion
+        self.espera_maxima = max(self.espera_maxima, duracion)
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent) -> None:
+        with self._lock:
+            self.obtenidas += 1
+            self._registrar_espera(event.duration)
+
+    def connection_check_out_failed(self, event: monitoring.ConnectionCheckOutFailedEvent) -> None:
+        with self._lock:
+            self.fallos_obtencion += 1
+            self._registrar_espera(event.duration)
+
+    def connection_checked_in(self, event: monitoring.ConnectionCheckedInEvent) -> None:
+        with self._lock:
+            self.devueltas += 1
+
+    def connection_created(self, event: monitoring.ConnectionCreatedEvent) -> None:
+        with self._lock:
+            self.conexiones_creadas += 1
+
+    def connection_closed(self, event: monitoring.ConnectionClosedEvent) -> None:
+        with self._lock:
+            self.conexiones_cerradas += 1
+
+    # El resto de eventos no nos interesan
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        pass
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def connection_check_out_started(self, event) -> None:
+        pass
+
+    def como_dict(self) -> Dict[str, Any]:
+        """
+        Devuelve una copia de las métricas
+        """
+        with self._lock:
+            intentos = self.obtenidas + self.fallos_obtencion
+            return {
+                'conexiones_creadas': self.conexiones_creadas,
+                'conexiones_cerradas': self.conexiones_cerradas,
+                'conexiones_en_uso': self.obtenidas - self.devueltas,
+                'obtenidas': self.obtenidas,
+                'fallos_obtencion': self.fallos_obtencion,
+                'espera_media': self.espera_total / intentos if intentos else 0.0,
+                'espera_maxima': self.espera_maxima,
+            }
+
+
+# Estado del registro: clave -> (cliente, métricas)
+_clientes: Dict[ClaveCliente, Tuple[Any, MetricasPool]] = {}
+_pid = os.getpid()
+_lock = threading.Lock()
+
+
+def _reiniciar_tras_fork() -> None:
+    """
+    En el proceso hijo se olvidan los clientes del padre: no son seguros tras un fork
+    """
+    global _clientes, _pid, _lock
+    _clientes = {}
+    _pid = os.getpid()
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_tras_fork)
+
+
+def _cerrado(cliente: Any) -> bool:
+    """
+    Indica si el cliente se ha cerrado (pymongo 4 no permite volver a usarlo).
+    Se mira en vars(): mongomock devuelve una base de datos para cualquier atributo.
+    """
+    return vars(cliente).get('_closed') is True
+
+
+def obtener_cliente(
+        host: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        max_pool_size: int = MONGODB_MAX_POOL_SIZE,
+        min_pool_size: int = MONGODB_MIN_POOL_SIZE,
+        max_idle_time_ms: int = MONGODB_MAX_IDLE_TIME_MS,
+        server_selection_timeout_ms: int = MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        clase_cliente: Callable[..., Any] = pymongo.MongoClient
+) -> Any:
+    """
+    Devuelve el cliente compartido para esa configuración, creándolo la primera vez
+    o si el registrado se ha cerrado.
+
+    Cada combinación de datos de conexión, pool y `clase_cliente` tiene su propio
+    cliente: pedir otra configuración nunca devuelve un cliente creado con la
+    anterior. `clase_cliente` permite usar otra implementación compatible
+    (p.ej. mongomock.MongoClient).
+    """
+    if _pid != os.getpid():
+        # Fork sin register_at_fork (o hecho antes de importar el módulo)
+        _reiniciar_tras_fork()
+    clave = (host, port, username, password, max_pool_size, min_pool_size, max_idle_time_ms,
+             server_selection_timeout_ms, clase_cliente)
+    with _lock:
+        registrado = _clientes.get(clave)
+        if registrado is not None and not _cerrado(registrado[0]):
+            return registrado[0]
+        metricas = MetricasPool()
+        cliente = clase_cliente(
+            host=host,
+            port=port,
+            username=username,
+            password=password,
+            maxPoolSize=max_pool_size,
+            minPoolSize=min_pool_size,
+            maxIdleTimeMS=max_idle_time_ms,
+            serverSelectionTimeoutMS=server_selection_timeout_ms,
+            event_listeners=[metricas]
+        )
+        _clientes[clave] = (cliente, metricas)
+        return cliente
+
+
+def metricas_cliente(cliente: Any) -> Optional[Dict[str, Any]]:
+    """
+    Devuelve las métricas del pool de un cliente del registro, o None si no está registrado
+    """
+    with _lock:
+        for registrado, metricas in _clientes.values():
+            if registrado is cliente:
+                return metricas.como_dict()
+    return None
+
+
+def cerrar_clientes() -> None:
+    """
+    Cierra todos los clientes registrados en este proceso
+    """
+    with _lock:
+        clientes = list(_clientes.values())
+        _clientes.clear()
+    for cliente, _ in clientes:
+        try:
+            cliente.close()
+        except Exception as e:
+            print(f"Error al cerrar el cliente de MongoDB: {e}")
+
+
+atexit.register(cerrar_clientes)
@@ -0,0 +1,119 @@
+"""
+Tests para ej3a4_clientes.py, el registro de clientes MongoDB compartidos.
+Se usa mongomock como sustituto de un servidor MongoDB.
+"""
+
+import os
+import pytest
+import ej3a4_clientes
+from ej3a4_clientes import obtener_cliente, metricas_cliente, cerrar_clientes
+
+mongomock = pytest.importorskip("mongomock")
+
+@pytest.fixture(autouse=True)
+def registro_limpio():
+    """Fixture que deja el registro vacío antes y después de cada prueba"""
+    cerrar_clientes()
+    yield
+    cerrar_clientes()
+
+def test_reutiliza_cliente_por_credenciales():
+    """Prueba que se devuelve el mismo cliente para los mismos datos de conexión"""
+    cliente1 = obtener_cliente('localhost', 27017, 'testuser', 'testpass', clase_cliente=mongomock.MongoClient)
+    cliente2 = obtener_cliente('localhost', 27017, 'testuser', 'testpass', clase_cliente=mongomock.MongoClient)
+    otro = obtener_cliente('localhost', 27017, 'otro', 'testpass', clase_cliente=mongomock.MongoClient)
+
+    assert cliente1 is cliente2
+    assert otro is not cliente1
+
+def test_configuracion_distinta_no_comparte_cliente():
+    """Prueba que otra configuración de pool u otra clase de cliente crean su propio cliente"""
+    class OtraClase(mongomock.MongoClient):
+        pass
+
+    cliente = obtener_cliente('localhost', 27017, clase_cliente=mongomock.MongoClient)
+
+    assert obtener_cliente('localhost', 27017, max_pool_size=5, clase_cliente=mongomock.MongoClient) is not cliente
+    assert obtener_cliente('localhost', 27017, server_selection_timeout_ms=1,
+                           clase_cliente=mongomock.MongoClient) is not cliente
+    assert isinstance(obtener_cliente('localhost', 27017, clase_cliente=OtraClase), OtraClase)
+    assert obtener_cliente('localhost', 27017, clase_cliente=mongomock.MongoClient) is cliente
+
+def test_cliente_cerrado_se_reemplaza():
+    """Prueba que un cliente cerrado por quien lo usa no se vuelve a entregar"""
+    pymongo = pytest.importorskip("pymongo")
+    def clase_cliente(**kwargs):
+        return pymongo.MongoClient(connect=False, **kwargs)
+
+    cliente = obtener_cliente('localhost', 27017, server_selection_timeout_ms=10, clase_cliente=clase_cliente)
+    cliente.close()
+    nuevo = obtener_cliente('localhost', 27017, server_selection_timeout_ms=10, clase_cliente=clase_cliente)
+
+    assert nuevo is not cliente
+    assert obtener_cliente('localhost', 27017, server_selection_timeout_ms=10, clase_cliente=clase_cliente) is nuevo
+
+def test_configuracion_del_pool():
+    """Prueba que la configuración del pool llega al constructor del cliente"""
+    argumentos = {}
+    def clase_cliente(**kwargs):
+        argumentos.update(kwargs)
+        return mongomock.MongoClient()
+
+    obtener_cliente('localhost', 27017, max_pool_size=7, max_idle_time_ms=1000,
+                    server_selection_timeout_ms=250, clase_cliente=clase_cliente)
+
+    assert argumentos['maxPoolSize'] == 7
+    assert argumentos['maxIdleTimeMS'] == 1000
+    assert argumentos['serverSelectionTimeoutMS'] == 250
+    assert len(argumentos['event_listeners']) == 1
+
+def test_metricas_cliente():
+    """Prueba que las esperas de obtención de conexión se acumulan en las métricas"""
+    cliente = obtener_cliente('localhost', 27017, clase_cliente=mongomock.MongoClient)
+    (metricas,) = [metricas for registrado, metricas in ej3a4_clientes._clientes.values() if registrado is cliente]
+
+    # Simulamos los eventos que emitiría pymongo
+    metricas.connection_checked_out(type('Evento', (), {'duration': 0.02})())
+    metricas.connection_checked_out(type('Evento', (), {'duration': 0.04})())
+    metricas.connection_checked_in(None)
+
+    datos = metricas_cliente(cliente)
+    assert datos['obtenidas'] == 2
+    assert datos['conexiones_en_uso'] == 1
+    assert datos['espera_media'] == pytest.approx(0.03)
+    assert datos['espera_maxima'] == pytest.approx(0.04)
+    assert metricas_cliente(mongomock.MongoClient()) is None
+
+def test_cerrar_clientes():
+    """Prueba que cerrar_clientes cierra y olvida los clientes registrados"""
+    cerrados = []
+    class ClienteFalso(mongomock.MongoClient):
+        def close(self):
+            cerrados.append(self)
+
+    cliente = obtener_cliente('localhost', 27017, clase_cliente=ClienteFalso)
+    cerrar_clientes()
+
+    assert cerrados == [cliente]
+    assert obtener_cliente('localhost', 27017, clase_cliente=ClienteFalso) is not cliente
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="fork no disponible")
+def test_cliente_nuevo_tras_fork():
+    """Prueba que un proceso hijo no reutiliza el cliente del padre"""
+    cliente_padre = obtener_cliente('localhost', 27017, clase_cliente=mongomock.MongoClient)
+    lectura, escritura = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            cliente_hijo = obtener_cliente('localhost', 27017, clase_cliente=mongomock.MongoClient)
+            os.write(escritura, b'1' if cliente_hijo is not cliente_padre else b'0')
+        finally:
+            os._exit(0)
+    os.close(escritura)
+    resultado = os.read(lectura, 1)
+    os.close(lectura)
+    os.waitpid(pid, 0)
+
+    assert resultado == b'1'
+    # El padre conserva su cliente
+    assert obtener_cliente('localhost', 27017, clase_cliente=mongomock.MongoClient) is cliente_padre
@@ -0,0 +1,235 @@
+"""
+Modelo desnormalizado de la biblioteca con el autor embebido en cada libro (ej3a4).
+
+En el modelo de ej3a4 los libros guardan sólo autor_id, así que cada listado
+necesita un $lookup. Aquí cada libro lleva además un resumen de su autor:
+
+    {'_id': ..., 'titulo': ..., 'anio': ..., 'autor': {'_id': ..., 'nombre': ...}}
+
+Las lecturas son un find() sobre una sola colección; a cambio, renombrar un
+autor obliga a reescribir todos sus libros (renombrar_autor lo hace con un
+único update_many). migrar_a_embebido() construye la colección embebida a
+partir de autores/libros, conservando los _id de los libros, en una colección
+temporal que sustituye a la de destino con un rename: los lectores ven la
+colección anterior o la nueva, nunca una a medio rellenar.
+
+medir_modos() compara la latencia de lectura y las escrituras por renombrado
+de los dos modelos.
+"""
+
+import time
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+import pymongo
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, IndexModel
+
+from ej3a4 import TAMANO_LOTE_LECTURA, buscar_libros_por_autor, iterar_libros, pipeline_listado_libros
+from ej3a4_ingesta import TAMANO_LOTE_ESCRITURA, agrupar_en_lotes, ingerir
+from ej3a4_modelos import Libro
+
+# Colección con los libros en el modelo embebido
+COLECCION_EMBEBIDA = 'libros_embebidos'
+# Sufijo de la colección temporal donde se construye una migración
+SUFIJO_MIGRACION = '_migracion'
+
+# Índices del modelo embebido: por nombre de autor (búsquedas) y por ID de autor (renombrados)
+INDICES_EMBEBIDOS: List[IndexModel] = [
+    IndexModel([('autor.nombre', ASCENDING), ('anio', ASCENDING)], name='autor.nombre_1_anio_1'),
+    IndexModel([('autor._id', ASCENDING)], name='autor._id_1'),
+]
+
+
+class ResultadoRenombrado(NamedTuple):
+    """
+    Documentos reescritos al renombrar un autor
+    """
+    autores: int
+    libros: int
+
+    @property
+    def documentos(self) -> int:
+        return self.autores + self.libros
+
+
+def crear_coleccion_embebida(db: pymongo.database.Database, coleccion: str = COLECCION_EMBEBIDA) -> None:
+    """
+    Crea la colección embebida (si no existe) y sus índices
+    """
+    if coleccion not in db.list_collection_names():
+        db.create_collection(coleccion)
+    db[coleccion].create_indexes(INDICES_EMBEBIDOS)
+
+
+def _embeber(db: pymongo.database.Database, libros: List[Libro]) -> Iterator[Dict[str, Any]]:
+    # Un solo find por lote para conocer los nombres de los autores
+    autor_ids = list({libro.autor_id for libro in libros if libro.autor_id is not None})
+    nombres = {doc['_id']: doc['nombre'] for doc in db.autores.find({'_id': {'$in': autor_ids}}, {'nombre': 1})}
+    for libro in libros:
+        documento = {campo: valor for campo, valor in libro.a_documento().items() if campo != 'autor_id'}
+        if libro.autor_id is not None:
+            documento['autor'] = {'_id': libro.autor_id, 'nombre': nombres.get(libro.autor_id)}
+        yield documento
+
+
+def insertar_libros_embebidos(
+        db: pymongo.database.Database,
+        libros: Iterable[Union[Tuple[str, int, Any], Libro]],
+        tamano_lote: int = TAMANO_LOTE_ESCRITURA,
+        coleccion: str = COLECCION_EMBEBIDA
+) -> List[ObjectId]:
+    """
+    Inserta libros en el modelo embebido y devuelve sus IDs.
+    Los libros se indican como en ej3a4.insertar_libros (con autor_id). Como
+    insertar_libros, si algún libro no se inserta se lanza ErrorIngesta.
+    """
+    documentos = (documento
+                  for lote in agrupar_en_lotes((Libro.normalizar(libro) for libro in libros), tamano_lote)
+                  for documento in _embeber(db, lote))
+    return ingerir(db[coleccion], documentos, tamano_lote=tamano_lote, devolver_ids=True).comprobar().ids
+
+
+def iterar_libros_embebidos(
+        db: pymongo.database.Database,
+        tamano_lote: int = TAMANO_LOTE_LECTURA,
+        coleccion: str = COLECCION_EMBEBIDA
+) -> Iterator[Tuple[str, int, Optional[str]]]:
+    """
+    Recorre todos los libros devolviendo tuplas (titulo, anio, autor), como ej3a4.iterar_libros
+    """
+    cursor = db[coleccion].find({}, {'_id': 0, 'titulo': 1, 'anio': 1, 'autor.nombre': 1}, batch_size=tamano_lote)
+    with cursor:
+        for doc in cursor:
+            yield doc.get('titulo'), doc.get('anio'), doc.get('autor', {}).get('nombre')
+
+
+def buscar_libros_por_autor_embebido(
+        db: pymongo.database.Database,
+        nombre_autor: str,
+        tamano_lote: int = TAMANO_LOTE_LECTURA,
+        coleccion: str = COLECCION_EMBEBIDA
+) -> List[Tuple[str, int]]:
+    """
+    Busca libros por el nombre del autor, como ej3a4.buscar_libros_por_autor
+    """
+    cursor = db[coleccion].find({'autor.nombre': nombre_autor}, {'_id': 0, 'titulo': 1, 'anio': 1},
+                                batch_size=tamano_lote)
+    return [(doc['titulo'], doc['anio']) for doc in cursor]
+
+
+def renombrar_autor(
+        db: pymongo.database.Database,
+        autor_id: Union[str, ObjectId],
+        nuevo_nombre: str,
+        coleccion: str = COLECCION_EMBEBIDA
+) -> ResultadoRenombrado:
+    """
+    Cambia el nombre de un autor y lo propaga a todos sus libros embebidos
+    """
+    autor_id = ObjectId(autor_id)
+    autores = db.autores.update_one({'_id': autor_id}, {'$set': {'nombre': nuevo_nombre}}).modified_count
+    libros = db[coleccion].update_many({'autor._id': autor_id},
+                                       {'$set': {'autor.nombre': nuevo_nombre}}).modified_count
+    return ResultadoRenombrado(autores, libros)
+
+
+def migrar_a_embebido(
+        db: pymongo.database.Database,
+        coleccion: str = COLECCION_EMBEBIDA,
+        tamano_lote: int = TAMANO_LOTE_ESCRITURA
+) -> int:
+    """
+    Rellena la colección embebida a partir de autores y libros y devuelve los libros migrados.
+
+    Los libros se escriben en una colección temporal (con los índices ya creados)
+    que, si todos se insertan, sustituye a la de destino con rename(dropTarget=True).
+    Si alguno falla se lanza ErrorIngesta, se borra la temporal y el destino queda
+    como estaba. La migración se puede repetir.
+    """
+    temporal = coleccion + SUFIJO_MIGRACION
+    # Restos de una migración interrumpida
+    db.drop_collection(temporal)
+    crear_coleccion_embebida(db, temporal)
+    # Mismo $lookup que el listado, pero conservando los IDs del libro y del autor
+    pipeline = pipeline_listado_libros()[:2] + [
+        {"$project": {"titulo": 1, "anio": 1, "autor": {"_id": "$autor._id", "nombre": "$autor.nombre"}}}
+    ]
+    documentos = db.libros.aggregate(pipeline, batchSize=tamano_lote)
+    try:
+        resultado = ingerir(db[temporal], (_sin_autor_vacio(doc) for doc in documentos),
+                            tamano_lote=tamano_lote).comprobar()
+        db[temporal].rename(coleccion, dropTarget=True)
+    except BaseException:
+        db.drop_collection(temporal)
+        raise
+    return resultado.insertados
+
+
+def _sin_autor_vacio(documento: Dict[str, Any]) -> Dict[str, Any]:
+    # Los libros sin autor no llevan el campo autor (igual que al insertarlos)
+    if not documento.get('autor') or documento['autor'].get('_id') is None:
+        documento.pop('autor', None)
+    return documento
+
+
+def _medir(funcion, repeticiones: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones
+
+
+def medir_modos(
+        db: pymongo.database.Database,
+        nombres_autor: List[str],
+        repeticiones: int = 20,
+        coleccion: str = COLECCION_EMBEBIDA
+) -> Dict[str, Dict[str, float]]:
+    """
+    Compara los modelos referenciado y embebido sobre los datos de db (ya migrados):
+    segundos por listado completo y por búsqueda por autor, y documentos escritos
+    al renombrar el primer autor de nombres_autor (que se deja con su nombre original).
+    """
+    nombre = nombres_autor[0]
+    autor_id = db.autores.find_one({'nombre': nombre}, {'_id': 1})['_id']
+    embebido = renombrar_autor(db, autor_id, nombre + ' (renombrado)', coleccion)
+    renombrar_autor(db, autor_id, nombre, coleccion)
+    return {
+        'referenciado': {
+            'listado': _medir(lambda: sum(1 for _ in iterar_libros(db)), repeticiones),
+            'busqueda': _medir(lambda: [buscar_libros_por_autor(db, n) for n in nombres_autor], repeticiones),
+            'escrituras_renombrado': embebido.autores,
+        },
+        'embebido': {
+            'listado': _medir(lambda: sum(1 for _ in iterar_libros_embebidos(db, coleccion=coleccion)),
+                              repeticiones),
+            'busqueda': _medir(lambda: [buscar_libros_por_autor_embebido(db, n, coleccion=coleccion)
+                                        for n in nombres_autor], repeticiones),
+            'escrituras_renombrado': embebido.documentos,
+        },
+    }
+
+
+if __name__ == "__main__":
+    # Comparativa contra mongomock (o un MongoDB local si se indica --mongo)
+    import sys
+    from ej3a4 import insertar_autores, insertar_libros
+
+    if '--mongo' in sys.argv:
+        from ej3a4 import crear_conexion
+        db = crear_conexion().client['biblioteca_bench']
+    else:
+        import mongomock
+        db = mongomock.MongoClient().biblioteca_bench
+
+    nombres = [f"Autor {i}" for i in range(100)]
+    autor_ids = insertar_autores(db, [(nombre,) for nombre in nombres])
+    insertar_libros(db, ((f"Libro {i}", 1900 + i % 120, autor_ids[i % len(autor_ids)]) for i in range(10000)))
+    db.libros.create_index('autor_id')
+    db.autores.create_index('nombre')
+    print(f"Migrados {migrar_a_embebido(db)} libros")
+    for modo, datos in medir_modos(db, nombres[:10], repeticiones=5).items():
+        print(f"{modo:>12}: listado {datos['listado'] * 1000:8.1f} ms, "
+              f"10 búsquedas {datos['busqueda'] * 1000:8.1f} ms, "
+              f"renombrado {datos['escrituras_renombrado']} documentos")
+    db.client.drop_database(db.name)
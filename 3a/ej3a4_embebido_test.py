@@ -0,0 +1,114 @@
+"""
+Tests para ej3a4_embebido.py, el modelo con el autor embebido en cada libro.
+Se ejecutan contra mongomock.
+"""
+
+import pytest
+from pymongo.errors import BulkWriteError, PyMongoError
+import ej3a4_embebido
+from ej3a4 import insertar_autores, insertar_libros, iterar_libros, buscar_libros_por_autor
+from ej3a4_embebido import (COLECCION_EMBEBIDA, SUFIJO_MIGRACION, buscar_libros_por_autor_embebido, crear_coleccion_embebida,
+                            insertar_libros_embebidos, iterar_libros_embebidos, medir_modos,
+                            migrar_a_embebido, renombrar_autor)
+from ej3a4_ingesta import ErrorIngesta, ingerir, resultado_lote
+from ej3a4_modelos import Libro
+
+mongomock = pytest.importorskip("mongomock")
+
+@pytest.fixture
+def conexion():
+    """Fixture con autores y libros del modelo referenciado en mongomock"""
+    db = mongomock.MongoClient().biblioteca
+    autor_ids = insertar_autores(db, [("Isabel Allende",), ("Jorge Luis Borges",)])
+    insertar_libros(db, [("La casa de los espíritus", 1982, autor_ids[0]),
+                         ("Paula", 1994, autor_ids[0]),
+                         ("Ficciones", 1944, autor_ids[1]),
+                         ("Anónimo", 1500, None)])
+    db.autor_ids = autor_ids
+    return db
+
+def test_insertar_libros_embebidos(conexion):
+    """Prueba que cada libro lleva el ID y el nombre de su autor"""
+    crear_coleccion_embebida(conexion)
+    [libro_id] = insertar_libros_embebidos(conexion, [("Eva Luna", 1987, conexion.autor_ids[0])])
+
+    documento = conexion[COLECCION_EMBEBIDA].find_one({'_id': libro_id})
+    assert documento['autor'] == {'_id': conexion.autor_ids[0], 'nombre': "Isabel Allende"}
+    assert 'autor_id' not in documento
+    assert 'autor.nombre_1_anio_1' in conexion[COLECCION_EMBEBIDA].index_information()
+
+def test_migrar_a_embebido(conexion):
+    """Prueba que la migración da los mismos resultados que el modelo referenciado"""
+    assert migrar_a_embebido(conexion) == 4
+    # Repetir la migración no duplica libros
+    assert migrar_a_embebido(conexion) == 4
+
+    assert sorted(iterar_libros_embebidos(conexion)) == sorted(iterar_libros(conexion))
+    assert sorted(buscar_libros_por_autor_embebido(conexion, "Isabel Allende")) == \
+        sorted(buscar_libros_por_autor(conexion, "Isabel Allende"))
+    assert 'autor' not in conexion[COLECCION_EMBEBIDA].find_one({'titulo': 'Anónimo'})
+
+def test_insertar_libros_embebidos_con_errores(conexion):
+    """Prueba que un libro que no se inserta lanza ErrorIngesta en lugar de perderse"""
+    crear_coleccion_embebida(conexion)
+    [libro_id] = insertar_libros_embebidos(conexion, [("Eva Luna", 1987, conexion.autor_ids[0])])
+
+    with pytest.raises(ErrorIngesta) as error:
+        insertar_libros_embebidos(conexion, [Libro(id=libro_id, titulo="Eva Luna", anio=1987,
+                                                   autor_id=conexion.autor_ids[0])])
+    assert isinstance(error.value, BulkWriteError)
+
+def test_migrar_sustituye_el_destino_de_una_vez(conexion, monkeypatch):
+    """Prueba que la migración se construye aparte y un fallo deja el destino como estaba"""
+    migrar_a_embebido(conexion)
+    conexion.libros.insert_one({'titulo': 'Eva Luna', 'anio': 1987, 'autor_id': conexion.autor_ids[0]})
+
+    def ingerir_con_error(coleccion, documentos, **opciones):
+        # El destino no se toca mientras se rellena la temporal
+        assert coleccion.name == COLECCION_EMBEBIDA + SUFIJO_MIGRACION
+        assert conexion[COLECCION_EMBEBIDA].count_documents({}) == 4
+        resultado = ingerir(coleccion, documentos, **opciones)
+        _, ids, errores = resultado_lote(resultado.lotes, [], PyMongoError("simulado"))
+        resultado.registrar_lote(ids, errores)
+        return resultado
+    monkeypatch.setattr(ej3a4_embebido, 'ingerir', ingerir_con_error)
+
+    with pytest.raises(ErrorIngesta):
+        migrar_a_embebido(conexion)
+
+    assert conexion[COLECCION_EMBEBIDA].count_documents({}) == 4
+    assert COLECCION_EMBEBIDA + SUFIJO_MIGRACION not in conexion.list_collection_names()
+    monkeypatch.undo()
+    assert migrar_a_embebido(conexion) == 5
+    assert 'autor.nombre_1_anio_1' in conexion[COLECCION_EMBEBIDA].index_information()
+
+def test_migrar_conserva_ids(conexion):
+    """Prueba que los libros migrados mantienen su _id"""
+    migrar_a_embebido(conexion)
+
+    assert sorted(doc['_id'] for doc in conexion.libros.find()) == \
+        sorted(doc['_id'] for doc in conexion[COLECCION_EMBEBIDA].find())
+
+def test_renombrar_autor(conexion):
+    """Prueba que el nuevo nombre se propaga a todos los libros del autor"""
+    migrar_a_embebido(conexion)
+
+    resultado = renombrar_autor(conexion, conexion.autor_ids[0], "Isabel A.")
+
+    assert resultado.autores == 1
+    assert resultado.libros == 2
+    assert resultado.documentos == 3
+    assert buscar_libros_por_autor_embebido(conexion, "Isabel Allende") == []
+    assert len(buscar_libros_por_autor_embebido(conexion, "Isabel A.")) == 2
+    assert conexion.autores.find_one({'_id': conexion.autor_ids[0]})['nombre'] == "Isabel A."
+
+def test_medir_modos(conexion):
+    """Prueba la comparativa y que deja los nombres como estaban"""
+    migrar_a_embebido(conexion)
+
+    resultados = medir_modos(conexion, ["Isabel Allende", "Jorge Luis Borges"], repeticiones=1)
+
+    assert resultados['referenciado']['escrituras_renombrado'] == 1
+    assert resultados['embebido']['escrituras_renombrado'] == 3
+    assert resultados['embebido']['listado'] > 0
+    assert len(buscar_libros_por_autor_embebido(conexion, "Isabel Allende")) == 2
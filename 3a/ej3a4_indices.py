@@ -0,0 +1,220 @@
+"""
+Gestión de índices de las colecciones de la biblioteca (ej3a4).
+
+Los índices se declaran en INDICES según las consultas que deben atender:
+- libros (autor_id, anio): búsquedas de libros por autor (buscar_libros_por_autor)
+  y por autor y año. Al ser prefijo, también sirve a las consultas sólo por autor_id.
+- libros anio: consultas por año.
+- libros titulo: búsquedas exactas por título.
+- libros titulo (text): búsquedas por palabras del título con $text.
+- autores nombre: búsqueda de autores por nombre (único si se pide).
+
+aplicar_indices() es idempotente: crea lo que falta, rehace los índices cuya
+definición ha cambiado (en los de texto también pesos e idioma) y elimina los
+obsoletos. verificar_indices() usa explain() para comprobar que ninguna consulta
+crítica acaba en un COLLSCAN, incluida la agregación con $lookup de
+buscar_libros_por_autor: en ella se revisa también que el $lookup use un índice
+de la colección unida (problemas_plan()).
+"""
+
+from typing import Any, Dict, Iterator, List, Tuple
+
+import pymongo
+from pymongo import ASCENDING, TEXT, IndexModel
+
+# Índices por colección
+INDICES: Dict[str, List[IndexModel]] = {
+    'autores': [
+        IndexModel([('nombre', ASCENDING)], name='nombre_1'),
+    ],
+    'libros': [
+        IndexModel([('autor_id', ASCENDING), ('anio', ASCENDING)], name='autor_id_1_anio_1'),
+        IndexModel([('anio', ASCENDING)], name='anio_1'),
+        IndexModel([('titulo', ASCENDING)], name='titulo_1'),
+        IndexModel([('titulo', TEXT)], name='titulo_text', default_language='spanish'),
+    ],
+}
+
+# Índices que se crearon en versiones anteriores y ya no se usan
+INDICES_OBSOLETOS: Dict[str, List[str]] = {
+    # libros nunca ha tenido un campo 'nombre'
+    'libros': ['nombre_1'],
+}
+
+# Consultas críticas que deben resolverse con un índice: (colección, filtro)
+CONSULTAS_CRITICAS: List[Tuple[str, Dict[str, Any]]] = [
+    ('autores', {'nombre': 'Gabriel García Márquez'}),
+    ('libros', {'autor_id': 'autor'}),
+    ('libros', {'autor_id': 'autor', 'anio': 1967}),
+    ('libros', {'anio': 1967}),
+    ('libros', {'titulo': 'Cien años de soledad'}),
+    ('libros', {'$text': {'$search': 'soledad'}}),
+]
+
+# Estrategias de EQ_LOOKUP (motor SBE) que buscan en la colección unida con un índice
+_LOOKUP_CON_INDICE = ('IndexedLoopJoin', 'DynamicIndexedLoopJoin')
+
+
+def agregaciones_criticas() -> List[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    Agregaciones críticas (colección, pipeline): las mismas que ejecuta ej3a4
+    """
+    # Import diferido: ej3a4 importa este módulo
+    from ej3a4 import pipeline_libros_por_autores
+    return [('autores', pipeline_libros_por_autores(['Gabriel García Márquez']))]
+
+
+def indices_declarados(nombre_autor_unico: bool = False) -> Dict[str, List[IndexModel]]:
+    """
+    Devuelve INDICES aplicando las opciones indicadas
+    """
+    indices = {coleccion: list(modelos) for coleccion, modelos in INDICES.items()}
+    if nombre_autor_unico:
+        indices['autores'] = [
+            IndexModel([('nombre', ASCENDING)], name='nombre_1', unique=True)
+            if modelo.document['name'] == 'nombre_1' else modelo
+            for modelo in indices['autores']
+        ]
+    return indices
+
+
+def _misma_definicion(modelo: IndexModel, existente: Dict[str, Any]) -> bool:
+    """
+    Compara la definición declarada de un índice con la que tiene el servidor
+    """
+    declarado = modelo.document
+    if any(valor == TEXT for valor in declarado['key'].values()):
+        return _mismo_indice_texto(declarado, existente)
+    return (list(declarado['key'].items()) == [tuple(par) for par in existente['key']]
+            and bool(declarado.get('unique', False)) == bool(existente.get('unique', False)))
+
+
+def _mismo_indice_texto(declarado: Dict[str, Any], existente: Dict[str, Any]) -> bool:
+    """
+    Los índices de texto se guardan como _fts/_ftsx: se comparan los campos y sus
+    pesos ('weights') y el idioma por defecto
+    """
+    pesos = {campo: 1 for campo, valor in declarado['key'].items() if valor == TEXT}
+    pesos.update(declarado.get('weights', {}))
+    if 'weights' in existente:
+        pesos_existentes = dict(existente['weights'])
+    else:
+        # Servidores (o simuladores) que devuelven la clave tal como se declaró
+        pesos_existentes = {campo: 1 for campo, valor in dict(existente['key']).items() if valor == TEXT}
+    if pesos != pesos_existentes:
+        return False
+    if 'default_language' in existente and \
+            existente['default_language'] != declarado.get('default_language', 'english'):
+        return False
+    return bool(declarado.get('unique', False)) == bool(existente.get('unique', False))
+
+
+def planificar_indices(coleccion: str, modelos: List[IndexModel],
+                       existentes: Dict[str, Any]) -> Tuple[List[str], List[IndexModel]]:
+    """
+    Compara los índices declarados de una colección con los existentes
+    (index_information()) sin tocar el servidor.
+
+    Devuelve (nombres a eliminar, modelos a crear): los obsoletos se eliminan y los
+    que tienen otra definición se eliminan y se vuelven a crear.
+    """
+    eliminar = [obsoleto for obsoleto in INDICES_OBSOLETOS.get(coleccion, []) if obsoleto in existentes]
+    pendientes = []
+    for modelo in modelos:
+        nombre = modelo.document['name']
+        if nombre in existentes:
+            if _misma_definicion(modelo, existentes[nombre]):
+                continue
+            eliminar.append(nombre)
+        pendientes.append(modelo)
+    return eliminar, pendientes
+
+
+def aplicar_indices(db: pymongo.database.Database, nombre_autor_unico: bool = False) -> Dict[str, List[str]]:
+    """
+    Crea los índices declarados en INDICES de forma idempotente.
+    Si nombre_autor_unico es True, el índice de autores.nombre es único.
+
+    Devuelve, por colección, los nombres de los índices creados o rehechos.
+    """
+    creados = {}
+    for coleccion, modelos in indices_declarados(nombre_autor_unico).items():
+        eliminar, pendientes = planificar_indices(coleccion, modelos, db[coleccion].index_information())
+        for nombre in eliminar:
+            db[coleccion].drop_index(nombre)
+        if pendientes:
+            db[coleccion].create_indexes(pendientes)
+        creados[coleccion] = [modelo.document['name'] for modelo in pendientes]
+    return creados
+
+
+def _nodos_plan(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Recorre todos los nodos (diccionarios) de un explain() salvo los planes descartados
+    """
+    pendientes = [plan]
+    while pendientes:
+        nodo = pendientes.pop()
+        if isinstance(nodo, dict):
+            yield nodo
+            pendientes.extend(valor for clave, valor in nodo.items() if clave != 'rejectedPlans')
+        elif isinstance(nodo, list):
+            pendientes.extend(nodo)
+
+
+def etapas_plan(plan: Dict[str, Any]) -> List[str]:
+    """
+    Devuelve todas las etapas ('stage') del plan ganador de un explain()
+    (de un find() o de una agregación, incluidas las de sus $cursor)
+    """
+    plan = plan.get('queryPlanner', {}).get('winningPlan', plan)
+    return [nodo['stage'] for nodo in _nodos_plan(plan) if 'stage' in nodo]
+
+
+def problemas_plan(plan: Dict[str, Any]) -> List[str]:
+    """
+    Problemas de un explain() (con verbosidad executionStats para las agregaciones):
+    - COLLSCAN en el plan ganador;
+    - un $lookup que recorre la colección unida (collectionScans > 0, motor clásico);
+    - un EQ_LOOKUP que no usa índice (estrategia HashJoin o NestedLoopJoin, motor SBE).
+    """
+    problemas = []
+    if 'COLLSCAN' in etapas_plan(plan):
+        problemas.append('COLLSCAN')
+    for nodo in _nodos_plan(plan):
+        if '$lookup' in nodo and nodo.get('collectionScans', 0) > 0:
+            problemas.append(f"$lookup sobre {nodo['$lookup'].get('from')} sin índice (COLLSCAN)")
+        if nodo.get('stage') == 'EQ_LOOKUP' and nodo.get('strategy') not in _LOOKUP_CON_INDICE:
+            problemas.append(f"$lookup sobre {nodo.get('foreignCollection')} sin índice ({nodo.get('strategy')})")
+    return problemas
+
+
+def usa_collscan(db: pymongo.database.Database, coleccion: str, filtro: Dict[str, Any]) -> bool:
+    """
+    Indica si la consulta recorrería la colección entera (COLLSCAN)
+    """
+    plan = db[coleccion].find(filtro).explain()
+    return 'COLLSCAN' in etapas_plan(plan)
+
+
+def explicar_agregacion(db: pymongo.database.Database, coleccion: str,
+                        pipeline: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    explain() de una agregación con executionStats, necesario para ver cómo se resuelve el $lookup
+    """
+    return db.command('explain', {'aggregate': coleccion, 'pipeline': pipeline, 'cursor': {}},
+                      verbosity='executionStats')
+
+
+def verificar_indices(db: pymongo.database.Database) -> List[Tuple[str, Any, List[str]]]:
+    """
+    Devuelve (colección, filtro o pipeline, problemas) de las consultas y agregaciones
+    críticas que no usan índices (lista vacía si todo está bien)
+    """
+    fallos = [(coleccion, filtro, ['COLLSCAN']) for coleccion, filtro in CONSULTAS_CRITICAS
+              if usa_collscan(db, coleccion, filtro)]
+    for coleccion, pipeline in agregaciones_criticas():
+        problemas = problemas_plan(explicar_agregacion(db, coleccion, pipeline))
+        if problemas:
+            fallos.append((coleccion, pipeline, problemas))
+    return fallos
@@ -0,0 +1,157 @@
+"""
+Tests para ej3a4_indices.py, la gestión de índices de la biblioteca.
+Las pruebas de aplicación usan mongomock; las de explain() necesitan un MongoDB real.
+"""
+
+import pytest
+import pymongo
+from ej3a4 import MONGODB_HOST, MONGODB_PORT, MONGODB_USERNAME, MONGODB_PASSWORD
+import ej3a4_indices
+from ej3a4 import pipeline_libros_por_autores
+from ej3a4_indices import (INDICES, CONSULTAS_CRITICAS, aplicar_indices, etapas_plan, problemas_plan,
+                           agregaciones_criticas, explicar_agregacion, usa_collscan, verificar_indices)
+from pymongo import IndexModel, TEXT
+
+mongomock = pytest.importorskip("mongomock")
+
+@pytest.fixture
+def db_mock():
+    """Fixture con una base de datos mongomock vacía"""
+    return mongomock.MongoClient().biblioteca
+
+@pytest.fixture
+def db_real():
+    """Fixture con una base de datos MongoDB real; se omite si no hay servidor"""
+    cliente = pymongo.MongoClient(host=MONGODB_HOST, port=MONGODB_PORT, username=MONGODB_USERNAME,
+                                  password=MONGODB_PASSWORD, serverSelectionTimeoutMS=500)
+    try:
+        cliente.admin.command('ping')
+    except pymongo.errors.PyMongoError as e:
+        cliente.close()
+        pytest.skip(f"No hay un MongoDB disponible: {e}")
+    db = cliente['biblioteca_indices_test']
+    yield db
+    cliente.drop_database(db.name)
+    cliente.close()
+
+def test_aplicar_indices_crea_los_declarados(db_mock):
+    """Prueba que se crean todos los índices declarados"""
+    creados = aplicar_indices(db_mock)
+
+    for coleccion, modelos in INDICES.items():
+        nombres = [modelo.document['name'] for modelo in modelos]
+        assert creados[coleccion] == nombres
+        indices = db_mock[coleccion].index_information()
+        for nombre in nombres:
+            assert nombre in indices
+
+def test_aplicar_indices_es_idempotente(db_mock):
+    """Prueba que aplicar los índices dos veces no crea ni rehace nada"""
+    aplicar_indices(db_mock)
+    antes = {c: sorted(db_mock[c].index_information()) for c in INDICES}
+
+    creados = aplicar_indices(db_mock)
+
+    assert creados == {coleccion: [] for coleccion in INDICES}
+    assert {c: sorted(db_mock[c].index_information()) for c in INDICES} == antes
+
+def test_aplicar_indices_elimina_obsoletos(db_mock):
+    """Prueba que se elimina el antiguo índice sobre libros.nombre"""
+    db_mock.libros.create_index('nombre')
+    assert 'nombre_1' in db_mock.libros.index_information()
+
+    aplicar_indices(db_mock)
+
+    assert 'nombre_1' not in db_mock.libros.index_information()
+
+def test_aplicar_indices_nombre_autor_unico(db_mock):
+    """Prueba que el índice de autores.nombre se rehace al pedirlo único"""
+    aplicar_indices(db_mock)
+    creados = aplicar_indices(db_mock, nombre_autor_unico=True)
+
+    assert creados['autores'] == ['nombre_1']
+    assert creados['libros'] == []
+    assert db_mock.autores.index_information()['nombre_1'].get('unique') is True
+
+def test_etapas_plan():
+    """Prueba la extracción de etapas de un plan de explain()"""
+    plan = {'queryPlanner': {'winningPlan': {
+        'stage': 'FETCH',
+        'inputStage': {'stage': 'IXSCAN', 'indexName': 'anio_1'}
+    }}}
+    assert sorted(etapas_plan(plan)) == ['FETCH', 'IXSCAN']
+
+    plan_sbe = {'queryPlanner': {'winningPlan': {'queryPlan': {'stage': 'COLLSCAN'}}}}
+    assert etapas_plan(plan_sbe) == ['COLLSCAN']
+
+def test_aplicar_indices_rehace_texto_con_otros_campos(db_mock):
+    """Prueba que un índice de texto con otros campos se rehace"""
+    db_mock.libros.create_indexes([IndexModel([('titulo', TEXT), ('resumen', TEXT)], name='titulo_text')])
+
+    creados = aplicar_indices(db_mock)
+
+    assert 'titulo_text' in creados['libros']
+    assert aplicar_indices(db_mock)['libros'] == []
+
+def test_misma_definicion_texto_compara_pesos_e_idioma():
+    """Prueba la comparación de índices de texto con la información que devuelve el servidor"""
+    (modelo,) = [m for m in INDICES['libros'] if m.document['name'] == 'titulo_text']
+    existente = {'key': [('_fts', 'text'), ('_ftsx', 1)], 'weights': {'titulo': 1},
+                 'default_language': 'spanish', 'language_override': 'language'}
+
+    assert ej3a4_indices._misma_definicion(modelo, existente)
+    assert not ej3a4_indices._misma_definicion(modelo, {**existente, 'weights': {'titulo': 10}})
+    assert not ej3a4_indices._misma_definicion(modelo, {**existente, 'default_language': 'english'})
+    assert not ej3a4_indices._misma_definicion(modelo, {**existente, 'weights': {'titulo': 1, 'resumen': 1}})
+
+def test_problemas_plan_lookup():
+    """Prueba la detección de $lookup sin índice en planes de ambos motores"""
+    clasico = {'stages': [
+        {'$cursor': {'queryPlanner': {
+            'winningPlan': {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': 'nombre_1'}},
+            'rejectedPlans': [{'stage': 'COLLSCAN'}]}}},
+        {'$lookup': {'from': 'libros', 'as': 'libros'}, 'collectionScans': 1, 'indexesUsed': []},
+    ]}
+    assert problemas_plan(clasico) == ['$lookup sobre libros sin índice (COLLSCAN)']
+
+    clasico['stages'][1].update(collectionScans=0, indexesUsed=['autor_id_1_anio_1'])
+    assert problemas_plan(clasico) == []
+
+    sbe = {'queryPlanner': {'winningPlan': {'queryPlan': {
+        'stage': 'EQ_LOOKUP', 'foreignCollection': 'biblioteca.libros', 'strategy': 'HashJoin',
+        'inputStage': {'stage': 'IXSCAN'}}}}}
+    assert problemas_plan(sbe) == ['$lookup sobre biblioteca.libros sin índice (HashJoin)']
+    sbe['queryPlanner']['winningPlan']['queryPlan']['strategy'] = 'IndexedLoopJoin'
+    assert problemas_plan(sbe) == []
+
+    assert problemas_plan({'queryPlanner': {'winningPlan': {'stage': 'COLLSCAN'}}}) == ['COLLSCAN']
+
+def test_verificar_indices_explica_la_agregacion(db_mock, monkeypatch):
+    """Prueba que se explica el pipeline real de buscar_libros_por_autor y se informa del $lookup"""
+    explicadas = []
+    def explicar(db, coleccion, pipeline):
+        explicadas.append((coleccion, pipeline))
+        return {'stages': [{'$lookup': {'from': 'libros'}, 'collectionScans': 3}]}
+    monkeypatch.setattr(ej3a4_indices, 'usa_collscan', lambda db, coleccion, filtro: False)
+    monkeypatch.setattr(ej3a4_indices, 'explicar_agregacion', explicar)
+
+    fallos = verificar_indices(db_mock)
+
+    assert explicadas == agregaciones_criticas()
+    assert explicadas[0][1] == pipeline_libros_por_autores(['Gabriel García Márquez'])
+    assert fallos == [('autores', explicadas[0][1], ['$lookup sobre libros sin índice (COLLSCAN)'])]
+
+def test_consultas_criticas_sin_collscan(db_real):
+    """Prueba con explain() que ninguna consulta crítica recorre la colección entera"""
+    # Sin índices, las consultas hacen COLLSCAN
+    db_real.create_collection('autores')
+    db_real.create_collection('libros')
+    db_real.libros.insert_one({'titulo': 'Cien años de soledad', 'anio': 1967, 'autor_id': 'autor'})
+    assert usa_collscan(db_real, 'libros', {'anio': 1967})
+    coleccion, pipeline = agregaciones_criticas()[0]
+    assert problemas_plan(explicar_agregacion(db_real, coleccion, pipeline))
+
+    aplicar_indices(db_real)
+
+    assert verificar_indices(db_real) == []
+    assert len(CONSULTAS_CRITICAS) > 0
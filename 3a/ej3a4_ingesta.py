@@ -0,0 +1,219 @@
+"""
+Ingesta masiva de documentos en MongoDB (ej3a4).
+
+Los documentos se consumen de cualquier iterable (p.ej. un generador) y se
+envían en lotes de bulk_write no ordenados: un documento erróneo no detiene
+el resto de su lote ni los siguientes. Con hilos > 1 se mantienen varios lotes
+en vuelo a la vez mediante un ThreadPoolExecutor, con un máximo de lotes
+pendientes para que la memoria no crezca con el tamaño de la entrada.
+"""
+
+import itertools
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pymongo
+from bson.objectid import ObjectId
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+# Documentos por cada bulk_write
+TAMANO_LOTE_ESCRITURA = 1000
+# Lotes enviados en paralelo
+HILOS_INGESTA = 1
+
+
+class ResultadoIngesta:
+    """
+    Resumen de una ingesta: documentos insertados, errores por lote y velocidad
+    """
+
+    def __init__(self):
+        self.insertados = 0
+        self.lotes = 0
+        self.segundos = 0.0
+        # IDs insertados en el orden de entrada (sólo si se piden)
+        self.ids: List[Any] = []
+        # Un diccionario por lote con errores: {'lote', 'insertados', 'errores'}
+        self.errores: List[Dict[str, Any]] = []
+
+    @property
+    def docs_por_segundo(self) -> float:
+        return self.insertados / self.segundos if self.segundos else 0.0
+
+    def registrar_lote(self, ids: List[Any], errores: Optional[Dict[str, Any]]) -> None:
+        """
+        Suma un lote enviado (ids y errores como los devuelve resultado_lote)
+        """
+        self.lotes += 1
+        self.insertados += len(ids) if errores is None else errores['insertados']
+        if errores is not None:
+            self.errores.append(errores)
+
+    def comprobar(self) -> 'ResultadoIngesta':
+        """
+        Lanza ErrorIngesta si algún documento o lote no se pudo insertar; si no, devuelve el resultado
+        """
+        if self.errores:
+            raise ErrorIngesta(self)
+        return self
+
+    def __repr__(self):
+        return (f"<ResultadoIngesta insertados={self.insertados} lotes={self.lotes} "
+                f"errores={len(self.errores)} docs/s={self.docs_por_segundo:.0f}>")
+
+
+class ErrorIngesta(BulkWriteError):
+    """
+    Ingesta con errores. Es un BulkWriteError (como el que lanzaba insert_many) cuyo
+    details reúne los errores de todos los lotes; `resultado` conserva el
+    ResultadoIngesta completo, con los IDs que sí se insertaron.
+    """
+
+    def __init__(self, resultado: ResultadoIngesta):
+        errores = [error for lote in resultado.errores for error in lote['errores']]
+        super().__init__({'writeErrors': errores, 'writeConcernErrors': [], 'nInserted': resultado.insertados,
+                          'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': []})
+        self.resultado = resultado
+
+    @property
+    def ids(self) -> List[Any]:
+        """IDs insertados antes del error (sólo si la ingesta los pedía)"""
+        return self.resultado.ids
+
+
+def agrupar_en_lotes(elementos: Iterable[Any], tamano_lote: int) -> Iterator[List[Any]]:
+    """
+    Agrupa los elementos en listas de tamano_lote sin materializar la entrada
+    """
+    iterador = iter(elementos)
+    while True:
+        lote = list(itertools.islice(iterador, tamano_lote))
+        if not lote:
+            return
+        yield lote
+
+
+def operaciones_lote(lote: List[dict]) -> List[InsertOne]:
+    """
+    Operaciones InsertOne del lote. Los _id se asignan en cliente para saber
+    qué documentos han entrado aunque el lote falle en parte.
+    """
+    for documento in lote:
+        documento.setdefault('_id', ObjectId())
+    return [InsertOne(documento) for documento in lote]
+
+
+def resultado_lote(numero: int, lote: List[dict],
+                   error: Optional[PyMongoError] = None) -> Tuple[int, List[Any], Optional[Dict[str, Any]]]:
+    """
+    Interpreta el resultado de enviar un lote (error es la excepción de bulk_write, si la hubo).
+    Devuelve (número de lote, IDs insertados, errores del lote o None).
+    """
+    if error is None:
+        return numero, [documento['_id'] for documento in lote], None
+    if isinstance(error, BulkWriteError):
+        fallidos = {fallo['index'] for fallo in error.details.get('writeErrors', [])}
+        ids = [documento['_id'] for i, documento in enumerate(lote) if i not in fallidos]
+        errores = error.details.get('writeErrors', []) + error.details.get('writeConcernErrors', [])
+        return numero, ids, {'lote': numero, 'insertados': error.details.get('nInserted', len(ids)),
+                             'errores': errores}
+    # Error del lote completo (red, autenticación...): seguimos con el resto
+    return numero, [], {'lote': numero, 'insertados': 0, 'errores': [{'errmsg': str(error)}]}
+
+
+def _enviar_lote(coleccion: pymongo.collection.Collection, numero: int,
+                 lote: List[dict]) -> Tuple[int, List[Any], Optional[Dict[str, Any]]]:
+    """
+    Envía un lote con bulk_write no ordenado (ver resultado_lote)
+    """
+    try:
+        coleccion.bulk_write(operaciones_lote(lote), ordered=False)
+    except PyMongoError as e:
+        return resultado_lote(numero, lote, e)
+    return resultado_lote(numero, lote)
+
+
+def ingerir(
+        coleccion: pymongo.collection.Collection,
+        documentos: Iterable[dict],
+        tamano_lote: int = TAMANO_LOTE_ESCRITURA,
+        hilos: int = HILOS_INGESTA,
+        devolver_ids: bool = False
+) -> ResultadoIngesta:
+    """
+    Inserta los documentos en lotes de bulk_write no ordenados.
+
+    Los errores de cada lote se recogen en el resultado sin detener la ingesta;
+    resultado.comprobar() los convierte en una excepción (ErrorIngesta).
+    Con devolver_ids=True, resultado.ids contiene los _id insertados en el orden de entrada
+    (ocupa memoria proporcional a la entrada; por defecto no se guardan).
+    """
+    if tamano_lote <= 0 or hilos <= 0:
+        raise ValueError('tamano_lote e hilos deben ser mayores que 0')
+    resultado = ResultadoIngesta()
+    ids_por_lote: Dict[int, List[Any]] = {}
+
+    def registrar(numero, ids, errores):
+        resultado.registrar_lote(ids, errores)
+        if devolver_ids:
+            ids_por_lote[numero] = ids
+
+    inicio = time.perf_counter()
+    if hilos == 1:
+        for numero, lote in enumerate(agrupar_en_lotes(documentos, tamano_lote)):
+            registrar(*_enviar_lote(coleccion, numero, lote))
+    else:
+        with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+            pendientes = set()
+            for numero, lote in enumerate(agrupar_en_lotes(documentos, tamano_lote)):
+                # Limitamos los lotes en vuelo para no leer toda la entrada por adelantado
+                if len(pendientes) >= hilos * 2:
+                    terminados, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                    for futuro in terminados:
+                        registrar(*futuro.result())
+                pendientes.add(ejecutor.submit(_enviar_lote, coleccion, numero, lote))
+            for futuro in pendientes:
+                registrar(*futuro.result())
+    resultado.segundos = time.perf_counter() - inicio
+
+    resultado.errores.sort(key=lambda errores: errores['lote'])
+    if devolver_ids:
+        for numero in sorted(ids_por_lote):
+            resultado.ids.extend(ids_por_lote[numero])
+    return resultado
+
+
+def medir_ingesta(
+        coleccion: pymongo.collection.Collection,
+        total: int,
+        tamano_lote: int = TAMANO_LOTE_ESCRITURA,
+        hilos: int = HILOS_INGESTA
+) -> ResultadoIngesta:
+    """
+    Inserta `total` libros sintéticos y devuelve el resultado con los docs/s obtenidos
+    """
+    documentos = ({'titulo': f'Libro {i}', 'anio': 1900 + i % 120, 'autor_id': i % 100} for i in range(total))
+    return ingerir(coleccion, documentos, tamano_lote=tamano_lote, hilos=hilos)
+
+
+if __name__ == "__main__":
+    # Comparativa de configuraciones contra mongomock (o un MongoDB local si se indica --mongo)
+    import sys
+
+    if '--mongo' in sys.argv:
+        from ej3a4 import crear_conexion
+        db = crear_conexion()
+    else:
+        import mongomock
+        db = mongomock.MongoClient().biblioteca
+
+    TOTAL = 100000
+    print(f"Ingesta de {TOTAL} documentos")
+    for tamano_lote, hilos in [(100, 1), (1000, 1), (1000, 4), (5000, 4)]:
+        db.bench_ingesta.drop()
+        resultado = medir_ingesta(db.bench_ingesta, TOTAL, tamano_lote=tamano_lote, hilos=hilos)
+        print(f"lote={tamano_lote:>5} hilos={hilos}: {resultado.docs_por_segundo:>10.0f} docs/s "
+              f"({resultado.segundos:.2f} s, {len(resultado.errores)} lotes con errores)")
+    db.bench_ingesta.drop()
@@ -0,0 +1,104 @@
+"""
+Tests para ej3a4_ingesta.py, la ingesta masiva por lotes de bulk_write.
+Se usa mongomock como sustituto de un servidor MongoDB.
+"""
+
+import pytest
+from pymongo.errors import BulkWriteError
+from ej3a4_ingesta import ErrorIngesta, ingerir, medir_ingesta
+
+mongomock = pytest.importorskip("mongomock")
+
+@pytest.fixture
+def coleccion():
+    """Fixture con una colección vacía en mongomock"""
+    return mongomock.MongoClient().biblioteca.libros
+
+def generar_libros(total):
+    """Generador de documentos de libro"""
+    for i in range(total):
+        yield {'titulo': f'Libro {i}', 'anio': 2000 + i}
+
+def test_ingerir_desde_generador(coleccion):
+    """Prueba que se insertan todos los documentos en lotes"""
+    resultado = ingerir(coleccion, generar_libros(25), tamano_lote=10, devolver_ids=True)
+
+    assert resultado.insertados == 25
+    assert resultado.lotes == 3
+    assert resultado.errores == []
+    assert coleccion.count_documents({}) == 25
+    # Los IDs se devuelven en el orden de entrada
+    titulos = [coleccion.find_one({'_id': _id})['titulo'] for _id in resultado.ids]
+    assert titulos == [f'Libro {i}' for i in range(25)]
+
+def test_ingerir_no_guarda_ids_por_defecto(coleccion):
+    """Prueba que sin devolver_ids no se acumulan los IDs en memoria"""
+    resultado = ingerir(coleccion, generar_libros(5), tamano_lote=2)
+
+    assert resultado.insertados == 5
+    assert resultado.ids == []
+
+def test_ingerir_continua_tras_errores(coleccion):
+    """Prueba que un documento erróneo no detiene el resto de la ingesta"""
+    coleccion.insert_one({'_id': 'duplicado'})
+    documentos = [{'_id': 'a'}, {'_id': 'duplicado'}, {'_id': 'b'}, {'_id': 'c'}, {'_id': 'duplicado'}]
+
+    resultado = ingerir(coleccion, documentos, tamano_lote=2, devolver_ids=True)
+
+    assert resultado.insertados == 3
+    assert resultado.ids == ['a', 'b', 'c']
+    assert [errores['lote'] for errores in resultado.errores] == [0, 2]
+    assert resultado.errores[0]['errores'][0]['code'] == 11000
+    assert coleccion.count_documents({}) == 4
+
+def test_comprobar_lanza_con_errores(coleccion):
+    """Prueba que comprobar() convierte los errores de la ingesta en un BulkWriteError con los IDs parciales"""
+    coleccion.insert_one({'_id': 'duplicado'})
+    resultado = ingerir(coleccion, [{'_id': 'a'}, {'_id': 'duplicado'}], devolver_ids=True)
+
+    with pytest.raises(BulkWriteError) as error:
+        resultado.comprobar()
+
+    assert isinstance(error.value, ErrorIngesta)
+    assert error.value.ids == ['a']
+    assert error.value.details['nInserted'] == 1
+    assert error.value.details['writeErrors'][0]['code'] == 11000
+    assert ingerir(coleccion, [{'_id': 'b'}]).comprobar().insertados == 1
+
+def test_comprobar_lote_fallido_completo(coleccion, monkeypatch):
+    """Prueba que un lote que falla entero (red, autenticación...) también se notifica"""
+    from pymongo.errors import AutoReconnect
+    def bulk_write(*args, **kwargs):
+        raise AutoReconnect('sin conexión')
+    monkeypatch.setattr(coleccion, 'bulk_write', bulk_write)
+
+    with pytest.raises(ErrorIngesta) as error:
+        ingerir(coleccion, generar_libros(3)).comprobar()
+
+    assert error.value.resultado.insertados == 0
+    assert 'sin conexión' in error.value.details['writeErrors'][0]['errmsg']
+
+def test_ingerir_con_varios_hilos(coleccion):
+    """Prueba la ingesta con varios lotes en vuelo"""
+    resultado = ingerir(coleccion, generar_libros(1000), tamano_lote=50, hilos=4, devolver_ids=True)
+
+    assert resultado.insertados == 1000
+    assert resultado.lotes == 20
+    assert len(resultado.ids) == 1000
+    assert coleccion.count_documents({}) == 1000
+    assert coleccion.find_one({'_id': resultado.ids[-1]})['titulo'] == 'Libro 999'
+
+def test_ingerir_parametros_invalidos(coleccion):
+    """Prueba que se rechazan tamaños de lote o hilos no positivos"""
+    with pytest.raises(ValueError):
+        ingerir(coleccion, [], tamano_lote=0)
+    with pytest.raises(ValueError):
+        ingerir(coleccion, [], hilos=0)
+
+def test_medir_ingesta(coleccion):
+    """Prueba que la medición informa de la velocidad de inserción"""
+    resultado = medir_ingesta(coleccion, 500, tamano_lote=100)
+
+    assert resultado.insertados == 500
+    assert resultado.segundos > 0
+    assert resultado.docs_por_segundo > 0
@@ -0,0 +1,171 @@
+"""
+Capa de mapeo entre documentos MongoDB y registros de la biblioteca (ej3a4).
+
+Autor y Libro son clases ligeras con __slots__ (sin __dict__ por instancia).
+Cada una declara los campos que ocupa en el documento, de modo que las
+consultas piden al servidor sólo esos campos (proyección) en lugar del
+documento entero.
+
+Las lecturas decodifican cada documento en un dict. Con raw=True se usa
+RawBSONDocument, que decodifica el documento entero la primera vez que se lee
+un campo: no ahorra nada al construir registros, que leen todos sus campos, y
+en la práctica es más lento. Sirve para reenviar documentos sin tocarlos.
+
+La capa cubre las lecturas con find() (buscar_libros, buscar_autores,
+obtener_libro); los listados de ej3a4 que unen libros y autores con $lookup
+(consultar_libros, buscar_libros_por_autor) devuelven tuplas y no pasan por ella.
+"""
+
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional, Tuple, Type, TypeVar, Union
+
+import pymongo
+from bson.codec_options import CodecOptions
+from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
+
+# Decodificar con RawBSONDocument salvo que se indique lo contrario
+DECODIFICACION_RAW = False
+# Documentos por lote del cursor
+TAMANO_LOTE_LECTURA = 1000
+
+_OPCIONES_RAW = CodecOptions(document_class=RawBSONDocument)
+
+R = TypeVar('R', bound='Registro')
+
+
+class Registro:
+    """
+    Base de los registros: CAMPOS relaciona cada atributo con su campo en el documento
+    """
+    __slots__ = ()
+    CAMPOS: Dict[str, str] = {}
+
+    def __init__(self, **valores):
+        for atributo in self.CAMPOS:
+            setattr(self, atributo, valores.pop(atributo, None))
+        if valores:
+            raise TypeError(f"Campos desconocidos para {type(self).__name__}: {sorted(valores)}")
+
+    @classmethod
+    def proyeccion(cls, atributos: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """
+        Proyección con los campos del documento que necesitan los atributos indicados (todos por defecto)
+        """
+        atributos = cls.CAMPOS if atributos is None else atributos
+        proyeccion = {cls.CAMPOS[atributo]: 1 for atributo in atributos}
+        # _id viene siempre salvo que se excluya explícitamente
+        proyeccion.setdefault('_id', 0)
+        return proyeccion
+
+    @classmethod
+    def desde_documento(cls: Type[R], documento: Mapping[str, Any]) -> R:
+        """
+        Crea el registro a partir de un documento (dict o RawBSONDocument)
+        """
+        registro = cls.__new__(cls)
+        for atributo, campo in cls.CAMPOS.items():
+            setattr(registro, atributo, documento.get(campo))
+        return registro
+
+    def a_documento(self) -> Dict[str, Any]:
+        """
+        Documento para insertar (sin _id si el registro todavía no tiene ID)
+        """
+        return {campo: getattr(self, atributo) for atributo, campo in self.CAMPOS.items()
+                if campo != '_id' or getattr(self, atributo) is not None}
+
+    def __eq__(self, otro):
+        if type(otro) is not type(self):
+            return NotImplemented
+        return all(getattr(self, atributo) == getattr(otro, atributo) for atributo in self.CAMPOS)
+
+    def __repr__(self):
+        valores = ', '.join(f"{atributo}={getattr(self, atributo)!r}" for atributo in self.CAMPOS)
+        return f"{type(self).__name__}({valores})"
+
+
+class Autor(Registro):
+    __slots__ = ('id', 'nombre')
+    CAMPOS = {'id': '_id', 'nombre': 'nombre'}
+
+    @classmethod
+    def normalizar(cls, valor: Union['Autor', Tuple[str], Mapping[str, Any]]) -> 'Autor':
+        """
+        Acepta un Autor, una tupla (nombre,) o un dict con 'nombre'
+        """
+        if isinstance(valor, Autor):
+            return valor
+        if isinstance(valor, tuple) and len(valor) == 1:
+            return cls(nombre=valor[0])
+        if isinstance(valor, Mapping) and 'nombre' in valor:
+            return cls(nombre=valor['nombre'])
+        raise TypeError(f"No se puede interpretar {valor!r} como autor: se espera (nombre,)")
+
+
+class Libro(Registro):
+    __slots__ = ('id', 'titulo', 'anio', 'autor_id')
+    CAMPOS = {'id': '_id', 'titulo': 'titulo', 'anio': 'anio', 'autor_id': 'autor_id'}
+
+    @classmethod
+    def normalizar(cls, valor: Union['Libro', Tuple[str, int, Any], Mapping[str, Any]]) -> 'Libro':
+        """
+        Acepta un Libro, una tupla (titulo, anio, autor_id) o un dict con 'titulo', 'anio' y 'autor_id'.
+        Un dict con 'titulo' al que le falte 'anio' o 'autor_id' lanza ValueError.
+        """
+        if isinstance(valor, Libro):
+            return valor
+        if isinstance(valor, tuple) and len(valor) == 3:
+            return cls(titulo=valor[0], anio=valor[1], autor_id=valor[2])
+        if isinstance(valor, Mapping) and 'titulo' in valor:
+            faltan = [campo for campo in ('anio', 'autor_id') if campo not in valor]
+            if faltan:
+                raise ValueError(f"Al libro {valor!r} le faltan los campos {', '.join(faltan)}")
+            return cls(titulo=valor['titulo'], anio=valor['anio'], autor_id=valor['autor_id'])
+        raise TypeError(f"No se puede interpretar {valor!r} como libro: se espera (titulo, anio, autor_id)")
+
+
+def _buscar(coleccion: pymongo.collection.Collection, clase: Type[R], filtro: Optional[Dict[str, Any]],
+            atributos: Optional[Iterable[str]], raw: Optional[bool], tamano_lote: int) -> Iterator[R]:
+    if raw is None:
+        raw = DECODIFICACION_RAW
+    if raw:
+        coleccion = coleccion.with_options(codec_options=_OPCIONES_RAW)
+    cursor = coleccion.find(filtro or {}, clase.proyeccion(atributos), batch_size=tamano_lote)
+    with cursor:
+        for documento in cursor:
+            yield clase.desde_documento(documento)
+
+
+def buscar_libros(
+        db: pymongo.database.Database,
+        filtro: Optional[Dict[str, Any]] = None,
+        atributos: Optional[Iterable[str]] = None,
+        raw: Optional[bool] = None,
+        tamano_lote: int = TAMANO_LOTE_LECTURA
+) -> Iterator[Libro]:
+    """
+    Recorre los libros que cumplen el filtro. Sólo se piden al servidor los campos
+    de `atributos` (todos por defecto); el resto quedan a None.
+    """
+    return _buscar(db.libros, Libro, filtro, atributos, raw, tamano_lote)
+
+
+def buscar_autores(
+        db: pymongo.database.Database,
+        filtro: Optional[Dict[str, Any]] = None,
+        atributos: Optional[Iterable[str]] = None,
+        raw: Optional[bool] = None,
+        tamano_lote: int = TAMANO_LOTE_LECTURA
+) -> Iterator[Autor]:
+    """
+    Recorre los autores que cumplen el filtro, con la misma proyección que buscar_libros
+    """
+    return _buscar(db.autores, Autor, filtro, atributos, raw, tamano_lote)
+
+
+def obtener_libro(db: pymongo.database.Database, id_libro: Union[str, ObjectId],
+                  raw: Optional[bool] = None) -> Optional[Libro]:
+    """
+    Devuelve el libro con ese ID o None si no existe
+    """
+    return next(buscar_libros(db, {'_id': ObjectId(id_libro)}, raw=raw, tamano_lote=1), None)
@@ -0,0 +1,124 @@
+"""
+Tests para ej3a4_modelos.py, la capa de mapeo de documentos a registros.
+Las consultas se prueban con mongomock (sin RawBSONDocument, que no admite) y,
+si hay un MongoDB disponible, con el servidor real.
+"""
+
+import bson
+import pymongo
+import pytest
+from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
+from ej3a4 import (MONGODB_HOST, MONGODB_PORT, MONGODB_USERNAME, MONGODB_PASSWORD, insertar_autores,
+                   insertar_libros)
+from ej3a4_modelos import Autor, Libro, buscar_autores, buscar_libros, obtener_libro
+
+mongomock = pytest.importorskip("mongomock")
+
+@pytest.fixture
+def conexion():
+    """Fixture con la base de datos de la biblioteca en mongomock"""
+    db = mongomock.MongoClient().biblioteca
+    autor_ids = insertar_autores(db, [("Isabel Allende",), Autor(nombre="Jorge Luis Borges")])
+    insertar_libros(db, [("Paula", 1994, autor_ids[0]),
+                         Libro(titulo="Ficciones", anio=1944, autor_id=autor_ids[1]),
+                         {"titulo": "El Aleph", "anio": 1949, "autor_id": autor_ids[1]}])
+    return db
+
+@pytest.fixture
+def conexion_real():
+    """Fixture con la biblioteca en un MongoDB real; se omite si no hay servidor"""
+    cliente = pymongo.MongoClient(host=MONGODB_HOST, port=MONGODB_PORT, username=MONGODB_USERNAME,
+                                  password=MONGODB_PASSWORD, serverSelectionTimeoutMS=500)
+    try:
+        cliente.admin.command('ping')
+    except pymongo.errors.PyMongoError as e:
+        cliente.close()
+        pytest.skip(f"No hay un MongoDB disponible: {e}")
+    db = cliente['biblioteca_modelos_test']
+    autor_ids = insertar_autores(db, [("Isabel Allende",)])
+    insertar_libros(db, [("Paula", 1994, autor_ids[0]), ("Eva Luna", 1987, autor_ids[0])])
+    yield db
+    cliente.drop_database(db.name)
+    cliente.close()
+
+def test_registros_usan_slots():
+    """Prueba que los registros no tienen __dict__"""
+    libro = Libro(titulo="Paula", anio=1994)
+    assert not hasattr(libro, '__dict__')
+    assert libro.autor_id is None
+    with pytest.raises(AttributeError):
+        libro.editorial = "Plaza & Janés"
+    with pytest.raises(TypeError):
+        Libro(editorial="Plaza & Janés")
+
+def test_proyeccion():
+    """Prueba que la proyección sólo incluye los campos pedidos"""
+    assert Libro.proyeccion() == {'_id': 1, 'titulo': 1, 'anio': 1, 'autor_id': 1}
+    assert Libro.proyeccion(['titulo', 'anio']) == {'titulo': 1, 'anio': 1, '_id': 0}
+    assert Autor.proyeccion(['id']) == {'_id': 1}
+
+def test_desde_documento_raw():
+    """Prueba la decodificación desde un RawBSONDocument"""
+    _id = ObjectId()
+    raw = RawBSONDocument(bson.encode({'_id': _id, 'titulo': 'Paula', 'anio': 1994, 'extra': 'x'}))
+
+    libro = Libro.desde_documento(raw)
+
+    assert libro == Libro(id=_id, titulo='Paula', anio=1994)
+    assert libro.autor_id is None
+
+def test_normalizar_entradas_invalidas():
+    """Prueba que se rechazan entradas con forma incorrecta"""
+    with pytest.raises(TypeError):
+        Libro.normalizar({'name': 'El quijote'})
+    with pytest.raises(TypeError):
+        Libro.normalizar(("El quijote", 1605))
+    with pytest.raises(TypeError):
+        Autor.normalizar("Gabriel")
+    assert Autor.normalizar({'nombre': 'Gabriel'}) == Autor(nombre='Gabriel')
+
+def test_normalizar_libro_incompleto():
+    """Prueba que un dict de libro sin anio o sin autor_id se rechaza en lugar de rellenarse con None"""
+    with pytest.raises(ValueError, match='anio, autor_id'):
+        Libro.normalizar({'titulo': 'El quijote'})
+    with pytest.raises(ValueError, match='autor_id'):
+        Libro.normalizar({'titulo': 'El quijote', 'anio': 1605})
+    libro = Libro.normalizar({'titulo': 'El quijote', 'anio': 1605, 'autor_id': None})
+    assert libro == Libro(titulo='El quijote', anio=1605)
+
+def test_buscar_libros(conexion):
+    """Prueba la búsqueda de libros con todos los campos"""
+    libros = sorted(buscar_libros(conexion, raw=False), key=lambda libro: libro.anio)
+
+    assert [libro.titulo for libro in libros] == ["Ficciones", "El Aleph", "Paula"]
+    assert all(isinstance(libro.id, ObjectId) for libro in libros)
+    assert libros[0].autor_id == libros[1].autor_id
+
+def test_buscar_libros_proyectados(conexion):
+    """Prueba que sólo se cargan los atributos pedidos"""
+    libros = list(buscar_libros(conexion, {'anio': {'$lt': 1950}}, atributos=['titulo'], raw=False))
+
+    assert sorted(libro.titulo for libro in libros) == ["El Aleph", "Ficciones"]
+    assert all(libro.id is None and libro.anio is None for libro in libros)
+
+def test_buscar_autores_y_obtener_libro(conexion):
+    """Prueba la búsqueda de autores y de un libro por ID"""
+    [autor] = buscar_autores(conexion, {'nombre': 'Isabel Allende'}, raw=False)
+    assert autor.nombre == 'Isabel Allende'
+
+    documento = conexion.libros.find_one({'titulo': 'Paula'})
+    libro = obtener_libro(conexion, str(documento['_id']), raw=False)
+    assert libro == Libro(id=documento['_id'], titulo='Paula', anio=1994, autor_id=autor.id)
+    assert obtener_libro(conexion, ObjectId(), raw=False) is None
+
+def test_buscar_libros_servidor_real(conexion_real):
+    """Prueba la decodificación por defecto y la RawBSONDocument contra un MongoDB real"""
+    por_defecto = sorted(buscar_libros(conexion_real), key=lambda libro: libro.anio)
+    raw = sorted(buscar_libros(conexion_real, raw=True), key=lambda libro: libro.anio)
+
+    assert [libro.titulo for libro in por_defecto] == ["Eva Luna", "Paula"]
+    assert raw == por_defecto
+    [autor] = buscar_autores(conexion_real, {'nombre': 'Isabel Allende'})
+    assert obtener_libro(conexion_real, por_defecto[0].id) == por_defecto[0]
+    assert all(libro.autor_id == autor.id for libro in por_defecto)
@@ -0,0 +1,223 @@
+"""
+Tests de ej3a4.py que no necesitan Docker: se ejecutan contra mongomock,
+un sustituto en memoria de MongoDB, o no necesitan servidor.
+"""
+
+import pytest
+from bson.objectid import ObjectId
+from ej3a4 import (insertar_autores, insertar_libros, consultar_libros, iterar_libros,
+                   buscar_libros_por_autor, buscar_libros_por_autores, actualizar_libro,
+                   actualizar_libro_detalle, eliminar_libro, eliminar_libros,
+                   esperar_mongodb, mongodb_disponible)
+import ej3a4
+from ej3a4_indices import aplicar_indices
+
+mongomock = pytest.importorskip("mongomock")
+
+# Datos de prueba
+AUTORES_PRUEBA = [
+    ("Gabriel García Márquez",),
+    ("Isabel Allende",),
+    ("Jorge Luis Borges",)
+]
+
+@pytest.fixture
+def conexion():
+    """Fixture con la base de datos de la biblioteca en mongomock"""
+    db = mongomock.MongoClient().biblioteca
+    aplicar_indices(db)
+    return db
+
+@pytest.fixture
+def datos_prueba(conexion):
+    """Fixture para cargar datos de prueba"""
+    autor_ids = insertar_autores(conexion, AUTORES_PRUEBA)
+    libros = [
+        ("Cien años de soledad", 1967, autor_ids[0]),
+        ("El amor en los tiempos del cólera", 1985, autor_ids[0]),
+        ("La casa de los espíritus", 1982, autor_ids[1]),
+        ("Paula", 1994, autor_ids[1]),
+        ("Ficciones", 1944, autor_ids[2]),
+        ("El Aleph", 1949, autor_ids[2])
+    ]
+    libro_ids = insertar_libros(conexion, libros)
+    return {
+        'autor_ids': autor_ids,
+        'libro_ids': libro_ids
+    }
+
+def test_insertar_autores_lanza_si_falla_alguno(conexion):
+    """Prueba que los errores de escritura no se pierden ni acortan la lista de IDs en silencio"""
+    from ej3a4_ingesta import ErrorIngesta
+    conexion.autores.insert_one({'nombre': 'Repetido'})
+    conexion.autores.create_index('nombre', unique=True, name='nombre_unico')
+
+    with pytest.raises(ErrorIngesta) as error:
+        insertar_autores(conexion, [("Nuevo",), ("Repetido",)])
+
+    assert len(error.value.ids) == 1
+    assert conexion.autores.count_documents({'nombre': 'Nuevo'}) == 1
+
+def test_buscar_libros_por_autor(conexion, datos_prueba):
+    """Prueba la búsqueda de libros de un autor con una sola agregación"""
+    libros = buscar_libros_por_autor(conexion, "Gabriel García Márquez")
+
+    assert sorted(libros) == [("Cien años de soledad", 1967), ("El amor en los tiempos del cólera", 1985)]
+    assert buscar_libros_por_autor(conexion, "Autor inexistente") == []
+
+def test_buscar_libros_por_autor_homonimos(conexion, datos_prueba):
+    """Prueba que se devuelven los libros de todos los autores con ese nombre"""
+    [otro_id] = insertar_autores(conexion, [("Isabel Allende",)])
+    insertar_libros(conexion, [("Otro libro", 2000, otro_id)])
+
+    libros = buscar_libros_por_autor(conexion, "Isabel Allende", tamano_lote=1)
+
+    assert len(libros) == 3
+    assert ("Otro libro", 2000) in libros
+
+def test_buscar_libros_por_autores(conexion, datos_prueba):
+    """Prueba la búsqueda por lotes de varios autores"""
+    resultado = buscar_libros_por_autores(conexion, ["Isabel Allende", "Jorge Luis Borges", "Nadie"])
+
+    assert set(resultado) == {"Isabel Allende", "Jorge Luis Borges", "Nadie"}
+    assert sorted(resultado["Isabel Allende"]) == [("La casa de los espíritus", 1982), ("Paula", 1994)]
+    assert sorted(resultado["Jorge Luis Borges"]) == [("El Aleph", 1949), ("Ficciones", 1944)]
+    assert resultado["Nadie"] == []
+    assert buscar_libros_por_autores(conexion, []) == {}
+
+def test_iterar_libros(conexion, datos_prueba):
+    """Prueba que el listado une cada libro con el nombre de su autor"""
+    libros = list(iterar_libros(conexion, tamano_lote=2))
+
+    assert len(libros) == 6
+    assert ("Cien años de soledad", 1967, "Gabriel García Márquez") in libros
+    assert ("Paula", 1994, "Isabel Allende") in libros
+    assert ("El Aleph", 1949, "Jorge Luis Borges") in libros
+
+def test_iterar_libros_sin_autor(conexion, datos_prueba):
+    """Prueba que un libro cuyo autor no existe se lista igualmente"""
+    conexion.libros.insert_one({"titulo": "Anónimo", "anio": 1500, "autor_id": "inexistente"})
+
+    libros = list(iterar_libros(conexion))
+
+    assert len(libros) == 7
+    assert ("Anónimo", 1500, None) in libros
+
+def test_consultar_libros(conexion, datos_prueba, capsys):
+    """Prueba que consultar_libros imprime una línea por libro"""
+    consultar_libros(conexion)
+
+    salida = capsys.readouterr().out.splitlines()
+    assert len(salida) == 6
+    assert "Libro: Ficciones, Año: 1944, Autor: Jorge Luis Borges" in salida
+
+def test_actualizar_libro_detalle(conexion, datos_prueba):
+    """Prueba que se distingue entre libro no encontrado, modificado y sin cambios"""
+    libro_id = str(datos_prueba['libro_ids'][0])
+
+    resultado = actualizar_libro_detalle(conexion, libro_id, nuevo_anio=1968)
+    assert (resultado.encontrados, resultado.modificados, resultado.sin_cambios) == (1, 1, 0)
+
+    # Mismo valor: se encuentra pero no cambia nada
+    resultado = actualizar_libro_detalle(conexion, libro_id, nuevo_anio=1968)
+    assert (resultado.encontrados, resultado.modificados, resultado.sin_cambios) == (1, 0, 1)
+    assert actualizar_libro(conexion, libro_id, nuevo_anio=1968) is True
+
+    # Sin campos que actualizar sólo se comprueba que existe
+    assert actualizar_libro_detalle(conexion, libro_id) == (1, 0)
+
+    inexistente = str(ObjectId())
+    assert actualizar_libro_detalle(conexion, inexistente, nuevo_titulo="X") == (0, 0)
+    assert actualizar_libro(conexion, inexistente, nuevo_titulo="X") is False
+
+def test_eliminar_libro(conexion, datos_prueba):
+    """Prueba que eliminar_libro borra sólo el libro indicado"""
+    libro_id = str(datos_prueba['libro_ids'][0])
+
+    assert eliminar_libro(conexion, libro_id) is True
+    assert eliminar_libro(conexion, libro_id) is False
+    assert conexion.libros.count_documents({}) == 5
+
+def test_eliminar_libros(conexion, datos_prueba):
+    """Prueba la eliminación masiva por lotes de bulk_write"""
+    ids = [str(_id) for _id in datos_prueba['libro_ids'][:4]] + [str(ObjectId())]
+
+    assert eliminar_libros(conexion, ids, tamano_lote=2) == 4
+    assert conexion.libros.count_documents({}) == 2
+    assert eliminar_libros(conexion, []) == 0
+
+class RelojFalso:
+    """Reloj que avanza sólo cuando se duerme"""
+    def __init__(self):
+        self.ahora = 0.0
+        self.esperas = []
+
+    def __call__(self):
+        return self.ahora
+
+    def dormir(self, segundos):
+        self.esperas.append(segundos)
+        self.ahora += segundos
+
+def test_esperar_mongodb_listo():
+    """Prueba que se sondea con esperas exponenciales hasta que MongoDB responde"""
+    reloj = RelojFalso()
+    respuestas = iter([False, False, False, True])
+
+    tiempo = esperar_mongodb(sonda=lambda: next(respuestas), reloj=reloj, dormir=reloj.dormir)
+
+    assert reloj.esperas == [0.05, 0.1, 0.2]
+    assert tiempo == pytest.approx(0.35)
+
+def test_esperar_mongodb_limite():
+    """Prueba que se devuelve None al superar el límite de espera"""
+    reloj = RelojFalso()
+
+    tiempo = esperar_mongodb(limite_segundos=3, sonda=lambda: False, reloj=reloj, dormir=reloj.dormir)
+
+    assert tiempo is None
+    assert reloj.ahora == pytest.approx(3)
+    # Las esperas no superan el máximo configurado
+    assert max(reloj.esperas) <= ej3a4.ARRANQUE_ESPERA_MAXIMA
+
+def test_esperar_mongodb_abortar():
+    """Prueba que se deja de esperar en cuanto abortar() devuelve True"""
+    reloj = RelojFalso()
+
+    tiempo = esperar_mongodb(sonda=lambda: False, reloj=reloj, dormir=reloj.dormir, abortar=lambda: True)
+
+    assert tiempo is None
+    assert reloj.esperas == []
+
+def test_iniciar_mongodb_local_proceso_terminado(monkeypatch, tmp_path):
+    """Prueba que si mongod termina enseguida no se espera al límite y se borra el directorio temporal"""
+    import shutil
+    import subprocess
+    import time
+    # Un "mongod" que termina nada más arrancar
+    falso = shutil.which('false')
+    if falso is None:
+        pytest.skip("No hay un ejecutable false")
+    procesos = []
+    popen = subprocess.Popen
+    def popen_y_apuntar(*args, **kwargs):
+        procesos.append(popen(*args, **kwargs))
+        return procesos[-1]
+    monkeypatch.setattr(ej3a4.shutil, 'which', lambda nombre: falso)
+    monkeypatch.setattr(ej3a4.subprocess, 'Popen', popen_y_apuntar)
+    monkeypatch.setattr(ej3a4, 'mongodb_disponible', lambda *args, **kwargs: False)
+    monkeypatch.setattr(ej3a4.tempfile, 'tempdir', str(tmp_path))
+
+    inicio = time.monotonic()
+    assert ej3a4.iniciar_mongodb_local() is None
+
+    assert len(procesos) == 1
+    assert time.monotonic() - inicio < ej3a4.ARRANQUE_LIMITE_SEGUNDOS / 2
+    assert list(tmp_path.iterdir()) == []
+
+def test_mongodb_disponible_sin_servidor(monkeypatch):
+    """Prueba que la sonda devuelve False rápidamente si no hay servidor"""
+    # Puerto sin servidor escuchando
+    monkeypatch.setattr(ej3a4, "MONGODB_PORT", 1)
+
+    assert mongodb_disponible(timeout_ms=100) is False
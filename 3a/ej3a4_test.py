@@ -10,7 +10,7 @@ from ej3a4 import (
     verificar_docker_instalado, iniciar_mongodb_docker, detener_mongodb_docker,
     crear_conexion, crear_colecciones, insertar_autores, insertar_libros,
     consultar_libros, buscar_libros_por_autor, actualizar_libro, eliminar_libro,
-    ejemplo_transaccion
+    ejemplo_transaccion, actualizar_libros
 )
 
 # Datos de prueba
@@ -222,6 +222,22 @@ def test_eliminar_libro(conexion, datos_prueba):
     # Verificar que sólo se eliminó ese libro
     assert conexion.libros.count_documents({}) == total_libros_inicial - 1
 
+def test_actualizar_libros(conexion, datos_prueba):
+    """Prueba la actualización masiva por lotes de bulk_write"""
+    ids = datos_prueba['libro_ids']
+    cambios = [(str(ids[0]), {'anio': 2000}),
+               (str(ids[1]), {'anio': 1985}),  # ya tiene ese año
+               (str(ObjectId()), {'anio': 2000}),  # no existe
+               (str(ids[2]), {'titulo': 'Nuevo título', 'anio': 2001}),
+               (str(ids[3]), {})]  # sin cambios: se ignora
+
+    resultado = actualizar_libros(conexion, cambios, tamano_lote=2)
+
+    assert resultado == (3, 2)
+    assert resultado.sin_cambios == 1
+    assert conexion.libros.find_one({'_id': ids[2]})['titulo'] == 'Nuevo título'
+    assert conexion.libros.count_documents({'anio': 2000}) == 1
+
 def test_ejemplo_transaccion(conexion):
     """Prueba la función ejemplo_transaccion"""
     # Obtener el estado inicial de la base de datos
@@ -0,0 +1,186 @@
+"""
+Ejecución de transacciones MongoDB con reintentos (ej3a4).
+
+ejecutar_transaccion() abre una sesión y ejecuta la función indicada dentro de
+session.with_transaction(), pasándole la sesión para que TODAS sus operaciones
+formen parte de la transacción. with_transaction ya repite la transacción
+ante TransientTransactionError y el commit ante UnknownTransactionCommitResult,
+con espera exponencial y un plazo total de 120 segundos; aquí no se añade otro
+bucle de reintentos, sólo se cuentan (una llamada al callback por intento).
+
+El nivel de lectura/escritura se elige por perfil de carga (PERFILES_CONCERN)
+o indicándolo explícitamente. Las transacciones necesitan un replica set (o un
+mongos); en un servidor standalone hay que usar operaciones sin transacción.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from pymongo import ReadPreference
+from pymongo.client_session import ClientSession
+from pymongo.errors import PyMongoError
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+
+T = TypeVar('T')
+
+# Perfiles de lectura/escritura según la carga
+PERFILES_CONCERN: Dict[str, Dict[str, Any]] = {
+    # Datos que no se pueden perder: confirmados por la mayoría y en el journal
+    'critico': {
+        'read_concern': ReadConcern('majority'),
+        'write_concern': WriteConcern('majority', j=True, wtimeout=10000),
+        'read_preference': ReadPreference.PRIMARY,
+    },
+    # Escrituras frecuentes donde prima la latencia
+    'rapido': {
+        'read_concern': ReadConcern('local'),
+        'write_concern': WriteConcern(w=1),
+        'read_preference': ReadPreference.PRIMARY,
+    },
+}
+PERFIL_POR_DEFECTO = 'critico'
+
+
+class MetricasTransacciones:
+    """
+    Acumula latencias de commit y número de reintentos de las transacciones
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.confirmadas = 0
+        self.fallidas = 0
+        self.reintentos = 0
+        self.latencia_commit_total = 0.0
+        self.latencia_commit_maxima = 0.0
+
+    def registrar_commit(self, latencia: float) -> None:
+        with self._lock:
+            self.confirmadas += 1
+            self.latencia_commit_total += latencia
+            self.latencia_commit_maxima = max(self.latencia_commit_maxima, latencia)
+
+    def registrar_reintentos(self, reintentos: int) -> None:
+        with self._lock:
+            self.reintentos += reintentos
+
+    def registrar_fallo(self) -> None:
+        with self._lock:
+            self.fallidas += 1
+
+    def como_dict(self) -> Dict[str, Any]:
+        """
+        Devuelve una copia de las métricas
+        """
+        with self._lock:
+            return {
+                'confirmadas': self.confirmadas,
+                'fallidas': self.fallidas,
+                'reintentos': self.reintentos,
+                'latencia_commit_media': (self.latencia_commit_total / self.confirmadas
+                                          if self.confirmadas else 0.0),
+                'latencia_commit_maxima': self.latencia_commit_maxima,
+            }
+
+
+# Métricas globales del proceso
+METRICAS = MetricasTransacciones()
+
+
+def admite_transacciones(cliente: Any) -> bool:
+    """
+    Indica si el servidor admite transacciones (replica set o clúster con mongos)
+    """
+    try:
+        hello = cliente.admin.command('hello')
+    except PyMongoError:
+        return False
+    return hello_admite_transacciones(hello)
+
+
+def hello_admite_transacciones(hello: Dict[str, Any]) -> bool:
+    """
+    Indica, a partir de la respuesta del comando hello, si el servidor es un
+    miembro de un replica set o un mongos
+    """
+    return 'setName' in hello or hello.get('msg') == 'isdbgrid'
+
+
+def opciones_transaccion(perfil: str = PERFIL_POR_DEFECTO, read_concern: Optional[ReadConcern] = None,
+                         write_concern: Optional[WriteConcern] = None) -> Dict[str, Any]:
+    """
+    Opciones de with_transaction: las del perfil, con read_concern y write_concern
+    sustituidos si se indican
+    """
+    opciones = dict(PERFILES_CONCERN[perfil])
+    if read_concern is not None:
+        opciones['read_concern'] = read_concern
+    if write_concern is not None:
+        opciones['write_concern'] = write_concern
+    return opciones
+
+
+class MedicionTransaccion:
+    """
+    Mide una ejecución de with_transaction para MetricasTransacciones.
+
+    with_transaction llama al callback una vez por intento, así que los reintentos
+    son las llamadas menos una; lo que pasa entre el final del último callback y
+    el retorno es el commit. La usan las versiones síncrona y asíncrona.
+    """
+
+    def __init__(self, metricas: MetricasTransacciones):
+        self.metricas = metricas
+        self.llamadas = 0
+        self.fin_funcion = 0.0
+
+    def inicio_callback(self) -> None:
+        self.llamadas += 1
+
+    def fin_callback(self) -> None:
+        self.fin_funcion = time.perf_counter()
+
+    def confirmada(self) -> None:
+        self.metricas.registrar_commit(time.perf_counter() - self.fin_funcion)
+        self.metricas.registrar_reintentos(max(self.llamadas - 1, 0))
+
+    def fallida(self) -> None:
+        self.metricas.registrar_reintentos(max(self.llamadas - 1, 0))
+        self.metricas.registrar_fallo()
+
+
+def ejecutar_transaccion(
+        cliente: Any,
+        funcion: Callable[[ClientSession], T],
+        perfil: str = PERFIL_POR_DEFECTO,
+        read_concern: Optional[ReadConcern] = None,
+        write_concern: Optional[WriteConcern] = None,
+        metricas: MetricasTransacciones = METRICAS
+) -> T:
+    """
+    Ejecuta funcion(session) en una transacción y devuelve su resultado.
+
+    La función debe pasar `session=session` a cada operación. read_concern y
+    write_concern, si se indican, sustituyen a los del perfil. Los errores no
+    reintentables (o los transitorios, agotado el plazo de with_transaction) se
+    propagan.
+    """
+    opciones = opciones_transaccion(perfil, read_concern, write_concern)
+    medicion = MedicionTransaccion(metricas)
+
+    def callback(session):
+        medicion.inicio_callback()
+        resultado = funcion(session)
+        medicion.fin_callback()
+        return resultado
+
+    try:
+        with cliente.start_session() as session:
+            resultado = session.with_transaction(callback, **opciones)
+    except PyMongoError:
+        medicion.fallida()
+        raise
+    medicion.confirmada()
+    return resultado
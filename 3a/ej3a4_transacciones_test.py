@@ -0,0 +1,155 @@
+"""
+Tests para ej3a4_transacciones.py, la ejecución de transacciones con reintentos.
+La lógica de reintentos se prueba con una sesión simulada; la prueba completa
+necesita un MongoDB en replica set (p.ej. un nodo único con --replSet).
+"""
+
+import pytest
+import pymongo
+from pymongo.errors import OperationFailure, PyMongoError
+from pymongo.write_concern import WriteConcern
+from ej3a4 import MONGODB_HOST, MONGODB_PORT, MONGODB_USERNAME, MONGODB_PASSWORD, ejemplo_transaccion
+from ej3a4_transacciones import (PERFILES_CONCERN, MetricasTransacciones, admite_transacciones,
+                                 ejecutar_transaccion)
+
+class SesionFalsa:
+    """
+    Sesión que falla con los errores indicados. Como with_transaction, repite el
+    callback ante TransientTransactionError hasta max_llamadas veces.
+    """
+    def __init__(self, errores, opciones, max_llamadas):
+        self.errores = errores
+        self.opciones = opciones
+        self.max_llamadas = max_llamadas
+        self.llamadas = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def with_transaction(self, callback, **opciones):
+        self.opciones.append(opciones)
+        while True:
+            self.llamadas += 1
+            resultado = callback(self)
+            if not self.errores:
+                return resultado
+            error = self.errores.pop(0)
+            if not error.has_error_label('TransientTransactionError') or self.llamadas >= self.max_llamadas:
+                raise error
+
+class ClienteFalso:
+    """Cliente que crea sesiones falsas y responde al comando hello"""
+    def __init__(self, errores=None, hello=None, max_llamadas=10):
+        self.errores = list(errores or [])
+        self.max_llamadas = max_llamadas
+        self.opciones = []
+        self.sesiones = 0
+        self.hello = hello or {}
+        self.admin = self
+
+    def start_session(self):
+        self.sesiones += 1
+        self.sesion = SesionFalsa(self.errores, self.opciones, self.max_llamadas)
+        return self.sesion
+
+    def command(self, nombre):
+        if isinstance(self.hello, Exception):
+            raise self.hello
+        return self.hello
+
+def error_con_etiqueta(etiqueta):
+    return PyMongoError("error simulado", error_labels=[etiqueta])
+
+def test_ejecutar_transaccion_pasa_la_sesion():
+    """Prueba que la función recibe la sesión y se devuelve su resultado"""
+    cliente = ClienteFalso()
+    metricas = MetricasTransacciones()
+
+    resultado = ejecutar_transaccion(cliente, lambda session: session, metricas=metricas)
+
+    assert isinstance(resultado, SesionFalsa)
+    assert metricas.como_dict()['confirmadas'] == 1
+    assert metricas.como_dict()['reintentos'] == 0
+
+def test_ejecutar_transaccion_cuenta_los_reintentos_de_with_transaction():
+    """Prueba que los reintentos los hace with_transaction y se cuentan una sola vez"""
+    cliente = ClienteFalso([error_con_etiqueta('TransientTransactionError'),
+                            error_con_etiqueta('TransientTransactionError')])
+    metricas = MetricasTransacciones()
+
+    resultado = ejecutar_transaccion(cliente, lambda session: 'ok', metricas=metricas)
+
+    assert resultado == 'ok'
+    assert cliente.sesiones == 1
+    assert cliente.sesion.llamadas == 3
+    datos = metricas.como_dict()
+    assert datos['reintentos'] == 2
+    assert datos['confirmadas'] == 1
+    assert datos['fallidas'] == 0
+
+def test_ejecutar_transaccion_agota_reintentos():
+    """Prueba que el error se propaga sin otra ronda de reintentos cuando with_transaction se rinde"""
+    cliente = ClienteFalso([error_con_etiqueta('TransientTransactionError') for _ in range(3)], max_llamadas=3)
+    metricas = MetricasTransacciones()
+
+    with pytest.raises(PyMongoError):
+        ejecutar_transaccion(cliente, lambda session: None, metricas=metricas)
+
+    assert cliente.sesiones == 1
+    datos = metricas.como_dict()
+    assert datos['reintentos'] == 2
+    assert datos['fallidas'] == 1
+    assert datos['confirmadas'] == 0
+
+def test_ejecutar_transaccion_no_reintenta_otros_errores():
+    """Prueba que un error sin etiqueta de reintento se propaga inmediatamente"""
+    cliente = ClienteFalso([OperationFailure("clave duplicada", code=11000)])
+    metricas = MetricasTransacciones()
+
+    with pytest.raises(OperationFailure):
+        ejecutar_transaccion(cliente, lambda session: None, metricas=metricas)
+
+    assert cliente.sesion.llamadas == 1
+    assert metricas.como_dict()['reintentos'] == 0
+
+def test_ejecutar_transaccion_concern_por_perfil():
+    """Prueba que se aplican los niveles del perfil o los indicados explícitamente"""
+    cliente = ClienteFalso()
+    metricas = MetricasTransacciones()
+
+    ejecutar_transaccion(cliente, lambda session: None, perfil='rapido', metricas=metricas)
+    assert cliente.opciones[-1] == PERFILES_CONCERN['rapido']
+
+    ejecutar_transaccion(cliente, lambda session: None, write_concern=WriteConcern(w=2), metricas=metricas)
+    assert cliente.opciones[-1]['write_concern'] == WriteConcern(w=2)
+    assert cliente.opciones[-1]['read_concern'] == PERFILES_CONCERN['critico']['read_concern']
+
+def test_admite_transacciones():
+    """Prueba la detección de replica set o mongos"""
+    assert admite_transacciones(ClienteFalso(hello={'setName': 'rs0'})) is True
+    assert admite_transacciones(ClienteFalso(hello={'msg': 'isdbgrid'})) is True
+    assert admite_transacciones(ClienteFalso(hello={'isWritablePrimary': True})) is False
+    assert admite_transacciones(ClienteFalso(hello=PyMongoError("sin servidor"))) is False
+
+def test_ejemplo_transaccion_replica_set():
+    """Prueba ejemplo_transaccion contra un replica set real; se omite si no hay uno disponible"""
+    cliente = pymongo.MongoClient(host=MONGODB_HOST, port=MONGODB_PORT, username=MONGODB_USERNAME,
+                                  password=MONGODB_PASSWORD, serverSelectionTimeoutMS=500)
+    if not admite_transacciones(cliente):
+        cliente.close()
+        pytest.skip("No hay un MongoDB en replica set disponible")
+    try:
+        db = cliente['biblioteca_transacciones_test']
+        db.create_collection('autores')
+        db.create_collection('libros')
+
+        assert ejemplo_transaccion(db) is True
+
+        autor = db.autores.find_one({'nombre': 'Pimpollo'})
+        assert db.libros.count_documents({'autor_id': autor['_id']}) == 2
+    finally:
+        cliente.drop_database('biblioteca_transacciones_test')
+        cliente.close()
@@ -0,0 +1,361 @@
+"""
+Generador de datos sintéticos para las bases de datos de los ejercicios de 3a.
+
+Genera datos realistas con el mismo esquema que test.sql (biblioteca: autores y
+libros) y que ventas_comerciales.db (regiones, vendedores, productos y ventas),
+desde miles hasta cientos de millones de filas:
+
+- Los libros se reparten entre autores con una distribución de Zipf: unos pocos
+  autores tienen muchos libros y la mayoría sólo unos pocos.
+- Las ventas se reparten en el tiempo y siguen una distribución de Zipf por
+  producto y por vendedor (pocos productos concentran la mayoría de ventas).
+
+Todo es determinista dada la semilla, y las filas se generan bajo demanda: los
+volcados a SQLite (executemany por bloques), CSV y MongoDB (ingerir de
+ej3a4_ingesta, vale mongomock) nunca tienen la tabla entera en memoria.
+
+Uso: python generador_datos.py {biblioteca,ventas} FILAS [--semilla N]
+     [--sqlite RUTA] [--csv DIRECTORIO] [--mongo | --mongomock]
+"""
+
+import bisect
+import contextlib
+import csv
+import datetime
+import itertools
+import os
+import random
+import sqlite3
+from array import array
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+SEMILLA_POR_DEFECTO = 42
+# Filas por cada executemany / bulk_write
+TAMANO_BLOQUE = 10000
+# Exponentes de las distribuciones de Zipf
+ZIPF_LIBROS_POR_AUTOR = 1.1
+ZIPF_VENTAS_POR_PRODUCTO = 1.2
+ZIPF_VENTAS_POR_VENDEDOR = 0.8
+ZIPF_CANTIDAD = 1.5
+
+# Fecha de la primera venta y días que abarcan las ventas
+VENTAS_FECHA_INICIO = datetime.date(2020, 1, 1)
+VENTAS_DIAS = 3 * 365
+
+ESQUEMA_BIBLIOTECA = """
+CREATE TABLE IF NOT EXISTS autores (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS libros (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    titulo TEXT NOT NULL,
+    anio INTEGER,
+    autor_id INTEGER,
+    FOREIGN KEY (autor_id) REFERENCES autores (id)
+);
+"""
+
+ESQUEMA_VENTAS = """
+CREATE TABLE IF NOT EXISTS regiones (
+    id INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    pais TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS vendedores (
+    id INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    apellido TEXT NOT NULL,
+    region_id INTEGER,
+    fecha_contratacion DATE,
+    FOREIGN KEY (region_id) REFERENCES regiones(id)
+);
+CREATE TABLE IF NOT EXISTS productos (
+    id INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    categoria TEXT NOT NULL,
+    precio_unitario DECIMAL(10, 2) NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ventas (
+    id INTEGER PRIMARY KEY,
+    fecha DATE NOT NULL,
+    vendedor_id INTEGER,
+    producto_id INTEGER,
+    cantidad INTEGER NOT NULL,
+    FOREIGN KEY (vendedor_id) REFERENCES vendedores(id),
+    FOREIGN KEY (producto_id) REFERENCES productos(id)
+);
+"""
+
+NOMBRES = ['María', 'Juan', 'Carlos', 'Laura', 'Ana', 'Pablo', 'Lucía', 'Miguel', 'Isabel', 'Jorge',
+           'Gabriel', 'Carmen', 'Javier', 'Elena', 'Antonio', 'Marta', 'Luis', 'Sara', 'Diego', 'Paula']
+APELLIDOS = ['López', 'García', 'Martínez', 'Rodríguez', 'Sánchez', 'Fernández', 'Díaz', 'Hernández',
+             'Allende', 'Borges', 'Márquez', 'Pérez', 'Gómez', 'Ruiz', 'Moreno', 'Romero', 'Navarro', 'Torres']
+PALABRAS_TITULO = ['soledad', 'amor', 'tiempo', 'casa', 'espíritus', 'ficciones', 'aleph', 'cólera', 'noche',
+                   'mar', 'ciudad', 'sombra', 'memoria', 'viento', 'río', 'jardín', 'sueño', 'silencio']
+ARTICULOS = ['El', 'La', 'Los', 'Las', 'Un', 'Una']
+REGIONES = ['Norte', 'Sur', 'Este', 'Oeste', 'Centro']
+PAISES = ['España', 'Portugal', 'Francia', 'Italia', 'México', 'Argentina']
+CATEGORIAS = {
+    'Electrónica': (300, 1500),
+    'Periféricos': (20, 300),
+    'Software': (30, 200),
+    'Almacenamiento': (50, 300),
+}
+PRODUCTOS = ['Laptop', 'Teléfono', 'Tablet', 'Monitor', 'Teclado', 'Ratón', 'Antivirus', 'Juego', 'Disco',
+             'Auriculares', 'Impresora', 'Cámara']
+MODELOS = ['Pro', 'Smart', 'Ultra', 'Lite', 'Max', 'Plus', 'Mini', 'Air']
+
+Tabla = Tuple[Sequence[str], Iterable[tuple]]
+
+
+class Zipf:
+    """
+    Muestreo de una distribución de Zipf sobre 1..n: P(k) proporcional a 1 / k**s
+    """
+
+    def __init__(self, n: int, s: float):
+        if n <= 0:
+            raise ValueError('n debe ser mayor que 0')
+        self.n = n
+        # Probabilidades acumuladas (array de doubles: 8 bytes por elemento)
+        self._acumulada = array('d', itertools.accumulate(1.0 / k ** s for k in range(1, n + 1)))
+
+    def muestra(self, rng: random.Random) -> int:
+        """
+        Devuelve un valor entre 1 y n
+        """
+        return bisect.bisect_left(self._acumulada, rng.random() * self._acumulada[-1]) + 1
+
+
+def _rng(semilla: int, tabla: str) -> random.Random:
+    # Un generador por tabla: cada tabla se reproduce igual aunque se generen en otro orden
+    return random.Random(f"{semilla}:{tabla}")
+
+
+def _permutacion(n: int, rng: random.Random) -> Sequence[int]:
+    # Los IDs más frecuentes no son siempre los primeros.
+    # array('l') ocupa 8 bytes por ID frente a ~36 de una lista de int (misma permutación)
+    ids = array('l', range(1, n + 1))
+    rng.shuffle(ids)
+    return ids
+
+
+def generar_autores(n: int, semilla: int = SEMILLA_POR_DEFECTO) -> Iterator[Tuple[int, str]]:
+    """
+    Genera filas (id, nombre) de autores
+    """
+    rng = _rng(semilla, 'autores')
+    for i in range(1, n + 1):
+        yield i, f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}"
+
+
+def generar_libros(n: int, n_autores: int, semilla: int = SEMILLA_POR_DEFECTO) -> Iterator[Tuple[int, str, int, int]]:
+    """
+    Genera filas (id, titulo, anio, autor_id); el número de libros por autor sigue una Zipf
+    """
+    rng = _rng(semilla, 'libros')
+    zipf = Zipf(n_autores, ZIPF_LIBROS_POR_AUTOR)
+    autores = _permutacion(n_autores, rng)
+    for i in range(1, n + 1):
+        titulo = f"{rng.choice(ARTICULOS)} {rng.choice(PALABRAS_TITULO)} de {rng.choice(PALABRAS_TITULO)}"
+        # Más libros recientes que antiguos
+        anio = 2025 - int(rng.expovariate(1 / 30)) % 500
+        yield i, titulo, anio, autores[zipf.muestra(rng) - 1]
+
+
+def generar_regiones(n: int, semilla: int = SEMILLA_POR_DEFECTO) -> Iterator[Tuple[int, str, str]]:
+    """
+    Genera filas (id, nombre, pais) de regiones; las cinco primeras son las de España
+    """
+    rng = _rng(semilla, 'regiones')
+    for i in range(1, n + 1):
+        if i <= len(REGIONES):
+            yield i, REGIONES[i - 1], 'España'
+        else:
+            yield i, f"{rng.choice(REGIONES)} {i}", rng.choice(PAISES)
+
+
+def generar_vendedores(n: int, n_regiones: int,
+                       semilla: int = SEMILLA_POR_DEFECTO) -> Iterator[Tuple[int, str, str, int, str]]:
+    """
+    Genera filas (id, nombre, apellido, region_id, fecha_contratacion)
+    """
+    rng = _rng(semilla, 'vendedores')
+    for i in range(1, n + 1):
+        contratacion = VENTAS_FECHA_INICIO - datetime.timedelta(days=rng.randrange(10 * 365))
+        yield i, rng.choice(NOMBRES), rng.choice(APELLIDOS), rng.randint(1, n_regiones), contratacion.isoformat()
+
+
+def generar_productos(n: int, semilla: int = SEMILLA_POR_DEFECTO) -> Iterator[Tuple[int, str, str, float]]:
+    """
+    Genera filas (id, nombre, categoria, precio_unitario) con precios según la categoría
+    """
+    rng = _rng(semilla, 'productos')
+    categorias = list(CATEGORIAS)
+    for i in range(1, n + 1):
+        categoria = rng.choice(categorias)
+        minimo, maximo = CATEGORIAS[categoria]
+        yield i, f"{rng.choice(PRODUCTOS)} {rng.choice(MODELOS)} {i}", categoria, round(rng.uniform(minimo, maximo), 2)
+
+
+def generar_ventas(n: int, n_vendedores: int, n_productos: int, semilla: int = SEMILLA_POR_DEFECTO,
+                   fecha_inicio: datetime.date = VENTAS_FECHA_INICIO,
+                   dias: int = VENTAS_DIAS) -> Iterator[Tuple[int, str, int, int, int]]:
+    """
+    Genera filas (id, fecha, vendedor_id, producto_id, cantidad) en orden de fecha.
+    Productos, vendedores y cantidades siguen distribuciones de Zipf.
+    """
+    rng = _rng(semilla, 'ventas')
+    zipf_productos = Zipf(n_productos, ZIPF_VENTAS_POR_PRODUCTO)
+    zipf_vendedores = Zipf(n_vendedores, ZIPF_VENTAS_POR_VENDEDOR)
+    zipf_cantidad = Zipf(10, ZIPF_CANTIDAD)
+    productos = _permutacion(n_productos, rng)
+    vendedores = _permutacion(n_vendedores, rng)
+    for i in range(1, n + 1):
+        fecha = fecha_inicio + datetime.timedelta(days=(i - 1) * dias // n)
+        yield (i, fecha.isoformat(), vendedores[zipf_vendedores.muestra(rng) - 1],
+               productos[zipf_productos.muestra(rng) - 1], zipf_cantidad.muestra(rng))
+
+
+def tablas_biblioteca(filas: int, semilla: int = SEMILLA_POR_DEFECTO) -> Dict[str, Tabla]:
+    """
+    Tablas de la biblioteca con `filas` libros (y un autor por cada 20 libros)
+    """
+    n_autores = max(1, filas // 20)
+    return {
+        'autores': (('id', 'nombre'), generar_autores(n_autores, semilla)),
+        'libros': (('id', 'titulo', 'anio', 'autor_id'), generar_libros(filas, n_autores, semilla)),
+    }
+
+
+def tablas_ventas(filas: int, semilla: int = SEMILLA_POR_DEFECTO) -> Dict[str, Tabla]:
+    """
+    Tablas de ventas con `filas` ventas; el resto de tablas crece más despacio
+    """
+    n_vendedores = max(8, filas // 1000)
+    n_regiones = max(len(REGIONES), min(100, n_vendedores // 10))
+    n_productos = max(10, int(filas ** 0.5))
+    return {
+        'regiones': (('id', 'nombre', 'pais'), generar_regiones(n_regiones, semilla)),
+        'vendedores': (('id', 'nombre', 'apellido', 'region_id', 'fecha_contratacion'),
+                       generar_vendedores(n_vendedores, n_regiones, semilla)),
+        'productos': (('id', 'nombre', 'categoria', 'precio_unitario'), generar_productos(n_productos, semilla)),
+        'ventas': (('id', 'fecha', 'vendedor_id', 'producto_id', 'cantidad'),
+                   generar_ventas(filas, n_vendedores, n_productos, semilla)),
+    }
+
+
+def _bloques(filas: Iterable[tuple], tamano_bloque: int) -> Iterator[List[tuple]]:
+    iterador = iter(filas)
+    while True:
+        bloque = list(itertools.islice(iterador, tamano_bloque))
+        if not bloque:
+            return
+        yield bloque
+
+
+def volcar_sqlite(conexion: sqlite3.Connection, tablas: Dict[str, Tabla], esquema: str,
+                  tamano_bloque: int = TAMANO_BLOQUE) -> Dict[str, int]:
+    """
+    Crea el esquema e inserta las tablas con executemany por bloques (una transacción por bloque).
+    Devuelve las filas insertadas por tabla.
+    """
+    conexion.executescript(esquema)
+    insertadas = {}
+    for nombre, (columnas, filas) in tablas.items():
+        sentencia = (f"INSERT INTO {nombre} ({', '.join(columnas)}) "
+                     f"VALUES ({', '.join('?' for _ in columnas)})")
+        insertadas[nombre] = 0
+        for bloque in _bloques(filas, tamano_bloque):
+            with conexion:
+                conexion.executemany(sentencia, bloque)
+            insertadas[nombre] += len(bloque)
+    return insertadas
+
+
+def volcar_csv(directorio: str, tablas: Dict[str, Tabla]) -> Dict[str, int]:
+    """
+    Escribe cada tabla en directorio/<tabla>.csv con cabecera. Devuelve las filas escritas por tabla.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    escritas = {}
+    for nombre, (columnas, filas) in tablas.items():
+        with open(os.path.join(directorio, f"{nombre}.csv"), 'w', newline='', encoding='utf-8') as f:
+            escritor = csv.writer(f)
+            escritor.writerow(columnas)
+            escritas[nombre] = 0
+            for fila in filas:
+                escritor.writerow(fila)
+                escritas[nombre] += 1
+    return escritas
+
+
+def volcar_mongo(db, tablas: Dict[str, Tabla], tamano_bloque: int = TAMANO_BLOQUE) -> Dict[str, int]:
+    """
+    Inserta cada tabla en una colección con ingerir() de ej3a4_ingesta; el id pasa a ser el _id.
+    Devuelve los documentos insertados por colección.
+
+    Si algún documento no se inserta (p.ej. un _id repetido) se lanza ErrorIngesta
+    al terminar esa colección, con sus errores; las siguientes no se vuelcan.
+    """
+    from ej3a4_ingesta import ingerir
+
+    insertados = {}
+    for nombre, (columnas, filas) in tablas.items():
+        campos = ['_id'] + list(columnas[1:])
+        documentos = (dict(zip(campos, fila)) for fila in filas)
+        insertados[nombre] = ingerir(db[nombre], documentos, tamano_lote=tamano_bloque).comprobar().insertados
+    return insertados
+
+
+def _volcar_sqlite_en(ruta: str, tablas: Dict[str, Tabla], esquema: str) -> Dict[str, int]:
+    # Abre la base de datos de destino sólo mientras dura el volcado
+    with contextlib.closing(sqlite3.connect(ruta)) as conexion:
+        return volcar_sqlite(conexion, tablas, esquema)
+
+
+def _main(argumentos: Sequence[str] = None) -> None:
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Genera datos sintéticos de biblioteca o ventas')
+    parser.add_argument('esquema', choices=['biblioteca', 'ventas'])
+    parser.add_argument('filas', type=int, help='libros o ventas a generar (p.ej. 1000 o 100000000)')
+    parser.add_argument('--semilla', type=int, default=SEMILLA_POR_DEFECTO)
+    parser.add_argument('--sqlite', help='ruta de la base de datos SQLite de destino')
+    parser.add_argument('--csv', help='directorio de destino de los CSV')
+    parser.add_argument('--mongo', action='store_true', help='volcar al MongoDB de ej3a4')
+    parser.add_argument('--mongomock', action='store_true', help='volcar a un mongomock en memoria')
+    args = parser.parse_args(argumentos)
+
+    generar = tablas_biblioteca if args.esquema == 'biblioteca' else tablas_ventas
+    esquema = ESQUEMA_BIBLIOTECA if args.esquema == 'biblioteca' else ESQUEMA_VENTAS
+    # Cada destino recibe su propio generador (misma semilla, mismos datos)
+    destinos = []
+    if args.sqlite:
+        destinos.append((f"SQLite {args.sqlite}",
+                         lambda tablas: _volcar_sqlite_en(args.sqlite, tablas, esquema)))
+    if args.csv:
+        destinos.append((f"CSV {args.csv}", lambda tablas: volcar_csv(args.csv, tablas)))
+    if args.mongo or args.mongomock:
+        if args.mongo:
+            from ej3a4 import crear_conexion
+            db = crear_conexion().client[f"{args.esquema}_generada"]
+        else:
+            import mongomock
+            db = mongomock.MongoClient()[f"{args.esquema}_generada"]
+        destinos.append((f"MongoDB {db.name}", lambda tablas: volcar_mongo(db, tablas)))
+    if not destinos:
+        parser.error('indica al menos un destino: --sqlite, --csv, --mongo o --mongomock')
+
+    for descripcion, volcar in destinos:
+        inicio = time.perf_counter()
+        filas = volcar(generar(args.filas, args.semilla))
+        segundos = time.perf_counter() - inicio
+        total = sum(filas.values())
+        print(f"{descripcion}: {filas} ({total / segundos:.0f} filas/s, {segundos:.2f} s)")
+
+
+if __name__ == "__main__":
+    _main()
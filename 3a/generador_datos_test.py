@@ -0,0 +1,130 @@
+"""
+Tests para generador_datos.py, el generador de datos sintéticos
+"""
+
+import collections
+import csv
+import random
+import sqlite3
+import pytest
+from ej3a2 import obtener_libros
+from generador_datos import (ESQUEMA_BIBLIOTECA, ESQUEMA_VENTAS, Zipf, generar_libros, generar_ventas,
+                             tablas_biblioteca, tablas_ventas, volcar_csv, volcar_mongo, volcar_sqlite, _main)
+
+def test_generacion_determinista():
+    """Prueba que la misma semilla produce los mismos datos y otra semilla no"""
+    primera = list(tablas_biblioteca(200, semilla=1)['libros'][1])
+    segunda = list(tablas_biblioteca(200, semilla=1)['libros'][1])
+    otra = list(tablas_biblioteca(200, semilla=2)['libros'][1])
+
+    assert primera == segunda
+    assert primera != otra
+    assert len(primera) == 200
+
+def test_zipf():
+    """Prueba que la Zipf favorece los primeros valores y no se sale de rango"""
+    rng = random.Random(0)
+    zipf = Zipf(100, 1.2)
+    muestras = collections.Counter(zipf.muestra(rng) for _ in range(10000))
+
+    assert min(muestras) >= 1 and max(muestras) <= 100
+    assert muestras[1] > muestras[2] > muestras[10]
+    with pytest.raises(ValueError):
+        Zipf(0, 1.0)
+
+def test_libros_por_autor_sesgados():
+    """Prueba que pocos autores acumulan muchos libros"""
+    libros_por_autor = collections.Counter(autor_id for _, _, _, autor_id in generar_libros(20000, 1000))
+    cantidades = sorted(libros_por_autor.values(), reverse=True)
+
+    assert cantidades[0] > 20 * cantidades[len(cantidades) // 2]
+    assert set(libros_por_autor) <= set(range(1, 1001))
+
+def test_ventas_ordenadas_por_fecha():
+    """Prueba que las ventas avanzan en el tiempo y las claves son válidas"""
+    ventas = list(generar_ventas(1000, 8, 10))
+    fechas = [fecha for _, fecha, _, _, _ in ventas]
+
+    assert fechas == sorted(fechas)
+    assert all(1 <= vendedor <= 8 and 1 <= producto <= 10 and 1 <= cantidad <= 10
+               for _, _, vendedor, producto, cantidad in ventas)
+
+def test_volcar_sqlite_biblioteca():
+    """Prueba el volcado por bloques y que el resultado es compatible con ej3a2"""
+    conexion = sqlite3.connect(':memory:')
+
+    insertadas = volcar_sqlite(conexion, tablas_biblioteca(1000), ESQUEMA_BIBLIOTECA, tamano_bloque=64)
+
+    assert insertadas == {'autores': 50, 'libros': 1000}
+    assert len(obtener_libros(conexion)) == 1000
+
+def test_volcar_sqlite_ventas():
+    """Prueba que las ventas generadas respetan las claves foráneas"""
+    conexion = sqlite3.connect(':memory:')
+
+    insertadas = volcar_sqlite(conexion, tablas_ventas(2000), ESQUEMA_VENTAS)
+
+    assert insertadas['ventas'] == 2000
+    huerfanas = conexion.execute('SELECT COUNT(*) FROM ventas v LEFT JOIN productos p ON v.producto_id = p.id '
+                                 'LEFT JOIN vendedores s ON v.vendedor_id = s.id '
+                                 'WHERE p.id IS NULL OR s.id IS NULL').fetchone()[0]
+    assert huerfanas == 0
+
+def test_volcar_csv(tmp_path):
+    """Prueba que se escribe un CSV por tabla con cabecera"""
+    escritas = volcar_csv(str(tmp_path), tablas_ventas(100))
+
+    with open(tmp_path / "ventas.csv", encoding='utf-8') as f:
+        filas = list(csv.reader(f))
+    assert filas[0] == ['id', 'fecha', 'vendedor_id', 'producto_id', 'cantidad']
+    assert len(filas) == escritas['ventas'] + 1 == 101
+
+def test_volcar_mongo():
+    """Prueba el volcado a mongomock usando el id como _id"""
+    mongomock = pytest.importorskip("mongomock")
+    db = mongomock.MongoClient().biblioteca
+
+    insertados = volcar_mongo(db, tablas_biblioteca(100), tamano_bloque=30)
+
+    assert insertados == {'autores': 5, 'libros': 100}
+    assert set(db.libros.find_one({'_id': 1})) == {'_id', 'titulo', 'anio', 'autor_id'}
+
+def test_volcar_mongo_con_errores():
+    """Prueba que un volcado con _id repetidos lanza ErrorIngesta en lugar de seguir en silencio"""
+    mongomock = pytest.importorskip("mongomock")
+    from ej3a4_ingesta import ErrorIngesta
+    db = mongomock.MongoClient().biblioteca
+    db.autores.insert_one({'_id': 2, 'nombre': 'Ya existe'})
+
+    with pytest.raises(ErrorIngesta) as error:
+        volcar_mongo(db, tablas_biblioteca(100), tamano_bloque=30)
+
+    assert error.value.details['nInserted'] == 4
+    assert [fallo['index'] for fallo in error.value.details['writeErrors']] == [1]
+    assert db.libros.count_documents({}) == 0
+
+def test_main_varios_destinos(tmp_path, capsys):
+    """Prueba la línea de órdenes con SQLite y CSV a la vez"""
+    ruta = str(tmp_path / "ventas.db")
+
+    _main(['ventas', '500', '--sqlite', ruta, '--csv', str(tmp_path / "csv")])
+
+    conexion = sqlite3.connect(ruta)
+    assert conexion.execute('SELECT COUNT(*) FROM ventas').fetchone()[0] == 500
+    conexion.close()
+    assert (tmp_path / "csv" / "ventas.csv").exists()
+    assert "filas/s" in capsys.readouterr().out
+
+def test_main_cierra_la_conexion_sqlite(tmp_path, monkeypatch):
+    """Prueba que la línea de órdenes cierra la base de datos SQLite al terminar el volcado"""
+    conexiones = []
+    conectar = sqlite3.connect
+    def conectar_y_apuntar(ruta):
+        conexiones.append(conectar(ruta))
+        return conexiones[-1]
+    monkeypatch.setattr(sqlite3, 'connect', conectar_y_apuntar)
+
+    _main(['biblioteca', '100', '--sqlite', str(tmp_path / "biblioteca.db")])
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        conexiones[0].execute('SELECT 1')
@@ -13,12 +13,58 @@ Implementa un sistema simple de gestión de biblioteca utilizando SQLAlchemy par
 Este ejercicio se enfoca en SQLAlchemy Core y ORM sin depender de Flask u otro framework web.
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, Table, inspect
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship, joinedload
+import contextlib
+import os
 
-# Crea el motor de base de datos (usamos SQLite en memoria para simplificar)
-engine = create_engine('sqlite:///:memory:', echo=True)
+from sqlalchemy import create_engine, event, Column, Integer, String, ForeignKey, Table, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.orm import (Session, sessionmaker, scoped_session, relationship, joinedload, contains_eager, raiseload)
+from sqlalchemy.pool import NullPool, QueuePool, SingletonThreadPool, StaticPool
+
+# Configuración del motor. Cada valor se puede sobrescribir con la variable de entorno EJ3B1_<NOMBRE>
+# (p.ej. EJ3B1_DATABASE_URL=sqlite:///biblioteca.db EJ3B1_ECHO=debug)
+DATABASE_URL = 'sqlite:///:memory:'
+# False, True (sentencias) o 'debug' (sentencias y filas)
+ECHO = False
+# Clase de pool: 'queue', 'static', 'null', 'singleton' o None (la que elija SQLAlchemy)
+POOL = None
+POOL_SIZE = 5
+MAX_OVERFLOW = 10
+# PRAGMAs que se aplican a cada conexión SQLite nueva
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'foreign_keys': 'ON',
+}
+
+POOL_CLASSES = {
+    'queue': QueuePool,
+    'static': StaticPool,
+    'null': NullPool,
+    'singleton': SingletonThreadPool,
+}
+
+# Sesiones de session_factory/session_scope (variable de entorno EJ3B1_EXPIRE_ON_COMMIT).
+# Con False los objetos siguen legibles tras el commit sin volver a consultarlos: útil en
+# servicios que devuelven lo leído fuera de la unidad de trabajo.
+EXPIRE_ON_COMMIT = True
+
+# Clave de session.info con la profundidad de session_scope anidados
+_SCOPE_DEPTH_KEY = 'session_scope_depth'
+
+# Motor por defecto: se crea en la primera llamada a get_engine(), no al importar el módulo
+_engine = None
+
+# Libros por commit en create_books
+CREATE_BOOKS_BATCH_SIZE = 1000
+# Nombres por cada consulta IN al buscar autores existentes
+AUTHOR_LOOKUP_CHUNK = 500
+# Filas por cada lectura parcial en iter_books
+ITER_BATCH_SIZE = 1000
+# IDs por cada UPDATE/DELETE ... WHERE id IN (...) de bulk_update_books y bulk_delete_books
+BULK_ID_CHUNK = 500
 
 # Crea la clase Base para los modelos declarativos
 Base = declarative_base()
@@ -39,7 +85,8 @@ class Author(Base):
     __tablename__ = 'authors'
 
     id = Column(Integer, autoincrement= True, primary_key = True)
-    name = Column(String, nullable = False)
+    # Indexado: create_book y create_books buscan autores por nombre
+    name = Column(String, nullable = False, index = True)
     # usamos mapped con la tabla y el relation
     book = relationship('Book', uselist = True, back_populates= 'author')
     
@@ -69,8 +116,161 @@ class Book(Base):
 
 
 
+def _parse_echo(value):
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value == 'debug':
+            return 'debug'
+        return value in ('1', 'true', 'yes', 'on')
+    return value
+
+
+def _parse_bool(value):
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in ('1', 'true', 'yes', 'on'):
+            return True
+        if value in ('0', 'false', 'no', 'off'):
+            return False
+        raise ValueError(f"Valor booleano no válido: {value!r}")
+    return bool(value)
+
+
+def engine_config(**overrides):
+    """
+    Configuración del motor: valores del módulo, sustituidos por las variables de
+    entorno EJ3B1_* y por último por los argumentos indicados
+    """
+    config = {
+        'url': os.environ.get('EJ3B1_DATABASE_URL', DATABASE_URL),
+        'echo': _parse_echo(os.environ.get('EJ3B1_ECHO', ECHO)),
+        'pool': os.environ.get('EJ3B1_POOL', POOL) or None,
+        'pool_size': int(os.environ.get('EJ3B1_POOL_SIZE', POOL_SIZE)),
+        'max_overflow': int(os.environ.get('EJ3B1_MAX_OVERFLOW', MAX_OVERFLOW)),
+        'pragmas': dict(SQLITE_PRAGMAS),
+    }
+    config.update({clave: valor for clave, valor in overrides.items() if valor is not None})
+    return config
+
+
+def _apply_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return on_connect
+
+
+def build_engine(url=None, echo=None, pool=None, pool_size=None, max_overflow=None, pragmas=None, **kwargs):
+    """
+    Crea un motor a partir de engine_config(); no abre ninguna conexión.
+
+    Con SQLite se aplican los PRAGMAs en cada conexión nueva (evento 'connect').
+    Una base de datos SQLite en memoria usa StaticPool salvo que se indique otro pool:
+    todas las sesiones y hilos comparten la misma conexión y, por tanto, los mismos datos.
+    El resto de argumentos se pasan a create_engine.
+    """
+    config = engine_config(url=url, echo=echo, pool=pool, pool_size=pool_size,
+                           max_overflow=max_overflow, pragmas=pragmas)
+    url = make_url(config['url'])
+    options = dict(kwargs)
+    options['echo'] = config['echo']
+
+    pool_name = config['pool']
+    is_sqlite = url.get_backend_name() == 'sqlite'
+    in_memory = is_sqlite and url.database in (None, '', ':memory:')
+    if pool_name is None and in_memory:
+        pool_name = 'static'
+    if pool_name is not None:
+        options['poolclass'] = POOL_CLASSES[pool_name]
+    # Sin poolclass explícito SQLAlchemy usa QueuePool (salvo SQLite en memoria, resuelto arriba)
+    if options.get('poolclass', QueuePool) is QueuePool:
+        options.setdefault('pool_size', config['pool_size'])
+        options.setdefault('max_overflow', config['max_overflow'])
+    if in_memory:
+        # Sin esto sqlite3 no deja usar la conexión compartida desde otro hilo
+        options.setdefault('connect_args', {}).setdefault('check_same_thread', False)
+
+    engine = create_engine(url, **options)
+    if is_sqlite and config['pragmas']:
+        event.listen(engine, 'connect', _apply_pragmas(config['pragmas']))
+    return engine
+
+
+def get_engine():
+    """Devuelve el motor por defecto del módulo, creándolo la primera vez"""
+    global _engine
+    if _engine is None:
+        _engine = build_engine()
+    return _engine
+
+
+def session_factory(engine=None, scoped=False, expire_on_commit=None, **kwargs):
+    """
+    sessionmaker ligado a engine (por defecto get_engine()). Con scoped=True devuelve
+    un scoped_session: cada hilo obtiene su propia sesión, para trabajadores concurrentes.
+    expire_on_commit toma por defecto EJ3B1_EXPIRE_ON_COMMIT o EXPIRE_ON_COMMIT.
+    """
+    if expire_on_commit is None:
+        expire_on_commit = _parse_bool(os.environ.get('EJ3B1_EXPIRE_ON_COMMIT', EXPIRE_ON_COMMIT))
+    factory = sessionmaker(bind=engine if engine is not None else get_engine(),
+                           expire_on_commit=expire_on_commit, **kwargs)
+    return scoped_session(factory) if scoped else factory
+
+
+@contextlib.contextmanager
+def session_scope(factory=None):
+    """
+    Unidad de trabajo: abre una sesión, hace commit si el bloque termina bien y
+    rollback si lanza una excepción, y al salir la cierra, con lo que los objetos
+    quedan fuera de ella (expunge) y no se acumulan en el identity map ni en una
+    transacción larga. Los objetos devueltos sólo se pueden leer después si la
+    sesión no los caduca en el commit (expire_on_commit=False).
+
+    factory es un sessionmaker o un scoped_session (por defecto session_factory()).
+    Con un scoped_session se usa la sesión del hilo y se libera con remove(); si el
+    hilo ya está dentro de otro session_scope, el bloque se une a él y el commit lo
+    hace el exterior. Una sesión del hilo abierta fuera de session_scope no cuenta
+    como unidad de trabajo exterior: el bloque la confirma y la libera.
+    """
+    if factory is None:
+        factory = session_factory()
+    scoped = isinstance(factory, scoped_session)
+    session = factory()
+    # Profundidad de session_scope anidados sobre esta sesión
+    depth = session.info.get(_SCOPE_DEPTH_KEY, 0)
+    if depth:
+        session.info[_SCOPE_DEPTH_KEY] = depth + 1
+        try:
+            yield session
+        finally:
+            session.info[_SCOPE_DEPTH_KEY] = depth
+        return
+    session.info[_SCOPE_DEPTH_KEY] = 1
+    try:
+        yield session
+        session.commit()
+    except BaseException:
+        session.rollback()
+        raise
+    finally:
+        session.info.pop(_SCOPE_DEPTH_KEY, None)
+        if scoped:
+            factory.remove()
+        else:
+            session.close()
+
+
+def __getattr__(name):
+    # Compatibilidad con el antiguo `ej3b1.engine`, ahora creado bajo demanda
+    if name == 'engine':
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # Función para configurar la base de datos
-def setup_database():
+def setup_database(engine=None):
     """Configura la base de datos y crea las tablas"""
     # Implementa la creación de tablas en la base de datos usando Base.metadata.create_all()
     # pass
@@ -79,7 +279,7 @@ def setup_database():
     #author = Table('authors', metadata_obj, 
     #    Column('id', Integer, autoincrement= True, primary_key= True)
     #    )
-    Base.metadata.create_all(engine)
+    Base.metadata.create_all(engine if engine is not None else get_engine())
 
 # Función para crear datos de ejemplo
 def create_sample_data(session):
@@ -87,21 +287,13 @@ def create_sample_data(session):
     # Crea al menos dos autores
     # Crea al menos tres libros asociados a los autores
     # Añade todos los objetos a la sesión y haz commit
-    autor1 = Author( name = 'Gabriel Reus')
-    autor2 = Author( name = 'Gregorio Reus')
-
-    session.add(autor1)
-    session.add(autor2)
-
-    libro1 = Book(title = 'El Quijote', year = 1982, author = autor1)
-    libro2 = Book(title = 'La celestina', year = 1983, author = autor1)
-    libro3 = Book(title = 'La colmena', year = 1980,  author = autor2)
-
-
-    session.add(libro1)
-    session.add(libro2)
-    session.add(libro3)
-    
+    # Inserción masiva (sin objetos ORM), igual que ej3b1_ingesta.insert_books
+    author_ids = get_or_create_authors(session, ['Gabriel Reus', 'Gregorio Reus'])
+    session.execute(insert(Book), [
+        {'title': 'El Quijote', 'year': 1982, 'author_id': author_ids['Gabriel Reus']},
+        {'title': 'La celestina', 'year': 1983, 'author_id': author_ids['Gabriel Reus']},
+        {'title': 'La colmena', 'year': 1980, 'author_id': author_ids['Gregorio Reus']},
+    ])
     session.commit()
 
 # Funciones para operaciones CRUD
@@ -116,36 +308,204 @@ def create_book(session, title, author_name, year=None):
     # Añade y haz commit a la sesión
     # Retorna el libro creado
     #pass
-    author = session.query(Author).filter(Author.name == author_name).first()
-    if author is None:
-        # Creo el autor 
-        author = Author(name = author_name)
-    book = Book( title = title, year = year, author = author)
-    session.add(author)
+    author_ids = author_id_cache(session)
+    if author_name in author_ids:
+        # Camino rápido: autor ya visto en esta sesión, sin consultar la tabla
+        book = Book(title = title, year = year, author_id = author_ids[author_name])
+    else:
+        author = session.scalars(AUTHOR_BY_NAME, {'author_name': author_name}).first()
+        if author is None:
+            # Creo el autor 
+            author = Author(name = author_name)
+            session.add(author)
+            session.flush()
+        author_ids[author_name] = author.id
+        book = Book( title = title, year = year, author = author)
     session.add(book)
     session.commit()
     return book
+
+
+def author_id_cache(session):
+    """
+    Caché nombre -> id de autor asociada a la sesión (session.info).
+    Se guardan IDs y no objetos porque tras cada commit los objetos caducan y
+    leerlos costaría un SELECT. Se vacía en los rollback y pierde los autores
+    borrados o renombrados a través de la sesión.
+
+    Sólo las Session tienen caché: Connection.info pertenece a la conexión DBAPI
+    del pool, que sobrevive a los rollback y pasa de un checkout a otro, así que
+    con una Connection se devuelve un diccionario nuevo en cada llamada.
+    """
+    if not isinstance(session, Session):
+        return {}
+    return session.info.setdefault('author_ids', {})
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_author_id_cache(session, flush_context):
+    author_ids = session.info.get('author_ids')
+    if not author_ids:
+        return
+    for obj in list(session.deleted) + list(session.dirty):
+        if isinstance(obj, Author) and (obj in session.deleted or inspect(obj).attrs.name.history.has_changes()):
+            for name in [name for name, author_id in author_ids.items() if author_id == obj.id]:
+                del author_ids[name]
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _clear_author_id_cache(session, previous_transaction):
+    # Los autores creados en la transacción anulada ya no existen
+    session.info.pop('author_ids', None)
+
+
+def get_or_create_authors(session, names, author_ids=None):
+    """
+    Devuelve {nombre: id} para todos los nombres, creando de una vez los autores que faltan.
+    Los existentes se buscan con consultas IN por bloques; no hace commit.
+    author_ids es la caché que se consulta y completa (por defecto author_id_cache(session)).
+    """
+    if author_ids is None:
+        author_ids = author_id_cache(session)
+    missing = list(dict.fromkeys(name for name in names if name not in author_ids))
+    for start in range(0, len(missing), AUTHOR_LOOKUP_CHUNK):
+        chunk = missing[start:start + AUTHOR_LOOKUP_CHUNK]
+        # Con autores homónimos gana el de menor id (el último en actualizar el diccionario)
+        rows = session.execute(select(Author.name, Author.id).where(Author.name.in_(chunk)).order_by(Author.id.desc()))
+        author_ids.update(rows.all())
+    new_names = [name for name in missing if name not in author_ids]
+    if new_names:
+        # INSERT ... VALUES (...), (...) RETURNING: el flush de objetos haría un INSERT por autor
+        # en SQLite. Al devolver también el nombre, no importa el orden de las filas.
+        rows = session.execute(insert(Author).returning(Author.name, Author.id),
+                               [{'name': name} for name in new_names])
+        author_ids.update(rows.all())
+    return author_ids
+
+
+def create_books(session, books, batch_size=CREATE_BOOKS_BATCH_SIZE):
+    """
+    Crea muchos libros a partir de tuplas (titulo, nombre_autor, anio).
+    Los autores se resuelven con get_or_create_authors y se hace un commit cada
+    batch_size libros. Devuelve el número de libros creados.
+    """
+    created = 0
+    books = iter(books)
+    while True:
+        batch = [book for _, book in zip(range(batch_size), books)]
+        if not batch:
+            return created
+        author_ids = get_or_create_authors(session, (author_name for _, author_name, _ in batch))
+        session.add_all([Book(title=title, year=year, author_id=author_ids[author_name])
+                         for title, author_name, year in batch])
+        session.commit()
+        created += len(batch)
     
 
-def get_all_books(session):
+# Perfiles de carga de libros. Cada uno recibe select(Book) y devuelve la sentencia final.
+#   joined: un JOIN con el autor mediante joinedload (comportamiento original)
+#   list:   listados; un único JOIN que también sirve para filtrar (contains_eager) y raiseload
+#           para que un acceso no previsto no dispare N+1 (book.author.book lanza InvalidRequestError)
+#   detail: ficha de un libro; el autor en el mismo JOIN y sus otros libros con un SELECT ... IN
+#   export: filas planas (id, title, year, author_name), sin objetos ORM
+LOAD_PROFILES = {
+    'joined': lambda statement: statement.options(joinedload(Book.author)),
+    'list': lambda statement: statement.outerjoin(Book.author).options(
+        contains_eager(Book.author).options(raiseload(Author.book))),
+    'detail': lambda statement: statement.options(joinedload(Book.author).selectinload(Author.book)),
+    'export': lambda statement: statement.outerjoin(Book.author).with_only_columns(
+        Book.id, Book.title, Book.year, Author.name.label('author_name')),
+}
+# Perfiles cuya consulta ya incluye el JOIN con authors
+PROFILES_JOINING_AUTHOR = {'list', 'export'}
+
+
+def books_statement(profile):
+    """select() de libros con el perfil de carga indicado (ver LOAD_PROFILES)"""
+    return LOAD_PROFILES[profile](select(Book))
+
+
+# Sentencias de las consultas frecuentes, construidas una sola vez al importar el módulo.
+# Los valores van como bindparam, así que cada llamada sólo ejecuta la misma sentencia con
+# otros parámetros: no se rehace la cadena session.query(...) y la forma compilada sale de
+# la caché de compilación del motor (ver ej3b1_benchmarks.profile_queries).
+ALL_BOOKS = {profile: books_statement(profile) for profile in LOAD_PROFILES}
+# Con los perfiles que ya unen authors se filtra sobre ese mismo JOIN (antes se unía dos veces)
+BOOK_BY_ID = {profile: statement.where(Book.id == bindparam('book_id'))
+              for profile, statement in ALL_BOOKS.items()}
+BOOKS_BY_AUTHOR = {profile: (statement if profile in PROFILES_JOINING_AUTHOR else statement.join(Book.author))
+                   .where(Author.name == bindparam('author_name'))
+                   for profile, statement in ALL_BOOKS.items()}
+AUTHOR_BY_NAME = select(Author).where(Author.name == bindparam('author_name')).limit(1)
+
+
+def _execute_books(session, statement, profile, params=None):
+    # Objetos Book con los perfiles ORM; filas con 'export'
+    result = session.execute(statement, params)
+    return result if profile == 'export' else result.scalars()
+
+
+def get_all_books(session, profile='joined'):
     """Obtiene todos los libros con sus autores"""
-    # Consulta todos los libros y carga también los autores (joinedload)
+    # Consulta todos los libros y carga también los autores (según el perfil de carga)
     # Retorna la lista de libros
     #pass
-    results = session.query(Book).options(joinedload(Book.author)).all()
+    results = _execute_books(session, ALL_BOOKS[profile], profile).all()
     return results
 
 
-def get_book_by_id(session, book_id):
-    """Obtiene un libro específico por su ID"""
+def iter_book_batches(session, batch_size=ITER_BATCH_SIZE, profile='list', expunge=True):
+    """
+    Recorre todos los libros por lotes de batch_size (yield_per + stream_results).
+
+    Con perfiles ORM cada lote es una lista de Book; al pedir el siguiente lote se
+    sacan de la sesión (expunge) los libros y autores del anterior, así que la
+    memoria no crece con la tabla aunque se modifiquen o se guarden referencias.
+    Los objetos ya entregados siguen siendo legibles, pero quedan desvinculados de
+    la sesión. Si sólo se leen, expunge=False es más rápido: el identity map guarda
+    referencias débiles y los libros no usados se liberan igualmente.
+    Con el perfil 'export' cada lote es una lista de filas (id, title, year, author_name).
+    """
+    statement = ALL_BOOKS[profile].order_by(Book.id)
+    result = session.execute(statement, execution_options={'yield_per': batch_size, 'stream_results': True})
+    if profile == 'export':
+        yield from result.partitions()
+        return
+    for batch in result.scalars().partitions():
+        yield batch
+        if not expunge:
+            continue
+        authors = {book.__dict__.get('author') for book in batch} - {None}
+        for obj in list(batch) + list(authors):
+            if obj in session:
+                session.expunge(obj)
+
+
+def iter_books(session, batch_size=ITER_BATCH_SIZE, profile='list', rows=False, expunge=True):
+    """
+    Iterador sobre todos los libros sin cargarlos a la vez (ver iter_book_batches).
+    Con rows=True devuelve filas ligeras (id, title, year, author_name) en lugar de objetos Book.
+    """
+    for batch in iter_book_batches(session, batch_size, 'export' if rows else profile, expunge):
+        yield from batch
+
+
+def get_book_by_id(session, book_id, profile='joined'):
+    """
+    Obtiene un libro específico por su ID.
+    Por defecto carga sólo su autor; 'detail' (también los otros libros del autor) es para la ficha.
+    """
     # Busca un libro por su ID y retórnalo
     # Si no existe, retorna None
     #pass
-    return session.query(Book).options(joinedload(Book.author)).filter(Book.id == book_id).first()
+    return _execute_books(session, BOOK_BY_ID[profile], profile, {'book_id': book_id}).first()
 
 
-def update_book(session, book_id, new_title=None, new_year=None):
-    """Actualiza la información de un libro existente"""
+def update_book(session, book_id, new_title=None, new_year=None, profile=None):
+    """
+    Actualiza la información de un libro existente.
+    Sin profile el libro se obtiene con session.get (sin cargar relaciones, y sin SQL si ya está en la sesión).
+    """
     # Busca el libro por ID
     # Si existe, actualiza los campos que tienen nuevos valores
     # Haz commit a la sesión
@@ -154,7 +514,7 @@ def update_book(session, book_id, new_title=None, new_year=None):
     """ 
         Obtenemos el objeto, lo modificamos y hacemos un flush de la sesion para que actualice.
     """
-    book =  session.query(Book).options(joinedload(Book.author)).filter(Book.id == book_id).first()
+    book = session.get(Book, book_id) if profile is None else get_book_by_id(session, book_id, profile)
     if book  is not None:
         if new_title is not None:
             book.title = new_title
@@ -175,14 +535,62 @@ def delete_book(session, book_id):
         session.delete(book)
 
 
-def find_books_by_author(session, author_name):
+def _bulk_criteria(ids, where):
+    # Un bloque de condiciones por sentencia: uno por cada trozo de IDs, o uno solo con where
+    if ids is None and where is None:
+        raise ValueError("indica ids o where (usa where=true() para afectar a todos los libros)")
+    where = [] if where is None else list(where) if isinstance(where, (list, tuple)) else [where]
+    if ids is None:
+        yield where
+        return
+    ids = list(ids)
+    for start in range(0, len(ids), BULK_ID_CHUNK):
+        yield [Book.id.in_(ids[start:start + BULK_ID_CHUNK])] + where
+
+
+def bulk_update_books(session, values, ids=None, where=None, synchronize_session='auto'):
+    """
+    Actualiza de una vez los libros indicados con UPDATE books SET ... WHERE ...,
+    sin cargarlos. Devuelve el número de filas afectadas; no hace commit.
+
+    ids es una lista de IDs (se envía en bloques de BULK_ID_CHUNK) y where una
+    condición o lista de condiciones (p.ej. Book.year < 1950); si se dan ambos,
+    se deben cumplir los dos. synchronize_session decide cómo se actualizan los
+    objetos ya cargados en la sesión: 'auto', 'evaluate' (en Python), 'fetch'
+    (con RETURNING o un SELECT previo) o False (no se tocan).
+    """
+    if not values:
+        return 0
+    affected = 0
+    for criteria in _bulk_criteria(ids, where):
+        result = session.execute(update(Book).where(*criteria).values(values),
+                                 execution_options={'synchronize_session': synchronize_session})
+        affected += result.rowcount
+    return affected
+
+
+def bulk_delete_books(session, ids=None, where=None, synchronize_session='auto'):
+    """
+    Borra de una vez los libros indicados con DELETE FROM books WHERE ..., sin
+    cargarlos. Devuelve el número de filas borradas; no hace commit.
+    Los parámetros son los de bulk_update_books.
+    """
+    affected = 0
+    for criteria in _bulk_criteria(ids, where):
+        result = session.execute(delete(Book).where(*criteria),
+                                 execution_options={'synchronize_session': synchronize_session})
+        affected += result.rowcount
+    return affected
+
+
+def find_books_by_author(session, author_name, profile='joined'):
     """Busca libros por el nombre del autor"""
     # Consulta los libros uniendo (join) con la tabla de autores
     # Filtra por el nombre del autor
     # Retorna la lista de libros
     #pass
     #results = session.query(Book).options(joinedload(Book.author)).filter(Book.author.name == author_name)
-    results = session.query(Book).options(joinedload(Book.author)).join(Author, Book.author_id == Author.id).filter(Author.name == author_name).all()
+    results = _execute_books(session, BOOKS_BY_AUTHOR[profile], profile, {'author_name': author_name}).all()
     #for result in results:
     #    print(f"GGGGGGGGGGG {result}")
     return results
@@ -191,37 +599,44 @@ def find_books_by_author(session, author_name):
 # Función principal para demostrar el uso de SQLAlchemy
 def main():
     """Función principal que demuestra el uso de SQLAlchemy"""
-    # Crea un motor y una sesión
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    
+    # Crea un motor y la fábrica de sesiones
+    engine = get_engine()
+    Session = session_factory(engine)
+
     # Configura la base de datos
-    setup_database()
-    
-    try:
+    setup_database(engine)
+
+    # Cada paso es una unidad de trabajo: se confirma (o se deshace si falla) y se cierra,
+    # en lugar de acumular todos los cambios en una única sesión y transacción
+    with session_scope(Session) as session:
         # Crea datos de ejemplo
         create_sample_data(session)
-        
-        # Demuestra las operaciones CRUD
+
+    # Demuestra las operaciones CRUD
+    with session_scope(Session) as session:
         print("\n--- Todos los libros ---")
         books = get_all_books(session)
         for book in books:
             print(f"Libro: {book.title}, Año: {book.year}, Autor: {book.author.name}")
 
+    with session_scope(Session) as session:
         print("\n--- Crear un nuevo libro ---")
         new_book = create_book(session, "Nuevo libro de ejemplo", "Autor de Prueba", 2025)
         print(f"Libro creado: {new_book.title} por {new_book.author.name}")
-        
+
+    with session_scope(Session) as session:
         print("\n--- Buscar libro por ID ---")
         book = get_book_by_id(session, 1)
         if book:
             print(f"Libro encontrado: {book.title} por {book.author.name}")
-       
+
+    with session_scope(Session) as session:
         print("\n--- Actualizar libro ---")
         updated_book = update_book(session, 1, new_title="Título Actualizado", new_year=2026)
         if updated_book:
             print(f"Libro actualizado: {updated_book.title}, Año: {updated_book.year}")
-        
+
+    with session_scope(Session) as session:
         print("\n--- Buscar libros por autor ---")
         author_books = find_books_by_author(session, "Autor de Prueba")
         for book in author_books:
@@ -231,17 +646,15 @@ def main():
         for book in author_books:
             print(f"Libro: {book.title}, Año: {book.year}")
 
-        
+    with session_scope(Session) as session:
         print("\n--- Eliminar libro ---")
         delete_book(session, 2)
+
+    with session_scope(Session) as session:
         print("Libro eliminado. Lista actualizada de libros:")
         for book in get_all_books(session):
             print(f"Libro: {book.title}, Autor: {book.author.name}")
 
-    finally:
-        # Cierra la sesión
-        session.close()
-
 
 if __name__ == "__main__":
     main()
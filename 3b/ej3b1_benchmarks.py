@@ -0,0 +1,260 @@
+"""
+Benchmarks y medición de consultas de ej3b1 (fuera del ejercicio CRUD).
+
+- benchmark_echo: coste del echo del motor al crear libros.
+- benchmark_create_books: create_book uno a uno frente a create_books.
+- benchmark_profiles: consultas y tiempo de cada endpoint con cada perfil de carga.
+- QueryProfile/profile_queries: tiempos en Python y en la base de datos por
+  llamada y aciertos de la caché de sentencias compiladas.
+- benchmark_statements: sentencias de módulo frente a rehacer session.query(...).
+
+Uso: python ej3b1_benchmarks.py --benchmark-profiles | --benchmark-create-books |
+     --benchmark-statements | --benchmark-echo
+"""
+
+import contextlib
+import io
+import sys
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload, sessionmaker
+
+from ej3b1 import (LOAD_PROFILES, Author, Book, build_engine, create_book, create_books, find_books_by_author,
+                   get_all_books, get_book_by_id, setup_database)
+from ej3b_instrumentacion import StatementTimer
+
+
+def benchmark_echo(books=2000):
+    """
+    Compara el tiempo de crear `books` libros con y sin echo.
+    La salida del echo se descarta en memoria para medir sólo el coste del logging.
+    Devuelve los segundos por configuración.
+    """
+    results = {}
+    for echo in (False, True):
+        with contextlib.redirect_stdout(io.StringIO()):
+            # echo=True añade un handler sobre el sys.stdout vigente al crear el motor
+            engine = build_engine('sqlite:///:memory:', echo=echo)
+            setup_database(engine)
+            session = sessionmaker(bind=engine)()
+            start = time.perf_counter()
+            for i in range(books):
+                create_book(session, f"Libro {i}", f"Autor {i % 50}", 2000)
+            results[echo] = time.perf_counter() - start
+            session.close()
+            engine.dispose()
+    return results
+
+
+def benchmark_create_books(books=20000, authors=200):
+    """
+    Compara create_book (un libro por llamada) con create_books sobre los mismos datos.
+    Devuelve libros por segundo de cada camino.
+    """
+    data = [(f"Libro {i}", f"Autor {i % authors}", 2000 + i % 25) for i in range(books)]
+
+    def one_by_one(session):
+        # Sin guardar los libros devueltos: cada commit caduca todos los objetos vivos de la sesión
+        for book in data:
+            create_book(session, *book)
+
+    results = {}
+    for name, load in (('create_book', one_by_one), ('create_books', lambda session: create_books(session, data))):
+        engine = build_engine('sqlite:///:memory:', echo=False)
+        setup_database(engine)
+        session = sessionmaker(bind=engine)()
+        start = time.perf_counter()
+        load(session)
+        results[name] = books / (time.perf_counter() - start)
+        session.close()
+        engine.dispose()
+    return results
+
+
+def _profile_endpoints(authors):
+    # Cada endpoint usa los datos como lo haría una vista real; export devuelve filas planas
+    def row(book, profile):
+        if profile == 'export':
+            return book.title, book.year, book.author_name
+        return book.title, book.year, book.author.name
+
+    def list_endpoint(session, profile, rng):
+        return [row(book, profile) for book in get_all_books(session, profile)]
+
+    def detail_endpoint(session, profile, rng):
+        book = get_book_by_id(session, rng.randint(1, session.query(Book).count()), profile)
+        return book.title, book.author.name, [other.title for other in book.author.book]
+
+    def search_endpoint(session, profile, rng):
+        return [row(book, profile) for book in find_books_by_author(session, f"Autor {rng.randrange(authors)}", profile)]
+
+    return {'list': (list_endpoint, LOAD_PROFILES),
+            # list no carga los otros libros del autor (raiseload) y export no devuelve objetos
+            'detail': (detail_endpoint, [name for name in LOAD_PROFILES if name not in ('list', 'export')]),
+            'search': (search_endpoint, LOAD_PROFILES)}
+
+
+def benchmark_profiles(books=5000, authors=100, repeat=20):
+    """
+    Ejecuta cada endpoint (list, detail, search) con cada perfil de carga y devuelve
+    {endpoint: {perfil: {'queries': consultas por llamada, 'ms': milisegundos por llamada}}}.
+    Si el perfil impide la carga que necesita el endpoint (raiseload) se indica en 'error'.
+    """
+    import random
+    from sqlalchemy.exc import InvalidRequestError
+
+    engine = build_engine('sqlite:///:memory:', echo=False)
+    setup_database(engine)
+    SessionLocal = sessionmaker(bind=engine)
+    with SessionLocal() as session:
+        create_books(session, ((f"Libro {i}", f"Autor {i % authors}", 2000 + i % 25) for i in range(books)))
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    results = {}
+    for endpoint, (run, profiles) in _profile_endpoints(authors).items():
+        results[endpoint] = {}
+        for profile in profiles:
+            rng = random.Random(0)
+            statements.clear()
+            start = time.perf_counter()
+            try:
+                for _ in range(repeat):
+                    # Sesión nueva en cada llamada, como en una petición web
+                    with SessionLocal() as session:
+                        run(session, profile, rng)
+            except InvalidRequestError as error:
+                results[endpoint][profile] = {'error': str(error).splitlines()[0]}
+                continue
+            elapsed = time.perf_counter() - start
+            # El count() que elige el libro de detail no cuenta como consulta del perfil
+            queries = sum(1 for statement in statements if not statement.startswith('SELECT count'))
+            results[endpoint][profile] = {'queries': queries / repeat, 'ms': elapsed / repeat * 1000}
+    engine.dispose()
+    return results
+
+
+class QueryProfile(StatementTimer):
+    """
+    Estadísticas por etiqueta de las llamadas medidas con profile_queries: llamadas,
+    sentencias cuya forma compilada salió de la caché del motor (hits) o hubo que
+    compilar (misses), tiempo total y tiempo dentro de la base de datos
+    (cursor.execute, medido con los eventos de StatementTimer). La diferencia es el
+    coste en Python de construir la consulta, compilarla y crear los objetos del resultado.
+    """
+    _START_KEY = 'query_profile_start'
+
+    def __init__(self, engine):
+        super().__init__(engine)
+        self.stats = {}
+        self._label = None
+
+    def _entry(self, label):
+        return self.stats.setdefault(label, {'calls': 0, 'hits': 0, 'misses': 0, 'seconds': 0.0, 'db_seconds': 0.0})
+
+    def call(self, label, function, *args, **kwargs):
+        """Ejecuta function(*args, **kwargs) y acumula sus tiempos y sentencias en label"""
+        entry = self._entry(label)
+        previous, self._label = self._label, label
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            entry['seconds'] += time.perf_counter() - start
+            entry['calls'] += 1
+            self._label = previous
+
+    def _observe(self, conn, statement, parameters, context, executemany, seconds):
+        # Las sentencias fuera de call() se agrupan por su texto SQL
+        entry = self._entry(self._label if self._label is not None else statement)
+        entry['db_seconds'] += seconds
+        if context is not None and context.cache_hit == context.dialect.CACHE_HIT:
+            entry['hits'] += 1
+        elif context is not None and context.cache_hit == context.dialect.CACHE_MISS:
+            entry['misses'] += 1
+
+    def report(self):
+        """
+        {etiqueta: {'calls', 'hits', 'misses', 'python_us', 'db_us'}} con los
+        microsegundos medios por llamada en Python y en la base de datos
+        """
+        report = {}
+        for label, entry in self.stats.items():
+            calls = entry['calls'] or 1
+            report[label] = {'calls': entry['calls'], 'hits': entry['hits'], 'misses': entry['misses'],
+                             'python_us': max(entry['seconds'] - entry['db_seconds'], 0.0) / calls * 1e6,
+                             'db_us': entry['db_seconds'] / calls * 1e6}
+        return report
+
+
+@contextlib.contextmanager
+def profile_queries(engine):
+    """
+    Mide las sentencias ejecutadas en engine mientras el bloque está activo:
+
+        with profile_queries(engine) as profile:
+            profile.call('get_book_by_id', get_book_by_id, session, 1)
+        profile.report()
+    """
+    with QueryProfile(engine) as profile:
+        yield profile
+
+
+def benchmark_statements(books=2000, authors=100, calls=2000):
+    """
+    Compara las consultas frecuentes con sus sentencias de módulo (BOOK_BY_ID,
+    BOOKS_BY_AUTHOR) frente a rehacer la cadena session.query(...) en cada
+    llamada, como hacía antes el módulo. Devuelve QueryProfile.report().
+    """
+    import random
+
+    engine = build_engine('sqlite:///:memory:', echo=False)
+    setup_database(engine)
+    with sessionmaker(bind=engine)() as session:
+        create_books(session, ((f"Libro {i}", f"Autor {i % authors}", 2000 + i % 25) for i in range(books)))
+
+    def query_by_id(session, book_id):
+        return session.query(Book).options(joinedload(Book.author)).filter(Book.id == book_id).first()
+
+    def query_by_author(session, author_name):
+        return session.query(Book).options(joinedload(Book.author)).join(Book.author) \
+            .filter(Author.name == author_name).all()
+
+    rng = random.Random(0)
+    with sessionmaker(bind=engine)() as session, profile_queries(engine) as profile:
+        for _ in range(calls):
+            book_id = rng.randint(1, books)
+            author_name = f"Autor {rng.randrange(authors)}"
+            profile.call('get_book_by_id', get_book_by_id, session, book_id, 'joined')
+            profile.call('query(by id)', query_by_id, session, book_id)
+            profile.call('find_books_by_author', find_books_by_author, session, author_name, 'joined')
+            profile.call('query(by author)', query_by_author, session, author_name)
+            # El identity map haría que las siguientes llamadas no construyeran objetos
+            session.expunge_all()
+    engine.dispose()
+    return profile.report()
+
+
+if __name__ == "__main__":
+    if '--benchmark-profiles' in sys.argv:
+        for endpoint, profiles in benchmark_profiles().items():
+            print(f"--- {endpoint} ---")
+            for profile, data in profiles.items():
+                if 'error' in data:
+                    print(f"{profile:>7}: {data['error']}")
+                else:
+                    print(f"{profile:>7}: {data['queries']:6.1f} consultas  {data['ms']:8.2f} ms")
+    elif '--benchmark-create-books' in sys.argv:
+        for name, rate in benchmark_create_books().items():
+            print(f"{name:<12}: {rate:>8.0f} libros/s")
+    elif '--benchmark-statements' in sys.argv:
+        for label, data in benchmark_statements().items():
+            print(f"{label:<21}: {data['python_us']:8.1f} us Python  {data['db_us']:8.1f} us BD  "
+                  f"caché {data['hits']} hits / {data['misses']} misses")
+    elif '--benchmark-echo' in sys.argv:
+        for echo, seconds in benchmark_echo().items():
+            print(f"echo={echo!s:<5}: {seconds:.2f} s")
+    else:
+        print("Uso: python ej3b1_benchmarks.py --benchmark-profiles | --benchmark-create-books | "
+              "--benchmark-statements | --benchmark-echo")
@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from ej3b1 import BOOK_BY_ID, Base, Book, create_books, find_books_by_author, get_book_by_id
+from ej3b1_benchmarks import benchmark_profiles, benchmark_statements, profile_queries
+
+
+@pytest.fixture
+def library():
+    """Two authors with three books in an in-memory database, loaded into a fresh session state"""
+    engine = create_engine('sqlite:///:memory:', echo=False)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    create_books(session, [("Book 1", "Author 1", 2021), ("Book 2", "Author 1", 2022), ("Book 3", "Author 2", 2023)])
+    session.expunge_all()
+
+    yield session
+
+    session.close()
+    Base.metadata.drop_all(engine)
+
+
+def test_benchmark_profiles():
+    """Test that the profile benchmark reports queries per endpoint"""
+    results = benchmark_profiles(books=50, authors=5, repeat=2)
+
+    assert results['list']['export']['queries'] == 1
+    assert set(results['detail']) == {'joined', 'detail'}
+    assert not any('error' in data for profiles in results.values() for data in profiles.values())
+    assert results['detail']['detail']['queries'] == 2
+
+
+def test_hot_queries_reuse_compiled_statements(library):
+    """Test that repeated lookups with other parameters hit the compiled statement cache"""
+    engine = library.get_bind()
+    # Warm up the engine cache (it may already hold these statements from other tests)
+    get_book_by_id(library, 1)
+    find_books_by_author(library, "Author 1")
+
+    with profile_queries(engine) as profile:
+        for book_id in (1, 2, 3):
+            profile.call('by_id', get_book_by_id, library, book_id)
+        profile.call('by_author', find_books_by_author, library, "Author 2")
+        library.query(Book).count()
+
+    report = profile.report()
+    assert report['by_id']['calls'] == 3
+    # joined profile: the book and its author in one statement
+    assert report['by_id']['hits'] == 3 and report['by_id']['misses'] == 0
+    assert (report['by_author']['hits'], report['by_author']['misses']) == (1, 0)
+    assert report['by_id']['python_us'] > 0 and report['by_id']['db_us'] > 0
+    assert any(label.startswith('SELECT count') for label in report)
+    assert 'book_id' in str(BOOK_BY_ID['joined'])
+
+
+def test_profile_queries_survives_failed_statements(library):
+    """Test that a failing statement leaves no pending start time behind"""
+    engine = library.get_bind()
+
+    with profile_queries(engine) as profile, engine.connect() as connection:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                profile.call('broken', connection.execute, text("SELECT * FROM missing_table"))
+        profile.call('ok', connection.execute, text("SELECT 1"))
+
+        assert connection.connection.info['query_profile_start'] == {}
+    assert profile.report()['broken']['calls'] == 3
+    assert profile.report()['ok']['calls'] == 1
+
+
+def test_benchmark_statements():
+    """Test that the statement benchmark profiles both query styles"""
+    report = benchmark_statements(books=20, authors=4, calls=5)
+
+    assert set(report) == {'get_book_by_id', 'query(by id)', 'find_books_by_author', 'query(by author)'}
+    assert report['get_book_by_id']['calls'] == 5
+    assert report['get_book_by_id']['hits'] >= 4
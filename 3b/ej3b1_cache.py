@@ -0,0 +1,361 @@
+"""
+Caché de segundo nivel para las lecturas de ej3b1 (get_book_by_id y find_books_by_author).
+
+Las consultas se guardan en una LRU en memoria compartida por todas las sesiones,
+con clave (consulta, parámetros). Se guardan los valores de las columnas, no los
+objetos: en un acierto se reconstruyen objetos desvinculados
+(make_transient_to_detached) y se incorporan a la sesión con merge(load=False),
+sin ejecutar SQL.
+
+La caché no escucha nada al importar el módulo: hay que conectarla a las sesiones
+y al motor que la usan:
+
+    cache = QueryCache().listen(SessionLocal, engine)
+
+Consistencia:
+- after_flush invalida las claves afectadas por los Book/Author insertados,
+  modificados o borrados, y las apunta en la sesión.
+- Mientras la sesión tiene cambios sin confirmar se lee de la base de datos y
+  no se guarda nada en la caché (podría ser un estado que luego se anule).
+- after_commit y after_rollback vuelven a invalidar esas claves (otra sesión
+  pudo guardar el valor antiguo entre el flush y el commit).
+- Las sentencias masivas del ORM sobre Book/Author (session.execute de insert,
+  update o delete, p.ej. bulk_update_books) no pasan por el flush ni se sabe
+  qué filas tocan: vacían la caché entera (do_orm_execute), también al terminar
+  la transacción.
+- Lo mismo con las escrituras de Core sobre books/authors (connection.execute,
+  p.ej. ej3b1_ingesta.insert_books con una Connection): el evento after_execute
+  del motor vacía la caché, y otra vez con el commit o rollback de la conexión.
+  Las cadenas enviadas con exec_driver_sql no pasan por after_execute.
+- Cada invalidación incrementa una generación. Una lectura apunta la generación
+  antes de consultar y set() descarta el resultado si ha cambiado: una carga que
+  empezó antes de una invalidación no vuelve a dejar el valor antiguo.
+- Las entradas caducan a los ttl segundos, lo que acota el desfase ante cambios
+  hechos fuera de estas sesiones y motores.
+"""
+
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, event, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql.dml import UpdateBase
+
+import ej3b1
+from ej3b1 import Author, Book
+
+# Entradas de la caché como mucho
+CACHE_MAX_SIZE = 10000
+# Segundos que vive una entrada
+CACHE_TTL = 300
+
+# Clave de session.info con las claves invalidadas pendientes de commit/rollback
+_PENDING_KEY = 'query_cache_pending'
+# Marca entre las claves pendientes: hay que vaciar toda la caché
+_ALL_KEYS = ('*',)
+# Clave de connection.info: escrituras de Core pendientes de commit/rollback
+_CONNECTION_PENDING_KEY = 'query_cache_core_writes'
+# Opción de ejecución con la que se marca la conexión de cada sesión escuchada
+_SESSION_OPTION = 'query_cache_session'
+# Clave de session.info: la sesión está en un flush (entre before_flush y after_flush_postexec)
+_FLUSHING_KEY = 'query_cache_flushing'
+# Tablas cuyos cambios afectan a las consultas guardadas
+_TABLES = {Book.__table__.name, Author.__table__.name}
+# Sentencias de texto que escriben
+_TEXT_DML = re.compile(r'^\s*(INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+
+# IDs de los autores con un nombre, para las búsquedas que no devuelven libros
+AUTHOR_IDS_BY_NAME = select(Author.id).where(Author.name == bindparam('author_name'))
+
+
+class QueryCache:
+    """
+    LRU de resultados de consultas con índices para invalidar por autor y métricas de uso
+    """
+
+    def __init__(self, max_size: int = CACHE_MAX_SIZE, ttl: float = CACHE_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.RLock()
+        # clave -> (caducidad, valor)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # Se incrementa con cada invalidación; ver set()
+        self._generation = 0
+        # (objetivo, evento, función) registrados con listen(), para remove()
+        self._listeners: List[Tuple[Any, str, Callable]] = []
+        # author_id -> claves cuyo resultado depende de ese autor
+        self._keys_by_author: Dict[Any, Set[Hashable]] = {}
+        self._authors_by_key: Dict[Hashable, Set[Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.expirations = 0
+        self.discarded = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Devuelve (encontrado, valor); el valor puede ser None si se guardó None"""
+        with self._lock:
+            if key in self._entries:
+                expires, value = self._entries[key]
+                if expires > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                self._remove(key)
+                self.expirations += 1
+            self.misses += 1
+            return False, None
+
+    @property
+    def generation(self) -> int:
+        """Generación actual: apúntala antes de consultar la base de datos y pásala a set()"""
+        with self._lock:
+            return self._generation
+
+    def set(self, key: Hashable, value: Any, author_ids: Iterable[Any] = (),
+            generation: Optional[int] = None) -> bool:
+        """
+        Guarda un resultado; author_ids son los autores de los que depende.
+        Si se indica generation y desde entonces hubo alguna invalidación, el
+        resultado puede ser anterior a ella y no se guarda. Devuelve si se guardó.
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                self.discarded += 1
+                return False
+            self._remove(key)
+            self._entries[key] = (self._clock() + self.ttl, value)
+            author_ids = set(author_ids)
+            self._authors_by_key[key] = author_ids
+            for author_id in author_ids:
+                self._keys_by_author.setdefault(author_id, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            return True
+
+    def _remove(self, key: Hashable) -> bool:
+        if key not in self._entries:
+            return False
+        del self._entries[key]
+        for author_id in self._authors_by_key.pop(key, ()):
+            keys = self._keys_by_author.get(author_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_author[author_id]
+        return True
+
+    def invalidate(self, keys: Iterable[Hashable]) -> None:
+        """Elimina las claves indicadas (las que no estén se ignoran)"""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                if self._remove(key):
+                    self.invalidations += 1
+
+    def keys_for_author(self, author_id: Any) -> Set[Hashable]:
+        """Claves cuyo resultado incluye datos de ese autor"""
+        with self._lock:
+            return set(self._keys_by_author.get(author_id, ()))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._keys_by_author.clear()
+            self._authors_by_key.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Aciertos, fallos, expulsiones, invalidaciones, caducadas, cargas descartadas y tamaño actual"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'expirations': self.expirations,
+                'discarded': self.discarded,
+                'size': len(self._entries),
+            }
+
+    def usable(self, session: Session) -> bool:
+        """Indica si la sesión puede leer y escribir en la caché (sin cambios sin confirmar)"""
+        return not (session.info.get(_PENDING_KEY) or session.new or session.dirty or session.deleted)
+
+    def listen(self, sessions, engine: Optional[Engine] = None) -> 'QueryCache':
+        """
+        Registra la invalidación en los eventos de sessions (un sessionmaker, una
+        sesión concreta o la clase Session) y, si se indica, en los del motor, para
+        ver también las escrituras de Core. Devuelve la propia caché.
+        """
+        self._listen(sessions, 'after_begin', self._after_begin)
+        self._listen(sessions, 'before_flush', self._before_flush)
+        self._listen(sessions, 'after_flush', self._after_flush)
+        self._listen(sessions, 'after_flush_postexec', self._end_flush)
+        self._listen(sessions, 'after_soft_rollback', self._end_flush)
+        self._listen(sessions, 'do_orm_execute', self._do_orm_execute)
+        self._listen(sessions, 'after_commit', self._after_end)
+        self._listen(sessions, 'after_rollback', self._after_end)
+        if engine is not None:
+            self.listen_engine(engine)
+        return self
+
+    def listen_engine(self, engine: Engine) -> 'QueryCache':
+        """Vacía la caché con las escrituras de Core sobre books/authors ejecutadas en engine"""
+        self._listen(engine, 'after_execute', self._after_execute)
+        self._listen(engine, 'commit', self._after_connection_end)
+        self._listen(engine, 'rollback', self._after_connection_end)
+        return self
+
+    def _listen(self, target, name: str, function: Callable) -> None:
+        event.listen(target, name, function)
+        self._listeners.append((target, name, function))
+
+    def remove(self) -> None:
+        """Quita todos los eventos registrados con listen() y listen_engine()"""
+        while self._listeners:
+            event.remove(*self._listeners.pop())
+
+    def _affected_keys(self, session: Session) -> Set[Hashable]:
+        keys: Set[Hashable] = set()
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            state = inspect(obj)
+            if isinstance(obj, Book):
+                keys.add(('get_book_by_id', obj.id))
+                # Autores anterior y actual del libro: sus búsquedas cambian
+                author_ids = {obj.author_id} | set(state.attrs.author_id.history.deleted or ())
+                author_ids |= {author.id for author in state.attrs.author.history.deleted or () if author is not None}
+                for author_id in author_ids:
+                    keys |= {key for key in self.keys_for_author(author_id) if key[0] == 'find_books_by_author'}
+            elif isinstance(obj, Author):
+                # Los libros guardan el nombre del autor y las búsquedas van por nombre
+                keys |= self.keys_for_author(obj.id)
+                names = {obj.name} | set(state.attrs.name.history.deleted or ())
+                keys |= {('find_books_by_author', name) for name in names}
+        return keys
+
+    def _before_flush(self, session: Session, flush_context, instances) -> None:
+        session.info[_FLUSHING_KEY] = True
+
+    def _end_flush(self, session: Session, *args) -> None:
+        # after_flush_postexec, o after_soft_rollback si el flush falla
+        session.info.pop(_FLUSHING_KEY, None)
+
+    def _after_flush(self, session: Session, flush_context) -> None:
+        keys = self._affected_keys(session)
+        if keys:
+            self.invalidate(keys)
+            session.info.setdefault(_PENDING_KEY, set()).update(keys)
+
+    def _do_orm_execute(self, orm_execute_state) -> None:
+        state = orm_execute_state
+        if not (state.is_insert or state.is_update or state.is_delete):
+            return
+        if {mapper.class_ for mapper in state.all_mappers} & {Book, Author}:
+            self.clear()
+            state.session.info.setdefault(_PENDING_KEY, set()).add(_ALL_KEYS)
+
+    def _after_begin(self, session: Session, transaction, connection) -> None:
+        # Permite saber en after_execute qué sesión usa la conexión (la opción es de esta
+        # Connection, no de la conexión del pool, y desaparece al devolverla)
+        connection.execution_options(**{_SESSION_OPTION: weakref.ref(session)})
+
+    def _after_execute(self, conn, clauseelement, multiparams, params, execution_options, result) -> None:
+        if isinstance(clauseelement, UpdateBase):
+            if clauseelement.table.name not in _TABLES:
+                return
+        elif not _TEXT_DML.match(str(clauseelement)):
+            # Las sentencias de texto que escriben se tratan como si tocaran las dos tablas
+            return
+        session_ref = execution_options.get(_SESSION_OPTION)
+        session = session_ref() if session_ref is not None else None
+        # El flush de una sesión escuchada ya invalida por clave en after_flush
+        if session is not None and session.info.get(_FLUSHING_KEY):
+            return
+        self.clear()
+        conn.info[_CONNECTION_PENDING_KEY] = True
+
+    def _after_connection_end(self, conn) -> None:
+        # Otra conexión pudo leer y guardar el valor anterior antes del commit
+        if conn.info.pop(_CONNECTION_PENDING_KEY, False):
+            self.clear()
+
+    def _after_end(self, session: Session) -> None:
+        session.info.pop(_FLUSHING_KEY, None)
+        keys = session.info.pop(_PENDING_KEY, None)
+        if keys and _ALL_KEYS in keys:
+            self.clear()
+        elif keys:
+            self.invalidate(keys)
+
+
+def _book_data(book: Book) -> Dict[str, Any]:
+    author = book.author
+    return {
+        'id': book.id, 'title': book.title, 'year': book.year, 'author_id': book.author_id,
+        'author': None if author is None else {'id': author.id, 'name': author.name},
+    }
+
+
+def _detached(cls, values: Dict[str, Any]):
+    obj = cls(**values)
+    make_transient_to_detached(obj)
+    return obj
+
+
+def _attach(session: Session, data: Dict[str, Any]) -> Book:
+    book = _detached(Book, {key: data[key] for key in ('id', 'title', 'year', 'author_id')})
+    author = None if data['author'] is None else _detached(Author, data['author'])
+    # Sin historial ni backref: author.book queda sin cargar en lugar de parecer [book]
+    set_committed_value(book, 'author', author)
+    return session.merge(book, load=False)
+
+
+def get_book_by_id(session: Session, book_id: Any, cache: QueryCache) -> Optional[Book]:
+    """ej3b1.get_book_by_id con caché (conectada con QueryCache.listen); el libro lleva cargado su autor"""
+    key = ('get_book_by_id', book_id)
+    if not cache.usable(session):
+        return ej3b1.get_book_by_id(session, book_id, profile='joined')
+    found, data = cache.get(key)
+    if found:
+        return None if data is None else _attach(session, data)
+    generation = cache.generation
+    book = ej3b1.get_book_by_id(session, book_id, profile='joined')
+    cache.set(key, None if book is None else _book_data(book), () if book is None else [book.author_id],
+              generation=generation)
+    return book
+
+
+def find_books_by_author(session: Session, author_name: str, cache: QueryCache) -> List[Book]:
+    """ej3b1.find_books_by_author con caché (conectada con QueryCache.listen)"""
+    key = ('find_books_by_author', author_name)
+    if not cache.usable(session):
+        return ej3b1.find_books_by_author(session, author_name, profile='joined')
+    found, data = cache.get(key)
+    if found:
+        return [_attach(session, book) for book in data]
+    generation = cache.generation
+    books = ej3b1.find_books_by_author(session, author_name, profile='joined')
+    author_ids = {book.author_id for book in books}
+    if not author_ids:
+        # Sin libros no hay filas de las que sacar el autor, pero un libro nuevo suyo cambia el
+        # resultado. Un homónimo sin libros de un autor que sí los tiene queda cubierto sólo por el ttl.
+        author_ids = session.scalars(AUTHOR_IDS_BY_NAME, {'author_name': author_name}).all()
+    cache.set(key, [_book_data(book) for book in books], author_ids, generation=generation)
+    return books
@@ -0,0 +1,297 @@
+import pytest
+from sqlalchemy import event, text, update
+from sqlalchemy.orm import sessionmaker
+
+import ej3b1
+from ej3b1 import Author, Book, build_engine, bulk_update_books, create_book, create_books, setup_database
+from ej3b1_cache import QueryCache, find_books_by_author, get_book_by_id
+from ej3b1_ingesta import insert_books
+
+
+@pytest.fixture
+def engine():
+    """Create an in-memory database shared by every session of the test"""
+    engine = build_engine('sqlite:///:memory:', echo=False)
+    setup_database(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def Session(engine):
+    """Session factory with the sample library already committed"""
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        create_books(session, [("Book 1", "Author 1", 2021), ("Book 2", "Author 1", 2022),
+                               ("Book 3", "Author 2", 2023)])
+    return Session
+
+
+@pytest.fixture
+def cache(engine, Session):
+    """A private cache listening only to the test sessions and engine"""
+    cache = QueryCache(max_size=100).listen(Session, engine)
+    yield cache
+    cache.remove()
+
+
+def count_statements(engine):
+    """Collect the SQL statements executed through the engine"""
+    statements = []
+    event.listen(engine, 'before_cursor_execute',
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+
+def test_repeated_lookups_skip_sql(engine, Session, cache):
+    """Test that cache hits return attached books without touching the database"""
+    with Session() as session:
+        book_id = session.query(Book.id).filter_by(title="Book 1").scalar()
+        get_book_by_id(session, book_id, cache=cache)
+        find_books_by_author(session, "Author 1", cache=cache)
+
+    statements = count_statements(engine)
+    with Session() as session:
+        book = get_book_by_id(session, book_id, cache=cache)
+        books = find_books_by_author(session, "Author 1", cache=cache)
+
+        assert book in session
+        assert (book.title, book.year, book.author.name) == ("Book 1", 2021, "Author 1")
+        assert sorted(b.title for b in books) == ["Book 1", "Book 2"]
+        assert books[0].author is books[1].author
+    assert statements == []
+    assert cache.metrics()['hits'] == 2
+
+
+def test_missing_book_is_cached(Session, cache):
+    """Test that a missing id is cached and invalidated once the book is created"""
+    with Session() as session:
+        assert get_book_by_id(session, 4, cache=cache) is None
+        assert get_book_by_id(session, 4, cache=cache) is None
+        create_book(session, "Book 4", "Author 3", 2024)
+
+    with Session() as session:
+        assert get_book_by_id(session, 4, cache=cache).title == "Book 4"
+    assert cache.metrics()['hits'] == 1
+
+
+def test_update_invalidates_book_and_searches(Session, cache):
+    """Test that moving a book to another author refreshes both author searches"""
+    with Session() as session:
+        book = session.query(Book).filter_by(title="Book 1").one()
+        book_id = book.id
+        get_book_by_id(session, book_id, cache=cache)
+        find_books_by_author(session, "Author 1", cache=cache)
+        find_books_by_author(session, "Author 2", cache=cache)
+
+        book.title = "Renamed"
+        book.author = session.query(Author).filter_by(name="Author 2").one()
+        session.commit()
+
+    with Session() as session:
+        assert get_book_by_id(session, book_id, cache=cache).title == "Renamed"
+        assert [b.title for b in find_books_by_author(session, "Author 1", cache=cache)] == ["Book 2"]
+        assert len(find_books_by_author(session, "Author 2", cache=cache)) == 2
+
+
+def test_author_rename_invalidates_dependent_keys(Session, cache):
+    """Test that renaming an author refreshes cached books and both name searches"""
+    with Session() as session:
+        book_id = session.query(Book.id).filter_by(title="Book 3").scalar()
+        get_book_by_id(session, book_id, cache=cache)
+        find_books_by_author(session, "Author 2", cache=cache)
+        assert find_books_by_author(session, "New Name", cache=cache) == []
+
+        session.query(Author).filter_by(name="Author 2").one().name = "New Name"
+        session.commit()
+
+    with Session() as session:
+        assert get_book_by_id(session, book_id, cache=cache).author.name == "New Name"
+        assert find_books_by_author(session, "Author 2", cache=cache) == []
+        assert len(find_books_by_author(session, "New Name", cache=cache)) == 1
+
+
+def test_new_book_for_cached_author(Session, cache):
+    """Test that adding a book to an existing author refreshes its search"""
+    with Session() as session:
+        get_book_by_id(session, 1, cache=cache)
+        find_books_by_author(session, "Author 2", cache=cache)
+        create_book(session, "Book 4", "Author 2", 2024)
+
+    # The flush goes through the engine too, but only the affected search is dropped
+    assert cache.get(('get_book_by_id', 1))[0]
+    with Session() as session:
+        assert len(find_books_by_author(session, "Author 2", cache=cache)) == 2
+
+
+def test_search_miss_runs_one_query(engine, Session, cache):
+    """Test that a search miss takes the author ids from the loaded rows instead of querying again"""
+    with Session() as session:
+        statements = count_statements(engine)
+        find_books_by_author(session, "Author 1", cache=cache)
+        assert len(statements) == 1
+
+        # With no books the authors are looked up by name, so a first book invalidates the search
+        assert find_books_by_author(session, "Author 3", cache=cache) == []
+        session.add(Author(name="Author 3"))
+        session.commit()
+        assert find_books_by_author(session, "Author 3", cache=cache) == []
+        create_book(session, "Book 4", "Author 3", 2024)
+        assert [book.title for book in find_books_by_author(session, "Author 3", cache=cache)] == ["Book 4"]
+
+
+def test_failed_flush_does_not_hide_later_writes(Session, cache):
+    """Test that the flush marker is cleared when a flush fails"""
+    with Session() as session:
+        session.add(Book(title=None, year=2024))
+        with pytest.raises(Exception):
+            session.flush()
+        session.rollback()
+
+        get_book_by_id(session, 1, cache=cache)
+        session.execute(text("UPDATE books SET year = 1999 WHERE id = 1"))
+        assert len(cache) == 0
+        session.commit()
+        assert get_book_by_id(session, 1, cache=cache).year == 1999
+
+
+def test_uncommitted_changes_bypass_cache(Session, cache):
+    """Test that a session with pending changes reads its own state and never fills the cache"""
+    with Session() as session:
+        book = session.query(Book).filter_by(title="Book 1").one()
+        book.title = "Draft"
+        session.flush()
+
+        assert get_book_by_id(session, book.id, cache=cache).title == "Draft"
+        assert len(cache) == 0
+        session.rollback()
+
+        assert get_book_by_id(session, book.id, cache=cache).title == "Book 1"
+    assert len(cache) == 1
+
+
+def test_bulk_update_clears_cache(Session, cache):
+    """Test that set-based updates, which skip the flush, still invalidate cached reads"""
+    with Session() as session:
+        get_book_by_id(session, 1, cache=cache)
+        find_books_by_author(session, "Author 1", cache=cache)
+
+        bulk_update_books(session, {'year': 1999}, where=Book.year < 2023)
+
+        assert len(cache) == 0
+        assert get_book_by_id(session, 1, cache=cache).year == 1999
+        assert len(cache) == 0
+        session.commit()
+
+    with Session() as session:
+        assert {book.year for book in find_books_by_author(session, "Author 1", cache=cache)} == {1999}
+
+
+def test_core_writes_invalidate(engine, Session, cache):
+    """Test that Core statements on a plain connection invalidate cached reads"""
+    with Session() as session:
+        assert len(find_books_by_author(session, "Author 2", cache=cache)) == 1
+        get_book_by_id(session, 1, cache=cache)
+
+    with engine.connect() as connection:
+        insert_books(connection, [("Book 4", "Author 2", 2024)])
+    with Session() as session:
+        assert len(find_books_by_author(session, "Author 2", cache=cache)) == 2
+
+    with engine.begin() as connection:
+        connection.execute(update(Book).where(Book.id == 1).values(year=1999))
+    with Session() as session:
+        assert get_book_by_id(session, 1, cache=cache).year == 1999
+
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE books SET title = 'Text' WHERE id = 1"))
+    with Session() as session:
+        assert get_book_by_id(session, 1, cache=cache).title == "Text"
+
+
+def test_core_write_commit_clears_refilled_value(tmp_path):
+    """Test that a value cached from another connection before a Core write commits is dropped at commit"""
+    engine = build_engine(f"sqlite:///{tmp_path / 'library.db'}", echo=False)
+    setup_database(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        create_book(session, "Book 1", "Author 1", 2021)
+    cache = QueryCache().listen(Session, engine)
+
+    with engine.connect() as connection:
+        connection.execute(update(Book).where(Book.id == 1).values(year=1999))
+        with Session() as session:
+            # Another pooled connection still reads the committed year and caches it
+            assert get_book_by_id(session, 1, cache=cache).year == 2021
+        assert len(cache) == 1
+        connection.commit()
+
+    assert len(cache) == 0
+    with Session() as session:
+        assert get_book_by_id(session, 1, cache=cache).year == 1999
+    cache.remove()
+    engine.dispose()
+
+
+def test_fill_started_before_invalidation_is_dropped(engine, Session, cache, monkeypatch):
+    """Test that a read racing with a write does not store the value it read"""
+    read = ej3b1.get_book_by_id
+
+    def read_then_write(session, book_id, profile):
+        book = read(session, book_id, profile)
+        # Another process updates the book after this read but before it is cached
+        with engine.begin() as connection:
+            connection.execute(update(Book).where(Book.id == book_id).values(year=1999))
+        return book
+
+    monkeypatch.setattr(ej3b1, 'get_book_by_id', read_then_write)
+    with Session() as session:
+        assert get_book_by_id(session, 1, cache=cache).year == 2021
+    monkeypatch.setattr(ej3b1, 'get_book_by_id', read)
+
+    assert len(cache) == 0
+    assert cache.metrics()['discarded'] == 1
+    with Session() as session:
+        assert get_book_by_id(session, 1, cache=cache).year == 1999
+
+
+def test_entries_expire():
+    """Test that entries are dropped once their TTL has passed"""
+    now = [0.0]
+    cache = QueryCache(ttl=10, clock=lambda: now[0])
+    cache.set('a', 1)
+
+    now[0] = 9.0
+    assert cache.get('a') == (True, 1)
+    now[0] = 10.0
+    assert cache.get('a') == (False, None)
+    assert cache.metrics()['expirations'] == 1
+
+
+def test_remove_detaches_listeners(engine, Session):
+    """Test that a cache only listens where it was attached, and stops after remove()"""
+    cache = QueryCache().listen(Session, engine)
+    assert event.contains(Session, 'after_flush', cache._after_flush)
+    assert event.contains(engine, 'after_execute', cache._after_execute)
+
+    cache.remove()
+
+    assert not event.contains(Session, 'after_flush', cache._after_flush)
+    assert not event.contains(engine, 'after_execute', cache._after_execute)
+
+
+def test_lru_eviction_metrics():
+    """Test LRU eviction order and the exposed metrics"""
+    cache = QueryCache(max_size=2)
+    cache.set('a', 1, author_ids=[1])
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1)
+    assert cache.keys_for_author(1) == {'a'}
+    cache.invalidate(['a'])
+    assert cache.keys_for_author(1) == set()
+    assert cache.metrics() == {'hits': 2, 'misses': 1, 'hit_rate': 2 / 3, 'evictions': 1,
+                               'invalidations': 1, 'expirations': 0, 'discarded': 0, 'size': 1}
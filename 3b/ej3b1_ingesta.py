@@ -0,0 +1,115 @@
+"""
+Carga masiva de libros para los modelos de ej3b1 sin pasar por la unidad de trabajo del ORM.
+
+create_book/create_books crean un objeto Book por fila y el flush los sigue uno
+a uno. Aquí las filas van como diccionarios a `session.execute(insert(Book), filas)`
+(o `connection.execute(...)` en Core), que SQLAlchemy envía con un único
+executemany por lote. Los autores se resuelven por lotes con
+ej3b1.get_or_create_authors (consultas IN e INSERT ... RETURNING).
+
+benchmark() compara create_books (ORM) con los caminos masivos de ORM y Core.
+Uso: python ej3b1_ingesta.py [FILAS ...]   (por defecto 100000 y 1000000)
+"""
+
+import sys
+import time
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from ej3b1 import Book, author_id_cache, build_engine, create_books, get_or_create_authors, setup_database
+
+# Libros por lote (un executemany y un commit por lote)
+INGEST_BATCH_SIZE = 10000
+
+
+class IngestResult(NamedTuple):
+    """
+    Resumen de una carga: libros insertados, lotes, segundos y, si se pidieron, sus IDs
+    """
+    rows: int
+    batches: int
+    seconds: float
+    ids: Optional[List[int]] = None
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def _batches(rows: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    rows = iter(rows)
+    while True:
+        batch = [row for _, row in zip(range(batch_size), rows)]
+        if not batch:
+            return
+        yield batch
+
+
+def insert_books(executor, books: Iterable[Tuple[str, str, Optional[int]]],
+                 batch_size: int = INGEST_BATCH_SIZE, return_ids: bool = False) -> IngestResult:
+    """
+    Inserta libros (titulo, nombre_autor, anio) creando los autores que falten.
+
+    executor puede ser una Session (inserción masiva del ORM) o una Connection
+    (Core); en ambos casos se confirma cada lote. Con una Connection los IDs de
+    autor se recuerdan sólo durante la llamada (ver ej3b1.author_id_cache).
+    Con return_ids=True se devuelven los IDs en el orden de entrada: SQLite sólo
+    garantiza ese orden con un INSERT ... RETURNING por fila, así que es bastante
+    más lento.
+    """
+    start = time.perf_counter()
+    rows = batches = 0
+    ids: Optional[List[int]] = [] if return_ids else None
+    author_ids = author_id_cache(executor)
+    for batch in _batches(books, batch_size):
+        get_or_create_authors(executor, (author_name for _, author_name, _ in batch), author_ids)
+        values = [{'title': title, 'year': year, 'author_id': author_ids[author_name]}
+                  for title, author_name, year in batch]
+        if return_ids:
+            result = executor.execute(insert(Book).returning(Book.id, sort_by_parameter_order=True), values)
+            ids.extend(result.scalars())
+        else:
+            executor.execute(insert(Book), values)
+        executor.commit()
+        rows += len(batch)
+        batches += 1
+    return IngestResult(rows, batches, time.perf_counter() - start, ids)
+
+
+def sample_books(rows: int, authors: int = 1000) -> Iterator[Tuple[str, str, int]]:
+    """Genera libros sintéticos (titulo, nombre_autor, anio)"""
+    for i in range(rows):
+        yield f"Libro {i}", f"Autor {i % authors}", 1900 + i % 125
+
+
+def benchmark(rows: int, authors: int = 1000) -> Dict[str, float]:
+    """
+    Libros por segundo al cargar `rows` libros con create_books (ORM), con la
+    inserción masiva del ORM (Session) y con Core (Connection)
+    """
+    results = {}
+    for path in ('orm', 'orm_bulk', 'core'):
+        engine = build_engine('sqlite:///:memory:', echo=False)
+        setup_database(engine)
+        start = time.perf_counter()
+        if path == 'core':
+            with engine.connect() as connection:
+                insert_books(connection, sample_books(rows, authors))
+        else:
+            with sessionmaker(bind=engine)() as session:
+                if path == 'orm':
+                    create_books(session, sample_books(rows, authors))
+                else:
+                    insert_books(session, sample_books(rows, authors))
+        results[path] = rows / (time.perf_counter() - start)
+        engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    for rows in [int(argument) for argument in sys.argv[1:]] or [100000, 1000000]:
+        print(f"--- {rows} libros ---")
+        for path, rate in benchmark(rows).items():
+            print(f"{path:>9}: {rate:>9.0f} libros/s")
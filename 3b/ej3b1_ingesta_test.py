@@ -0,0 +1,88 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from ej3b1 import (Base, Author, Book, build_engine, create_book, create_sample_data, find_books_by_author,
+                   get_all_books, get_or_create_authors, setup_database)
+from ej3b1_ingesta import benchmark, insert_books, sample_books
+
+
+@pytest.fixture
+def engine():
+    """Create an isolated in-memory database"""
+    engine = create_engine('sqlite:///:memory:', echo=False)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    """Create a session on the test database"""
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def test_insert_books_session(session):
+    """Test bulk insertion through the ORM session, reusing existing authors"""
+    create_book(session, "Existing", "Autor 1", 2000)
+
+    result = insert_books(session, sample_books(25, authors=3), batch_size=10)
+
+    assert result.rows == 25
+    assert result.batches == 3
+    assert result.ids is None
+    assert session.query(Author).count() == 3
+    assert len(find_books_by_author(session, "Autor 1")) == 9
+    assert session.query(Book).count() == 26
+
+
+def test_insert_books_core_connection(engine):
+    """Test bulk insertion through a Core connection"""
+    with engine.connect() as connection:
+        result = insert_books(connection, sample_books(20, authors=4), batch_size=7)
+
+    assert result.rows == 20
+    assert result.rows_per_second > 0
+    with sessionmaker(bind=engine)() as session:
+        assert session.query(Book).count() == 20
+        assert session.query(Author).count() == 4
+
+
+def test_connection_author_ids_do_not_survive_rollback():
+    """Test that authors from a rolled back Core insert are not reused on the pooled connection"""
+    # One pooled DBAPI connection (same connection.info for every checkout) with foreign keys on
+    engine = build_engine('sqlite:///:memory:', echo=False, pool='static')
+    setup_database(engine)
+    with engine.connect() as connection:
+        get_or_create_authors(connection, ["Ghost"])
+        connection.rollback()
+
+    with engine.connect() as connection:
+        insert_books(connection, [("Real Book", "Ghost", 2020)])
+
+    with sessionmaker(bind=engine)() as session:
+        assert [book.author.name for book in get_all_books(session)] == ["Ghost"]
+    engine.dispose()
+
+
+def test_insert_books_return_ids(session):
+    """Test that generated ids come back in input order"""
+    result = insert_books(session, [("A", "X", 2000), ("B", "Y", 2001), ("C", "X", 2002)], return_ids=True)
+
+    assert [session.get(Book, book_id).title for book_id in result.ids] == ["A", "B", "C"]
+
+
+def test_create_sample_data_bulk(session):
+    """Test that the sample data is still created through the bulk path"""
+    create_sample_data(session)
+
+    books = get_all_books(session)
+    assert sorted((book.title, book.author.name) for book in books) == [
+        ("El Quijote", "Gabriel Reus"), ("La celestina", "Gabriel Reus"), ("La colmena", "Gregorio Reus")]
+
+
+def test_benchmark_paths():
+    """Test that the benchmark runs every path"""
+    assert set(benchmark(200, authors=10)) == {'orm', 'orm_bulk', 'core'}
@@ -1,9 +1,16 @@
+import os
+
 import pytest
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, true
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
 
+import ej3b1
 from ej3b1 import (Base, Author, Book, setup_database, create_book, get_all_books,
-                  get_book_by_id, update_book, delete_book, find_books_by_author)
+                  get_book_by_id, update_book, delete_book, find_books_by_author,
+                  build_engine, engine_config, get_engine, author_id_cache, get_or_create_authors,
+                  create_books, iter_books, iter_book_batches, bulk_update_books, bulk_delete_books,
+                  session_factory, session_scope)
 
 
 @pytest.fixture
@@ -177,3 +184,424 @@ def test_find_books_by_author(session):
     assert {b.title for b in books} == {"Book 1", "Book 2"}
     for book in books:
         assert book.author.name == "Target Author"
+
+
+def test_import_does_not_create_engine():
+    """Test that importing the module does not create an engine or open a connection"""
+    import subprocess
+    import sys
+    code = "import ej3b1; assert ej3b1._engine is None"
+    subprocess.run([sys.executable, '-W', 'ignore', '-c', code], check=True, cwd=os.path.dirname(__file__))
+
+
+def test_engine_config_from_environment(monkeypatch):
+    """Test that environment variables override the module defaults"""
+    monkeypatch.setenv('EJ3B1_DATABASE_URL', 'sqlite:///otra.db')
+    monkeypatch.setenv('EJ3B1_ECHO', 'debug')
+    monkeypatch.setenv('EJ3B1_POOL_SIZE', '20')
+
+    config = engine_config()
+    assert config['url'] == 'sqlite:///otra.db'
+    assert config['echo'] == 'debug'
+    assert config['pool_size'] == 20
+    # Explicit arguments win over the environment
+    assert engine_config(echo=False)['echo'] is False
+
+
+def test_build_engine_applies_pragmas(tmp_path):
+    """Test that every new SQLite connection gets the configured PRAGMAs"""
+    engine = build_engine(f"sqlite:///{tmp_path / 'biblioteca.db'}", echo=False, pool_size=3)
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+        assert connection.exec_driver_sql('PRAGMA foreign_keys').scalar() == 1
+        assert connection.exec_driver_sql('PRAGMA synchronous').scalar() == 1
+    assert isinstance(engine.pool, QueuePool)
+    assert engine.pool.size() == 3
+    engine.dispose()
+
+
+def test_build_engine_shared_memory_database():
+    """Test that an in-memory database is shared across sessions and threads via StaticPool"""
+    import threading
+    engine = build_engine('sqlite:///:memory:', echo=False)
+    assert isinstance(engine.pool, StaticPool)
+    setup_database(engine)
+    SessionLocal = sessionmaker(bind=engine)
+    with SessionLocal() as session:
+        create_book(session, "Shared Book", "Shared Author", 2024)
+
+    found = []
+    def read():
+        with SessionLocal() as other:
+            found.extend(book.title for book in get_all_books(other))
+    thread = threading.Thread(target=read)
+    thread.start()
+    thread.join()
+
+    assert found == ["Shared Book"]
+
+
+def test_get_engine_is_lazy_singleton(monkeypatch):
+    """Test that get_engine creates the default engine once"""
+    monkeypatch.setattr(ej3b1, '_engine', None)
+
+    engine = get_engine()
+
+    assert get_engine() is engine
+    assert ej3b1.engine is engine
+
+
+def count_statements(session):
+    """Collect the SQL statements executed through the session's engine"""
+    from sqlalchemy import event
+    statements = []
+    event.listen(session.get_bind(), 'before_cursor_execute',
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+
+def test_create_book_uses_author_cache(session):
+    """Test that repeated authors skip the name lookup"""
+    create_book(session, "First", "Cached Author", 2020)
+    statements = count_statements(session)
+
+    book = create_book(session, "Second", "Cached Author", 2021)
+
+    assert not any(statement.startswith('SELECT') and 'authors.name =' in statement for statement in statements)
+    assert book.author.name == "Cached Author"
+    assert session.query(Author).filter_by(name="Cached Author").count() == 1
+
+
+def test_author_cache_cleared_on_rollback(session):
+    """Test that a rolled back author is not reused from the cache"""
+    author_ids = author_id_cache(session)
+    session.add(Author(name="Ghost"))
+    session.flush()
+    get_or_create_authors(session, ["Ghost"])
+    assert "Ghost" in author_ids
+    session.rollback()
+
+    book = create_book(session, "Real Book", "Ghost", 2020)
+
+    assert book.author.name == "Ghost"
+    assert session.query(Author).count() == 1
+
+
+def test_author_cache_forgets_renamed_author(session):
+    """Test that renaming an author through the session drops its cache entry"""
+    book = create_book(session, "Book", "Old Name", 2020)
+    book.author.name = "New Name"
+    session.commit()
+
+    other = create_book(session, "Other", "Old Name", 2021)
+
+    assert other.author.name == "Old Name"
+    assert other.author_id != book.author_id
+
+
+def test_create_books(session):
+    """Test bulk creation with existing, new and repeated authors"""
+    create_book(session, "Existing", "Author A", 2000)
+    books = [(f"Book {i}", f"Author {'AB'[i % 2]}", 2000 + i) for i in range(10)]
+
+    created = create_books(session, iter(books), batch_size=3)
+
+    assert created == 10
+    assert session.query(Author).count() == 2
+    assert len(find_books_by_author(session, "Author A")) == 6
+    assert len(find_books_by_author(session, "Author B")) == 5
+
+
+def test_get_or_create_authors_batches_inserts(session):
+    """Test that missing authors are created with one lookup and one flush"""
+    statements = count_statements(session)
+
+    author_ids = get_or_create_authors(session, [f"Author {i}" for i in range(50)])
+    session.commit()
+
+    assert len(author_ids) == 50
+    assert sum(statement.startswith('SELECT') for statement in statements) == 1
+    assert sum(statement.startswith('INSERT') for statement in statements) <= 2
+
+
+@pytest.fixture
+def library(session):
+    """Two authors with three books, loaded into a fresh session state"""
+    create_books(session, [("Book 1", "Author 1", 2021), ("Book 2", "Author 1", 2022), ("Book 3", "Author 2", 2023)])
+    session.expunge_all()
+    return session
+
+
+@pytest.mark.parametrize('profile', ['joined', 'list', 'detail'])
+def test_get_all_books_profiles(library, profile):
+    """Test that every ORM profile returns the same books and authors"""
+    books = get_all_books(library, profile)
+
+    assert sorted((book.title, book.year, book.author.name) for book in books) == [
+        ("Book 1", 2021, "Author 1"), ("Book 2", 2022, "Author 1"), ("Book 3", 2023, "Author 2")]
+
+
+def test_export_profile_returns_rows(library):
+    """Test that the export profile returns flat rows instead of ORM objects"""
+    rows = get_all_books(library, 'export')
+
+    assert sorted((row.title, row.author_name) for row in rows) == [
+        ("Book 1", "Author 1"), ("Book 2", "Author 1"), ("Book 3", "Author 2")]
+    assert not isinstance(rows[0], Book)
+
+
+def test_list_profile_raises_on_unplanned_loads(library):
+    """Test that the list profile forbids lazy loading the author's books"""
+    from sqlalchemy.exc import InvalidRequestError
+    book = get_all_books(library, 'list')[0]
+
+    with pytest.raises(InvalidRequestError):
+        book.author.book
+
+
+def test_detail_profile_loads_author_books(library):
+    """Test that the detail profile loads the author and their books up front"""
+    book_id = library.query(Book.id).filter(Book.title == "Book 1").scalar()
+    statements = count_statements(library)
+
+    book = get_book_by_id(library, book_id, 'detail')
+    titles = sorted(other.title for other in book.author.book)
+
+    assert titles == ["Book 1", "Book 2"]
+    assert len(statements) == 2
+
+
+def test_default_profiles_skip_author_books(library):
+    """Test that point reads load only the author and updates load no relationships"""
+    statements = count_statements(library)
+
+    book = get_book_by_id(library, 1)
+    assert book.author.name == "Author 1"
+    assert len(statements) == 1
+
+    library.expunge_all()
+    statements.clear()
+    update_book(library, 1, new_year=1999)
+    assert len(statements) == 2
+    assert statements[0].startswith('SELECT') and 'JOIN' not in statements[0]
+    assert statements[1].startswith('UPDATE')
+
+
+def test_default_profile_loads_author_books(library):
+    """Test that the default profile keeps the original joinedload, so book.author.book can be read"""
+    for books in (get_all_books(library), find_books_by_author(library, "Author 1")):
+        assert all(book in book.author.book for book in books)
+
+
+def test_find_books_by_author_single_join(library):
+    """Test that searching by author with the list profile joins the authors table once and runs one query"""
+    statements = count_statements(library)
+
+    books = find_books_by_author(library, "Author 1", 'list')
+
+    assert sorted(book.title for book in books) == ["Book 1", "Book 2"]
+    assert {book.author.name for book in books} == {"Author 1"}
+    assert len(statements) == 1
+    assert statements[0].count('JOIN authors') == 1
+
+
+@pytest.mark.parametrize('profile', ['joined', 'detail', 'export'])
+def test_find_books_by_author_profiles(library, profile):
+    """Test searching by author with the other profiles"""
+    assert sorted(book.title for book in find_books_by_author(library, "Author 2", profile)) == ["Book 3"]
+
+
+def test_iter_books_streams_in_batches(session):
+    """Test that iter_books yields every book while keeping the session small"""
+    create_books(session, [(f"Book {i}", f"Author {i % 3}", 2000 + i) for i in range(25)])
+    session.expunge_all()
+    kept = []
+
+    for book in iter_books(session, batch_size=10):
+        kept.append(book)
+        # Processed batches are expunged, so the identity map never holds more than one batch
+        assert len(session.identity_map) <= 10 + 3
+
+    assert [book.title for book in kept] == [f"Book {i}" for i in range(25)]
+    assert kept[0].author.name == "Author 0"
+    assert kept[0] not in session
+
+
+def test_iter_book_batches_sizes(session):
+    """Test that batches are fetched in partitions of the requested size"""
+    create_books(session, [(f"Book {i}", "Author", 2000) for i in range(25)])
+
+    assert [len(batch) for batch in iter_book_batches(session, batch_size=10)] == [10, 10, 5]
+
+
+def test_iter_books_rows(session):
+    """Test the lightweight row mode used by export jobs"""
+    create_books(session, [("Book 1", "Author 1", 2001), ("Book 2", "Author 2", 2002)])
+    session.expunge_all()
+
+    rows = list(iter_books(session, rows=True))
+
+    assert [(row.title, row.year, row.author_name) for row in rows] == [
+        ("Book 1", 2001, "Author 1"), ("Book 2", 2002, "Author 2")]
+    assert len(session.identity_map) == 0
+
+
+@pytest.mark.parametrize('profile', ['joined', 'detail'])
+def test_iter_books_streams_eager_profiles(session, profile):
+    """Test that the many-to-one joinedload of Book.author streams with yield_per"""
+    create_books(session, [(f"Book {i}", f"Author {i % 3}", 2000 + i) for i in range(25)])
+    session.expunge_all()
+
+    batches = list(iter_book_batches(session, batch_size=10, profile=profile))
+
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert [book.author.name for book in batches[-1]] == [f"Author {i % 3}" for i in range(20, 25)]
+
+
+def test_get_book_by_id_export_profile(library):
+    """Test that the export profile returns a flat row"""
+    row = get_book_by_id(library, 3, 'export')
+
+    assert (row.title, row.year, row.author_name) == ("Book 3", 2023, "Author 2")
+
+
+def test_bulk_update_books_by_ids_and_predicate(session, monkeypatch):
+    """Test a set-based update chunked by id that keeps loaded books in sync"""
+    monkeypatch.setattr(ej3b1, 'BULK_ID_CHUNK', 4)
+    create_books(session, [(f"Book {i}", "Author", 2000 + i) for i in range(10)])
+    loaded = session.get(Book, 2)
+    statements = count_statements(session)
+
+    affected = bulk_update_books(session, {'title': "Reissued"}, ids=range(1, 11), where=Book.year < 2005)
+
+    assert affected == 5
+    assert sum(statement.startswith('UPDATE') for statement in statements) == 3
+    assert not any(statement.startswith('SELECT') for statement in statements)
+    assert loaded.title == "Reissued"
+    assert session.query(Book).filter_by(title="Reissued").count() == 5
+
+
+def test_bulk_update_books_without_synchronize(session):
+    """Test that synchronize_session=False leaves loaded objects untouched"""
+    book = create_book(session, "Book", "Author", 2000)
+    assert book.year == 2000
+
+    assert bulk_update_books(session, {'year': 1999}, where=true(), synchronize_session=False) == 1
+    assert book.year == 2000
+    session.expire_all()
+    assert book.year == 1999
+
+
+def test_bulk_delete_books(session):
+    """Test set-based deletes by predicate and by ids"""
+    create_books(session, [(f"Book {i}", "Author", 2000 + i) for i in range(10)])
+    loaded = session.get(Book, 1)
+
+    assert bulk_delete_books(session, where=Book.year >= 2005, synchronize_session='fetch') == 5
+    assert bulk_delete_books(session, ids=[1, 2, 9]) == 2
+    session.commit()
+
+    assert loaded not in session
+    assert [book.id for book in session.query(Book).order_by(Book.id)] == [3, 4, 5]
+
+
+def test_bulk_operations_require_criteria(session):
+    """Test that bulk operations never touch every row by accident"""
+    with pytest.raises(ValueError):
+        bulk_delete_books(session)
+    with pytest.raises(ValueError):
+        bulk_update_books(session, {'year': 2000})
+
+
+@pytest.fixture
+def lifecycle_engine():
+    """Shared in-memory database for tests that open several sessions"""
+    engine = build_engine('sqlite:///:memory:', echo=False)
+    ej3b1.setup_database(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_session_scope_commits_and_detaches(lifecycle_engine):
+    """Test that a unit of work commits and leaves no objects in a session"""
+    Session = session_factory(lifecycle_engine, expire_on_commit=False)
+    with session_scope(Session) as session:
+        book = create_book(session, "Book", "Author", 2020)
+        update_book(session, book.id, new_title="Updated")
+
+    assert book.title == "Updated"
+    assert ej3b1.inspect(book).detached
+    with session_scope(Session) as session:
+        assert get_book_by_id(session, book.id).title == "Updated"
+
+
+def test_session_scope_rolls_back_on_error(lifecycle_engine):
+    """Test that an exception rolls back uncommitted changes"""
+    Session = session_factory(lifecycle_engine)
+    with session_scope(Session) as session:
+        create_book(session, "Book", "Author", 2020)
+
+    with pytest.raises(RuntimeError):
+        with session_scope(Session) as session:
+            delete_book(session, 1)
+            raise RuntimeError("boom")
+
+    with session_scope(Session) as session:
+        assert session.query(Book).count() == 1
+
+
+def test_session_factory_expire_on_commit_from_environment(monkeypatch, lifecycle_engine):
+    """Test that expire_on_commit can be tuned without code changes"""
+    assert session_factory(lifecycle_engine)().expire_on_commit is True
+    monkeypatch.setenv('EJ3B1_EXPIRE_ON_COMMIT', 'false')
+    assert session_factory(lifecycle_engine)().expire_on_commit is False
+    assert session_factory(lifecycle_engine, expire_on_commit=True)().expire_on_commit is True
+    monkeypatch.setenv('EJ3B1_EXPIRE_ON_COMMIT', 'off')
+    assert session_factory(lifecycle_engine)().expire_on_commit is False
+    monkeypatch.setenv('EJ3B1_EXPIRE_ON_COMMIT', 'debug')
+    with pytest.raises(ValueError):
+        session_factory(lifecycle_engine)
+
+
+def test_scoped_session_per_thread(lifecycle_engine):
+    """Test that scoped sessions are per thread and nested scopes share the outer transaction"""
+    import threading
+
+    Session = session_factory(lifecycle_engine, scoped=True)
+    assert isinstance(Session, scoped_session)
+    seen = []
+
+    def worker():
+        with session_scope(Session) as session:
+            seen.append(session)
+
+    with session_scope(Session) as outer:
+        with session_scope(Session) as inner:
+            assert inner is outer
+            inner.add(Author(name="Nested"))
+        assert Session.registry.has()
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+
+    assert seen and seen[0] is not outer
+    assert not Session.registry.has()
+    with session_scope(Session) as session:
+        assert session.query(Author).filter_by(name="Nested").count() == 1
+
+
+def test_session_scope_commits_over_leftover_thread_session(lifecycle_engine):
+    """Test that a thread-local session opened outside session_scope is not taken as an outer scope"""
+    Session = session_factory(lifecycle_engine, scoped=True)
+    leftover = Session()
+
+    with session_scope(Session) as session:
+        assert session is leftover
+        session.add(Author(name="Committed"))
+
+    assert not Session.registry.has()
+    with session_scope(Session) as session:
+        assert session.query(Author).filter_by(name="Committed").count() == 1
+        with session_scope(Session) as inner:
+            assert inner.info['session_scope_depth'] == 2
+        assert session.info['session_scope_depth'] == 1
@@ -0,0 +1,335 @@
+"""
+Instrumentación de las sentencias SQL de un Engine de SQLAlchemy (ej3b1, ej3b2).
+
+echo=True imprime cada sentencia y no sirve en producción. StatementTimer se
+engancha a los eventos before_cursor_execute/after_cursor_execute/handle_error del
+motor y entrega a _observe() los segundos de cada sentencia en la base de datos;
+sobre él, StatementInstrumentation:
+- agrupa las sentencias por su SQL normalizado (sin literales y con las listas
+  IN (?, ?, ...) y VALUES (...), (...) reducidas a un elemento) y guarda un
+  histograma de latencias por cada una;
+- cuenta las sentencias de cada ámbito (una petición, una sesión; ver scope() e
+  instrument_flask()) y avisa de posibles N+1 cuando la misma sentencia se repite
+  n_plus_one_threshold veces o más dentro del ámbito;
+- guarda las sentencias lentas (más de slow_threshold segundos) con su plan
+  (EXPLAIN) para una muestra de ellas, y opcionalmente las añade a un fichero
+  JSON Lines.
+Todo se exporta con to_dict() o en formato de texto de Prometheus (to_prometheus()).
+
+Uso:
+    instrumentation = StatementInstrumentation(engine, slow_threshold=0.05).install()
+    with instrumentation.scope('GET /books'):
+        ...
+    print(instrumentation.to_prometheus())
+"""
+
+import bisect
+import contextlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Límites superiores (segundos) de los cubos del histograma de latencias
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Segundos a partir de los que una sentencia se considera lenta
+SLOW_THRESHOLD = 0.1
+# Proporción de sentencias lentas de las que se obtiene el plan con EXPLAIN
+EXPLAIN_SAMPLE_RATE = 1.0
+# Repeticiones de una misma sentencia en un ámbito a partir de las que se avisa de N+1
+N_PLUS_ONE_THRESHOLD = 10
+# Sentencias lentas y avisos N+1 que se conservan en memoria
+LOG_SIZE = 100
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),                  # cadenas
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), '?'),                # números
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), '(?)'),     # IN (?, ?, ...) y VALUES (?, ?)
+    (re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+"), '(?)'),       # VALUES (?), (?), ...
+    (re.compile(r"\s+"), ' '),
+]
+
+
+def normalize_sql(statement: str) -> str:
+    """SQL sin literales ni espacios repetidos, para agrupar sentencias con la misma forma"""
+    for pattern, replacement in _LITERALS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+class SlowQuery(NamedTuple):
+    """Sentencia lenta: SQL normalizado, SQL y parámetros reales, segundos, ámbito y plan"""
+    sql: str
+    statement: str
+    parameters: Any
+    seconds: float
+    scope: Optional[str]
+    explain: Optional[List[tuple]] = None
+
+
+class NPlusOne(NamedTuple):
+    """Sentencia repetida `count` veces dentro de un mismo ámbito"""
+    scope: str
+    sql: str
+    count: int
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def cumulative(self) -> Dict[str, int]:
+        # Como en Prometheus: cada cubo cuenta también los de límite menor
+        result, total = {}, 0
+        for bound, count in zip(LATENCY_BUCKETS + (float('inf'),), self.buckets):
+            total += count
+            result['+Inf' if bound == float('inf') else repr(bound)] = total
+        return result
+
+
+class StatementTimer:
+    """
+    Mide el tiempo de cada sentencia en el cursor de un Engine y se lo pasa a
+    _observe(), que implementan las subclases. install() registra los eventos y
+    remove() los quita; también se puede usar como gestor de contexto.
+    """
+    # Clave de connection.info con los inicios pendientes de cada cursor
+    _START_KEY = 'statement_timer_start'
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    def install(self) -> 'StatementTimer':
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(self.engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(self.engine, 'handle_error', self._handle_error)
+        return self
+
+    def remove(self) -> None:
+        event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.remove(self.engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.remove(self.engine, 'handle_error', self._handle_error)
+
+    def __enter__(self) -> 'StatementTimer':
+        return self.install()
+
+    def __exit__(self, *exc_info) -> None:
+        self.remove()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Inicio por cursor: si la sentencia falla, handle_error quita justo el suyo
+        conn.info.setdefault(self._START_KEY, {})[cursor] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info[self._START_KEY].pop(cursor)
+        self._observe(conn, statement, parameters, context, executemany, seconds)
+
+    def _handle_error(self, exception_context) -> None:
+        # Una sentencia que falla no llega a after_cursor_execute
+        conn, context = exception_context.connection, exception_context.execution_context
+        if conn is not None and context is not None:
+            conn.info.get(self._START_KEY, {}).pop(context.cursor, None)
+
+    def _observe(self, conn, statement, parameters, context, executemany, seconds: float) -> None:
+        raise NotImplementedError
+
+
+class StatementInstrumentation(StatementTimer):
+    """
+    Histogramas por sentencia, detección de N+1 por ámbito y registro de
+    sentencias lentas para un Engine (ver StatementTimer para install/remove).
+    """
+    _START_KEY = 'instrumentation_start'
+
+    def __init__(self, engine: Engine, slow_threshold: float = SLOW_THRESHOLD,
+                 explain_sample_rate: float = EXPLAIN_SAMPLE_RATE,
+                 n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD,
+                 log_size: int = LOG_SIZE, slow_log_path: Optional[str] = None, seed: Optional[int] = None):
+        super().__init__(engine)
+        self.slow_threshold = slow_threshold
+        self.explain_sample_rate = explain_sample_rate
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.slow_log_path = slow_log_path
+        self.histograms: Dict[str, _Histogram] = {}
+        self.slow_queries: Deque[SlowQuery] = deque(maxlen=log_size)
+        self.n_plus_one: Deque[NPlusOne] = deque(maxlen=log_size)
+        self.slow_total = 0
+        self.n_plus_one_total = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._rng = random.Random(seed)
+
+    # Sentencias medidas
+
+    def _observe(self, conn, statement, parameters, context, executemany, seconds: float) -> None:
+        sql = normalize_sql(statement)
+        with self._lock:
+            histogram = self.histograms.get(sql)
+            if histogram is None:
+                histogram = self.histograms[sql] = _Histogram()
+            histogram.observe(seconds)
+        scopes = self._scopes()
+        if scopes:
+            scopes[-1][1][sql] += 1
+        if seconds >= self.slow_threshold:
+            self._log_slow(conn, sql, statement, parameters, seconds, executemany,
+                           scopes[-1][0] if scopes else None)
+
+    # Sentencias lentas
+
+    def _explain(self, conn, statement, parameters) -> Optional[List[tuple]]:
+        if not statement.lstrip().upper().startswith('SELECT'):
+            return None
+        prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+        # Cursor DBAPI propio: no pasa por los eventos del motor ni altera el cursor en curso
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return [tuple(row) for row in cursor.fetchall()]
+        except Exception as error:  # el plan es informativo: un fallo no debe romper la consulta
+            return [(f"EXPLAIN falló: {error}",)]
+        finally:
+            cursor.close()
+
+    def _log_slow(self, conn, sql, statement, parameters, seconds, executemany, scope):
+        explain = None
+        if not executemany and self._rng.random() < self.explain_sample_rate:
+            explain = self._explain(conn, statement, parameters)
+        slow = SlowQuery(sql, statement, None if executemany else parameters, seconds, scope, explain)
+        with self._lock:
+            self.slow_total += 1
+            self.slow_queries.append(slow)
+            if self.slow_log_path:
+                with open(self.slow_log_path, 'a', encoding='utf-8') as log:
+                    log.write(json.dumps(slow._asdict(), default=str) + '\n')
+
+    # Ámbitos y N+1
+
+    def _scopes(self) -> List[tuple]:
+        scopes = getattr(self._local, 'scopes', None)
+        if scopes is None:
+            scopes = self._local.scopes = []
+        return scopes
+
+    @contextlib.contextmanager
+    def scope(self, name: str):
+        """
+        Cuenta las sentencias ejecutadas en este hilo dentro del bloque (una petición,
+        el uso de una sesión...). Devuelve un Counter {sql normalizado: veces}.
+        """
+        counts: Counter = Counter()
+        scopes = self._scopes()
+        scopes.append((name, counts))
+        try:
+            yield counts
+        finally:
+            scopes.pop()
+            self._check_n_plus_one(name, counts)
+
+    def _check_n_plus_one(self, name: str, counts: Counter) -> None:
+        found = [NPlusOne(name, sql, count) for sql, count in counts.items() if count >= self.n_plus_one_threshold]
+        if found:
+            with self._lock:
+                self.n_plus_one_total += len(found)
+                self.n_plus_one.extend(found)
+
+    # Exportación
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Histogramas, sentencias lentas y avisos N+1 como estructuras básicas (serializables a JSON)"""
+        with self._lock:
+            return {
+                'statements': {sql: {'count': histogram.count, 'sum': histogram.sum, 'max': histogram.max,
+                                     'buckets': histogram.cumulative()}
+                               for sql, histogram in self.histograms.items()},
+                'slow_queries_total': self.slow_total,
+                'slow_queries': [slow._asdict() for slow in self.slow_queries],
+                'n_plus_one_total': self.n_plus_one_total,
+                'n_plus_one': [warning._asdict() for warning in self.n_plus_one],
+            }
+
+    def to_prometheus(self, prefix: str = 'sqlalchemy') -> str:
+        """Métricas en el formato de texto de Prometheus"""
+        name = f"{prefix}_statement_duration_seconds"
+        lines = [f"# HELP {name} Latencia de las sentencias SQL por SQL normalizado.",
+                 f"# TYPE {name} histogram"]
+        with self._lock:
+            for sql, histogram in self.histograms.items():
+                label = f'statement="{_escape_label(sql)}"'
+                for bound, count in histogram.cumulative().items():
+                    lines.append(f'{name}_bucket{{{label},le="{bound}"}} {count}')
+                lines.append(f'{name}_sum{{{label}}} {histogram.sum!r}')
+                lines.append(f'{name}_count{{{label}}} {histogram.count}')
+            for metric, help_text, value in (
+                    ('slow_queries_total', 'Sentencias por encima del umbral de lentitud.', self.slow_total),
+                    ('n_plus_one_total', 'Sentencias repetidas en un mismo ámbito (posible N+1).',
+                     self.n_plus_one_total)):
+                lines += [f"# HELP {prefix}_{metric} {help_text}", f"# TYPE {prefix}_{metric} counter",
+                          f"{prefix}_{metric} {value}"]
+        return '\n'.join(lines) + '\n'
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def instrument_flask(app, instrumentation: StatementInstrumentation) -> StatementInstrumentation:
+    """
+    Abre un ámbito por petición de la aplicación Flask (p.ej. ej3b2.create_app()),
+    con nombre 'MÉTODO regla', para detectar N+1 en cada endpoint
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _open_scope():
+        rule = request.url_rule.rule if request.url_rule is not None else request.path
+        g.sql_scope = instrumentation.scope(f"{request.method} {rule}")
+        g.sql_scope.__enter__()
+
+    @app.teardown_request
+    def _close_scope(exception=None):
+        scope = g.pop('sql_scope', None)
+        if scope is not None:
+            scope.__exit__(None, None, None)
+
+    return instrumentation
+
+
+def instrument_sample_app(books: int = 200, authors: int = 20) -> StatementInstrumentation:
+    """Instrumenta los endpoints de lectura de ej3b2 con datos de ejemplo"""
+    from ej3b2 import Author, Book, create_app, db
+
+    app = create_app()
+    with app.app_context():
+        db.session.add_all(Author(name=f"Autor {i}") for i in range(authors))
+        db.session.commit()
+        db.session.add_all(Book(title=f"Libro {i}", year=2000 + i % 25, author_id=1 + i % authors)
+                           for i in range(books))
+        db.session.commit()
+        instrumentation = instrument_flask(app, StatementInstrumentation(db.engine, slow_threshold=0.001).install())
+    client = app.test_client()
+    for path in ('/authors', '/books', '/authors/1', '/books/1'):
+        client.get(path)
+    return instrumentation
+
+
+if __name__ == "__main__":
+    instrumentation = instrument_sample_app()
+    for warning in instrumentation.n_plus_one:
+        print(f"N+1 en {warning.scope}: {warning.count} x {warning.sql}")
+    print(instrumentation.to_prometheus())
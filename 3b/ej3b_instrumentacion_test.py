@@ -0,0 +1,143 @@
+import json
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from ej3b1 import Book, build_engine, create_books, find_books_by_author, get_all_books, setup_database
+from ej3b_instrumentacion import StatementInstrumentation, instrument_flask, normalize_sql
+
+
+@pytest.fixture
+def engine():
+    """In-memory ej3b1 database with a few authors and books"""
+    engine = build_engine('sqlite:///:memory:', echo=False)
+    setup_database(engine)
+    with sessionmaker(bind=engine)() as session:
+        create_books(session, [(f"Book {i}", f"Author {i % 4}", 2000 + i) for i in range(12)])
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def test_normalize_sql():
+    """Test that literals, IN lists and multi-row VALUES collapse to one shape"""
+    assert normalize_sql("SELECT *\n  FROM books WHERE id IN (?, ?, ?) AND title = 'It''s' LIMIT 10") == \
+        "SELECT * FROM books WHERE id IN (?) AND title = ? LIMIT ?"
+    assert normalize_sql("INSERT INTO authors (name) VALUES (?), (?), (?) RETURNING name, id") == \
+        "INSERT INTO authors (name) VALUES (?) RETURNING name, id"
+    assert normalize_sql("SELECT authors_1.name FROM authors AS authors_1") == \
+        "SELECT authors_1.name FROM authors AS authors_1"
+
+
+def test_histograms_by_normalized_sql(engine, session):
+    """Test that executions with different parameters share one histogram"""
+    with StatementInstrumentation(engine) as instrumentation:
+        for name in ("Author 0", "Author 1", "Author 2"):
+            find_books_by_author(session, name)
+
+    statements = instrumentation.to_dict()['statements']
+    assert len(statements) == 1
+    (data,) = statements.values()
+    assert data['count'] == 3
+    assert data['buckets']['+Inf'] == 3
+    assert list(data['buckets'].values()) == sorted(data['buckets'].values())
+    assert data['max'] <= data['sum']
+
+    # Removed listeners stop recording
+    get_all_books(session)
+    assert instrumentation.to_dict()['statements'] == statements
+
+
+def test_failed_statements_release_their_start_time(engine):
+    """Test that statements raising in the database leave no pending start time on the connection"""
+    with StatementInstrumentation(engine) as instrumentation, engine.connect() as connection:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                connection.exec_driver_sql("SELECT * FROM missing_table")
+        connection.exec_driver_sql("SELECT 1")
+
+        assert connection.connection.info['instrumentation_start'] == {}
+    assert instrumentation.to_dict()['statements']['SELECT ?']['count'] == 1
+
+
+def test_scope_flags_n_plus_one(engine, session):
+    """Test that lazy loads repeated inside one scope are reported as N+1"""
+    instrumentation = StatementInstrumentation(engine, n_plus_one_threshold=4).install()
+
+    with instrumentation.scope('lazy') as counts:
+        for book in session.query(Book).all():
+            book.author.name
+    with instrumentation.scope('joined'):
+        [book.author.name for book in get_all_books(session, 'joined')]
+
+    assert sum(counts.values()) == 5
+    assert [(warning.scope, warning.count) for warning in instrumentation.n_plus_one] == [('lazy', 4)]
+    assert 'FROM authors' in instrumentation.n_plus_one[0].sql
+    instrumentation.remove()
+
+
+def test_slow_query_log_with_explain(engine, session, tmp_path):
+    """Test that slow statements are logged with their sampled query plan"""
+    log_path = tmp_path / 'slow.jsonl'
+    instrumentation = StatementInstrumentation(engine, slow_threshold=0, slow_log_path=str(log_path)).install()
+
+    with instrumentation.scope('search'):
+        find_books_by_author(session, "Author 1")
+    instrumentation.remove()
+
+    (slow,) = instrumentation.slow_queries
+    assert slow.scope == 'search'
+    assert slow.parameters == ("Author 1",)
+    assert any('authors' in str(row) for row in slow.explain)
+    assert json.loads(log_path.read_text())['sql'] == slow.sql
+
+
+def test_explain_sampling(engine, session):
+    """Test that a zero sample rate logs slow statements without EXPLAIN"""
+    with StatementInstrumentation(engine, slow_threshold=0, explain_sample_rate=0) as instrumentation:
+        get_all_books(session)
+
+    assert instrumentation.slow_total == 1
+    assert instrumentation.slow_queries[0].explain is None
+
+
+def test_prometheus_export(engine, session):
+    """Test the Prometheus text exposition format"""
+    with StatementInstrumentation(engine, slow_threshold=0, n_plus_one_threshold=1) as instrumentation:
+        with instrumentation.scope('list'):
+            get_all_books(session, 'list')
+
+    text = instrumentation.to_prometheus()
+    assert '# TYPE sqlalchemy_statement_duration_seconds histogram' in text
+    assert 'le="+Inf"} 1' in text
+    assert 'sqlalchemy_statement_duration_seconds_count{statement="SELECT authors.id, authors.name, books.id' in text
+    assert 'sqlalchemy_slow_queries_total 1' in text
+    assert 'sqlalchemy_n_plus_one_total 1' in text
+    assert text.endswith('\n')
+
+
+def test_instrument_flask_scopes_per_request():
+    """Test that each ej3b2 request gets its own scope and N+1 endpoints are flagged"""
+    from ej3b2 import Author, Book as FlaskBook, create_app, db
+
+    app = create_app()
+    with app.app_context():
+        db.session.add_all(Author(name=f"Author {i}") for i in range(5))
+        db.session.commit()
+        db.session.add_all(FlaskBook(title=f"Book {i}", year=2000, author_id=1 + i % 5) for i in range(10))
+        db.session.commit()
+        instrumentation = StatementInstrumentation(db.engine, n_plus_one_threshold=5).install()
+    instrument_flask(app, instrumentation)
+    client = app.test_client()
+
+    client.get('/authors')
+    client.get('/books/1')
+
+    assert [(warning.scope, warning.count) for warning in instrumentation.n_plus_one] == [('GET /authors', 5)]
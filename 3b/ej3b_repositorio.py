@@ -0,0 +1,356 @@
+"""
+Interfaz común de repositorio para la biblioteca y comparativa entre backends.
+
+Las mismas operaciones de la biblioteca están implementadas cuatro veces con
+firmas distintas: sqlite3 (3a/ej3a1.py y 3a/ej3a2.py), MongoDB (3a/ej3a4.py) y
+SQLAlchemy (ej3b1.py). LibraryRepository define una única interfaz y cada
+adaptador la implementa llamando a las funciones del ejercicio correspondiente.
+
+run_benchmark() ejecuta las mismas cargas (carga masiva, lecturas por ID,
+búsqueda por autor, actualizaciones y una mezcla de lecturas y escrituras) sobre
+cada backend y devuelve operaciones por segundo y latencias p50/p99. Todos los
+backends tienen índices equivalentes (autor de los libros y nombre de autor):
+en MongoDB los de ej3a4_indices y en SQLite los de SQLITE_INDEXES.
+"""
+
+import math
+import os
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Protocol, Tuple, runtime_checkable
+
+from sqlalchemy.orm import Session
+
+# Los ejercicios de 3a no son un paquete: se importan desde su directorio
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '3a'))
+
+import ej3a1  # noqa: E402
+import ej3a2  # noqa: E402
+import ej3a4  # noqa: E402
+from ej3a4_indices import aplicar_indices  # noqa: E402
+from ej3a4_modelos import obtener_libro  # noqa: E402
+
+import ej3b1  # noqa: E402
+
+# Libros por operación en la carga masiva
+BULK_BATCH_SIZE = 1000
+# Proporción de lecturas en la carga mixta
+MIXED_READ_RATIO = 0.8
+WORKLOADS = ('bulk_load', 'point_reads', 'author_search', 'updates', 'mixed')
+
+# Índices equivalentes a los de ej3a4_indices en los esquemas de ej3a1 y ej3b1
+SQLITE_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_libros_autor_id ON libros(autor_id)',
+    'CREATE INDEX IF NOT EXISTS idx_autores_nombre ON autores(nombre)',
+)
+SQLALCHEMY_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS ix_books_author_id ON books(author_id)',
+    'CREATE INDEX IF NOT EXISTS ix_authors_name ON authors(name)',
+)
+
+
+@runtime_checkable
+class LibraryRepository(Protocol):
+    """
+    Operaciones de la biblioteca comunes a todos los backends.
+    Los IDs son opacos: enteros en SQL y ObjectId en MongoDB.
+    """
+
+    def add_authors(self, names: Iterable[str]) -> List[Any]:
+        """Inserta autores y devuelve sus IDs en el mismo orden"""
+        ...
+
+    def add_books(self, books: Iterable[Tuple[str, int, Any]]) -> List[Any]:
+        """Inserta libros (titulo, anio, autor_id) y devuelve sus IDs en el mismo orden"""
+        ...
+
+    def list_books(self) -> List[Tuple[str, int, Optional[str]]]:
+        """Devuelve todos los libros como (titulo, anio, autor)"""
+        ...
+
+    def get_book(self, book_id: Any) -> Optional[Tuple[str, int]]:
+        """Devuelve (titulo, anio) del libro o None si no existe"""
+        ...
+
+    def find_books_by_author(self, author_name: str) -> List[Tuple[str, int]]:
+        """Devuelve (titulo, anio) de los libros del autor"""
+        ...
+
+    def update_book(self, book_id: Any, new_title: Optional[str] = None, new_year: Optional[int] = None) -> bool:
+        """Actualiza un libro; True si existía"""
+        ...
+
+    def delete_book(self, book_id: Any) -> bool:
+        """Elimina un libro; True si existía"""
+        ...
+
+
+class SQLiteRepository:
+    """
+    Adaptador sobre sqlite3: esquema de ej3a1; listado y lectura por ID de ej3a2.
+    La búsqueda por autor, la actualización y el borrado usan SQL parametrizado
+    propio (las de ej3a1/ej3a2 interpolan los valores en la sentencia).
+    """
+
+    def __init__(self, conexion=None, indexes: bool = True):
+        self.conexion = conexion if conexion is not None else ej3a1.crear_conexion()
+        ej3a1.crear_tablas(self.conexion)
+        if indexes:
+            for statement in SQLITE_INDEXES:
+                self.conexion.execute(statement)
+            self.conexion.commit()
+
+    def _insert(self, statement: str, rows: Iterable[tuple]) -> List[int]:
+        # ej3a1 no devuelve los IDs: insertamos con parámetros en una única transacción
+        cursor = self.conexion.cursor()
+        ids = []
+        for row in rows:
+            cursor.execute(statement, row)
+            ids.append(cursor.lastrowid)
+        cursor.close()
+        self.conexion.commit()
+        return ids
+
+    def add_authors(self, names: Iterable[str]) -> List[int]:
+        return self._insert('INSERT INTO autores(nombre) VALUES (?)', ((name,) for name in names))
+
+    def add_books(self, books: Iterable[Tuple[str, int, Any]]) -> List[int]:
+        return self._insert('INSERT INTO libros(titulo, anio, autor_id) VALUES (?, ?, ?)', books)
+
+    def list_books(self) -> List[Tuple[str, int, Optional[str]]]:
+        return [(titulo, anio, autor) for _, titulo, anio, autor in ej3a2.obtener_libros(self.conexion)]
+
+    def get_book(self, book_id: int) -> Optional[Tuple[str, int]]:
+        row = ej3a2.obtener_libro_por_id(self.conexion, book_id)
+        return None if row is None else (row[1], row[2])
+
+    def find_books_by_author(self, author_name: str) -> List[Tuple[str, int]]:
+        # Como en los demás backends, los libros de todos los autores con ese nombre
+        cursor = self.conexion.execute(
+            'SELECT libros.titulo, libros.anio FROM libros JOIN autores ON libros.autor_id = autores.id '
+            'WHERE autores.nombre = ?', (author_name,))
+        books = [(titulo, anio) for titulo, anio in cursor]
+        cursor.close()
+        return books
+
+    def update_book(self, book_id: int, new_title: Optional[str] = None, new_year: Optional[int] = None) -> bool:
+        if new_title is None and new_year is None:
+            return self.get_book(book_id) is not None
+        # COALESCE conserva los campos que no se cambian; rowcount cuenta la fila aunque no cambie
+        cursor = self.conexion.execute(
+            'UPDATE libros SET titulo = COALESCE(?, titulo), anio = COALESCE(?, anio) WHERE id = ?',
+            (new_title, new_year, book_id))
+        found = cursor.rowcount > 0
+        cursor.close()
+        self.conexion.commit()
+        return found
+
+    def delete_book(self, book_id: int) -> bool:
+        cursor = self.conexion.execute('DELETE FROM libros WHERE id = ?', (book_id,))
+        found = cursor.rowcount > 0
+        cursor.close()
+        self.conexion.commit()
+        return found
+
+
+class SQLAlchemyRepository:
+    """
+    Adaptador sobre el ORM de ej3b1; confirma la sesión tras cada escritura
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def add_authors(self, names: Iterable[str]) -> List[int]:
+        authors = [ej3b1.Author(name=name) for name in names]
+        self.session.add_all(authors)
+        self.session.commit()
+        return [author.id for author in authors]
+
+    def add_books(self, books: Iterable[Tuple[str, int, Any]]) -> List[int]:
+        objects = [ej3b1.Book(title=title, year=year, author_id=author_id) for title, year, author_id in books]
+        self.session.add_all(objects)
+        self.session.commit()
+        return [book.id for book in objects]
+
+    def list_books(self) -> List[Tuple[str, int, Optional[str]]]:
+        return [(book.title, book.year, book.author.name if book.author else None)
+                for book in ej3b1.get_all_books(self.session, 'list')]
+
+    def get_book(self, book_id: int) -> Optional[Tuple[str, int]]:
+        book = ej3b1.get_book_by_id(self.session, book_id)
+        return None if book is None else (book.title, book.year)
+
+    def find_books_by_author(self, author_name: str) -> List[Tuple[str, int]]:
+        return [(book.title, book.year) for book in ej3b1.find_books_by_author(self.session, author_name, 'list')]
+
+    def update_book(self, book_id: int, new_title: Optional[str] = None, new_year: Optional[int] = None) -> bool:
+        book = ej3b1.update_book(self.session, book_id, new_title, new_year)
+        self.session.commit()
+        return book is not None
+
+    def delete_book(self, book_id: int) -> bool:
+        # delete_book busca el libro con session.get, que reutiliza esta misma carga
+        exists = self.session.get(ej3b1.Book, book_id) is not None
+        ej3b1.delete_book(self.session, book_id)
+        self.session.commit()
+        return exists
+
+
+class MongoRepository:
+    """
+    Adaptador sobre las funciones de ej3a4 (vale una base de datos de mongomock).
+    raw se pasa a ej3a4_modelos.obtener_libro (mongomock no admite RawBSONDocument).
+    """
+
+    def __init__(self, db, raw: Optional[bool] = None):
+        self.db = db
+        self.raw = raw
+
+    def add_authors(self, names: Iterable[str]) -> List[Any]:
+        return ej3a4.insertar_autores(self.db, ((name,) for name in names))
+
+    def add_books(self, books: Iterable[Tuple[str, int, Any]]) -> List[Any]:
+        return ej3a4.insertar_libros(self.db, (tuple(book) for book in books))
+
+    def list_books(self) -> List[Tuple[str, int, Optional[str]]]:
+        return list(ej3a4.iterar_libros(self.db))
+
+    def get_book(self, book_id: Any) -> Optional[Tuple[str, int]]:
+        libro = obtener_libro(self.db, book_id, raw=self.raw)
+        return None if libro is None else (libro.titulo, libro.anio)
+
+    def find_books_by_author(self, author_name: str) -> List[Tuple[str, int]]:
+        return ej3a4.buscar_libros_por_autor(self.db, author_name)
+
+    def update_book(self, book_id: Any, new_title: Optional[str] = None, new_year: Optional[int] = None) -> bool:
+        return ej3a4.actualizar_libro(self.db, str(book_id), new_title, new_year)
+
+    def delete_book(self, book_id: Any) -> bool:
+        return ej3a4.eliminar_libro(self.db, str(book_id))
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Percentil por rango más cercano de una lista de valores"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _summary(latencies: List[float], operations: int) -> Dict[str, float]:
+    total = sum(latencies)
+    return {
+        'operations': operations,
+        'seconds': total,
+        'ops_per_second': operations / total if total else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def _timed(latencies: List[float], operation: Callable[[], Any]) -> Any:
+    start = time.perf_counter()
+    result = operation()
+    latencies.append(time.perf_counter() - start)
+    return result
+
+
+def benchmark_repository(repository: LibraryRepository, n_authors: int = 100, n_books: int = 10000,
+                         operations: int = 1000, seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """
+    Ejecuta todas las cargas sobre un repositorio vacío.
+    En bulk_load cada latencia corresponde a un lote de BULK_BATCH_SIZE libros.
+    """
+    rng = random.Random(seed)
+    results = {}
+
+    latencies: List[float] = []
+    names = [f"Autor {i}" for i in range(n_authors)]
+    author_ids = _timed(latencies, lambda: repository.add_authors(names))
+    book_ids: List[Any] = []
+    for start in range(0, n_books, BULK_BATCH_SIZE):
+        batch = [(f"Libro {i}", 1900 + rng.randrange(125), author_ids[rng.randrange(n_authors)])
+                 for i in range(start, min(start + BULK_BATCH_SIZE, n_books))]
+        book_ids.extend(_timed(latencies, lambda: repository.add_books(batch)))
+    results['bulk_load'] = _summary(latencies, n_authors + n_books)
+
+    latencies = []
+    for _ in range(operations):
+        book_id = rng.choice(book_ids)
+        _timed(latencies, lambda: repository.get_book(book_id))
+    results['point_reads'] = _summary(latencies, operations)
+
+    latencies = []
+    for _ in range(operations):
+        name = rng.choice(names)
+        _timed(latencies, lambda: repository.find_books_by_author(name))
+    results['author_search'] = _summary(latencies, operations)
+
+    latencies = []
+    for _ in range(operations):
+        book_id, year = rng.choice(book_ids), 1900 + rng.randrange(125)
+        _timed(latencies, lambda: repository.update_book(book_id, new_year=year))
+    results['updates'] = _summary(latencies, operations)
+
+    latencies = []
+    for i in range(operations):
+        if rng.random() < MIXED_READ_RATIO:
+            book_id = rng.choice(book_ids)
+            _timed(latencies, lambda: repository.get_book(book_id))
+        else:
+            book_id = rng.choice(book_ids)
+            _timed(latencies, lambda: repository.update_book(book_id, new_title=f"Libro {i} (rev)"))
+    results['mixed'] = _summary(latencies, operations)
+    return results
+
+
+def run_benchmark(factories: Dict[str, Callable[[], LibraryRepository]],
+                  **options) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Ejecuta benchmark_repository con un repositorio nuevo de cada backend y la misma semilla
+    """
+    return {backend: benchmark_repository(factory(), **options) for backend, factory in factories.items()}
+
+
+def default_factories(use_mongo: bool = False) -> Dict[str, Callable[[], LibraryRepository]]:
+    """
+    Backends disponibles: sqlite3 y SQLAlchemy en memoria, y MongoDB (mongomock salvo use_mongo),
+    cada uno con sus índices
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    def sqlalchemy_repository():
+        engine = create_engine('sqlite:///:memory:', echo=False)
+        ej3b1.Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            for statement in SQLALCHEMY_INDEXES:
+                connection.exec_driver_sql(statement)
+        return SQLAlchemyRepository(sessionmaker(bind=engine)())
+
+    def mongo_repository():
+        if use_mongo:
+            db = ej3a4.crear_conexion().client['biblioteca_bench']
+            db.client.drop_database(db.name)
+            aplicar_indices(db)
+            return MongoRepository(db)
+        import mongomock
+        db = mongomock.MongoClient().biblioteca
+        aplicar_indices(db)
+        return MongoRepository(db, raw=False)
+
+    return {'sqlite3': SQLiteRepository, 'sqlalchemy': sqlalchemy_repository, 'mongo': mongo_repository}
+
+
+if __name__ == "__main__":
+    results = run_benchmark(default_factories('--mongo' in sys.argv), n_authors=100, n_books=10000,
+                            operations=1000)
+    for backend, workloads in results.items():
+        print(f"\n--- {backend} ---")
+        for workload in WORKLOADS:
+            data = workloads[workload]
+            print(f"{workload:>14}: {data['ops_per_second']:>10.0f} ops/s  "
+                  f"p50 {data['p50_ms']:7.3f} ms  p99 {data['p99_ms']:7.3f} ms")
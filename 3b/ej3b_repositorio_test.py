@@ -0,0 +1,124 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from ej3b1 import Base
+from ej3b_repositorio import (WORKLOADS, LibraryRepository, MongoRepository, SQLAlchemyRepository,
+                              SQLiteRepository, benchmark_repository, percentile, run_benchmark)
+
+mongomock = pytest.importorskip("mongomock")
+
+
+def sqlalchemy_repository():
+    engine = create_engine('sqlite:///:memory:', echo=False)
+    Base.metadata.create_all(engine)
+    return SQLAlchemyRepository(sessionmaker(bind=engine)())
+
+
+FACTORIES = {
+    'sqlite3': SQLiteRepository,
+    'sqlalchemy': sqlalchemy_repository,
+    'mongo': lambda: MongoRepository(mongomock.MongoClient().biblioteca, raw=False),
+}
+
+
+@pytest.fixture(params=sorted(FACTORIES))
+def repository(request):
+    """Create an empty repository for each backend"""
+    return FACTORIES[request.param]()
+
+
+@pytest.fixture
+def sample(repository):
+    """Load the same authors and books into the repository"""
+    author_ids = repository.add_authors(["Gabriel García Márquez", "Isabel Allende"])
+    book_ids = repository.add_books([("Cien años de soledad", 1967, author_ids[0]),
+                                     ("El amor en los tiempos del cólera", 1985, author_ids[0]),
+                                     ("Paula", 1994, author_ids[1])])
+    return author_ids, book_ids
+
+
+def test_implements_protocol(repository):
+    """Test that every adapter satisfies the repository protocol"""
+    assert isinstance(repository, LibraryRepository)
+
+
+def test_list_and_get(repository, sample):
+    """Test that listing and point reads return the same shapes on every backend"""
+    _, book_ids = sample
+
+    assert sorted(repository.list_books()) == [
+        ("Cien años de soledad", 1967, "Gabriel García Márquez"),
+        ("El amor en los tiempos del cólera", 1985, "Gabriel García Márquez"),
+        ("Paula", 1994, "Isabel Allende"),
+    ]
+    assert repository.get_book(book_ids[2]) == ("Paula", 1994)
+
+
+def test_find_books_by_author(repository, sample):
+    """Test searching books by author name"""
+    assert sorted(repository.find_books_by_author("Gabriel García Márquez")) == [
+        ("Cien años de soledad", 1967), ("El amor en los tiempos del cólera", 1985)]
+    assert repository.find_books_by_author("Unknown") == []
+
+
+def test_update_and_delete(repository, sample):
+    """Test that updates and deletes report whether the book existed"""
+    _, book_ids = sample
+
+    assert repository.update_book(book_ids[0], new_title="Cien años", new_year=1968) is True
+    assert repository.get_book(book_ids[0]) == ("Cien años", 1968)
+
+    assert repository.delete_book(book_ids[1]) is True
+    assert repository.get_book(book_ids[1]) is None
+    assert repository.delete_book(book_ids[1]) is False
+    assert repository.update_book(book_ids[1], new_year=2000) is False
+
+
+def test_quotes_in_values(repository):
+    """Test that names and titles with quotes are stored and searched as plain values"""
+    author_ids = repository.add_authors(["Flann O'Brien", 'Robert "Bob" Smith'])
+    book_ids = repository.add_books([("At Swim-Two-Birds", 1939, author_ids[0]),
+                                     ("Bob's Book", 2000, author_ids[1])])
+
+    assert repository.find_books_by_author("Flann O'Brien") == [("At Swim-Two-Birds", 1939)]
+    assert repository.find_books_by_author('Robert "Bob" Smith') == [("Bob's Book", 2000)]
+    assert repository.find_books_by_author("x' OR '1'='1") == []
+    assert repository.update_book(book_ids[0], new_title="The Third Policeman's Friend") is True
+    assert repository.get_book(book_ids[0]) == ("The Third Policeman's Friend", 1939)
+
+
+def test_sqlite_author_index():
+    """Test that the sqlite3 author search uses an index, like the MongoDB backend"""
+    repository = SQLiteRepository()
+    plan = repository.conexion.execute(
+        'EXPLAIN QUERY PLAN SELECT titulo FROM libros WHERE autor_id = ?', (1,)).fetchall()
+
+    assert any('idx_libros_autor_id' in row[-1] for row in plan)
+
+
+def test_percentile():
+    """Test nearest-rank percentiles"""
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([3.0], 99) == 3.0
+    assert percentile([], 50) == 0.0
+
+
+def test_benchmark_repository(repository):
+    """Test that the harness runs every workload and reports latencies"""
+    results = benchmark_repository(repository, n_authors=5, n_books=50, operations=20)
+
+    assert set(results) == set(WORKLOADS)
+    assert results['bulk_load']['operations'] == 55
+    for data in results.values():
+        assert data['p50_ms'] <= data['p99_ms']
+        assert data['ops_per_second'] > 0
+
+
+def test_run_benchmark_same_workload():
+    """Test that every backend runs the same seeded workload"""
+    results = run_benchmark(FACTORIES, n_authors=3, n_books=10, operations=5, seed=1)
+
+    assert sorted(results) == sorted(FACTORIES)